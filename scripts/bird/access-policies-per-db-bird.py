@@ -8,7 +8,13 @@ Read user_permissions_bird.csv and produce:
 Assumes roles already exist (from user_permissions_bird.py). This script only GENERATES SQL text.
 """
 
-import csv, os, psycopg2
+import csv, os, sys, psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.layout import SessionCache, consolidated, qualify, target
+
+METRICS = Metrics("bird_policies")
 
 # ── Connection params ────────────────────────────────────────────────────────
 PG_USER = os.getenv("PG_USER", "username")
@@ -22,21 +28,30 @@ OUT_POL    = "db_access_policies.csv"
 OUT_FULL   = "db_access_policies_full.csv"
 
 def connect(dbname):
+    METRICS.inc("connection_opens", db=dbname)
     return psycopg2.connect(
         dbname=dbname, user=PG_USER, password=PG_PASSWORD,
         host=PG_HOST, port=PG_PORT
     )
 
+SESSIONS = SessionCache(connect)
+
+def release(pg_database):
+    """Database layout: close the per-DB session. Schema layout: keep the shared one."""
+    if not consolidated():
+        SESSIONS.discard(pg_database)
+
 def snapshot_schema_ddl(db):
-    """Return a simple CREATE TABLE … snapshot for schema 'public'."""
+    """Return a simple CREATE TABLE … snapshot for the DB's schema ('public' or its own)."""
+    pg_database, schema = target(db)
     try:
-        with connect(db) as conn, conn.cursor() as cur:
+        with SESSIONS.get(pg_database).cursor() as cur:
             cur.execute("""
                 SELECT table_name, column_name, data_type
                   FROM information_schema.columns
-                 WHERE table_schema='public'
+                 WHERE table_schema=%s
               ORDER BY table_name, ordinal_position;
-            """)
+            """, (schema,))
             rows = cur.fetchall()
 
         tables = {}
@@ -46,23 +61,30 @@ def snapshot_schema_ddl(db):
         ddls = []
         for tbl, cols in tables.items():
             col_defs = ", ".join(f'"{col}" {dtype}' for col, dtype in cols)
-            ddls.append(f'CREATE TABLE "{tbl}" ({col_defs});')
+            ddls.append(f'CREATE TABLE {qualify(schema, tbl)} ({col_defs});')
         return "\n".join(ddls)
     except Exception as e:
+        SESSIONS.discard(pg_database)
         return f"-- ERROR generating schema for {db}: {e}"
+    finally:
+        release(pg_database)
 
 def get_table_widths(db):
-    """Return {table_name: column_count} for schema 'public'."""
+    """Return {table_name: column_count} for the DB's schema."""
+    pg_database, schema = target(db)
     widths = {}
-    with connect(db) as conn, conn.cursor() as cur:
-        cur.execute("""
-            SELECT table_name, COUNT(*)
-              FROM information_schema.columns
-             WHERE table_schema='public'
-          GROUP BY table_name;
-        """)
-        for tbl, cnt in cur.fetchall():
-            widths[tbl] = int(cnt)
+    try:
+        with SESSIONS.get(pg_database).cursor() as cur:
+            cur.execute("""
+                SELECT table_name, COUNT(*)
+                  FROM information_schema.columns
+                 WHERE table_schema=%s
+              GROUP BY table_name;
+            """, (schema,))
+            for tbl, cnt in cur.fetchall():
+                widths[tbl] = int(cnt)
+    finally:
+        release(pg_database)
     return widths
 
 def main():
@@ -90,10 +112,12 @@ def main():
         except Exception:
             widths = {}
 
+        _, schema = target(db)
         policy_sqls = []
         for role, tables in roles.items():
             # ensure usage on schema
-            policy_sqls.append(f'GRANT USAGE ON SCHEMA public TO "{role}";')
+            policy_sqls.append(f'GRANT USAGE ON SCHEMA "{schema}" TO "{role}";' if consolidated()
+                               else f'GRANT USAGE ON SCHEMA public TO "{role}";')
 
             for tbl, cols in tables.items():
                 col_list_sorted = sorted(list(cols))
@@ -101,10 +125,10 @@ def main():
 
                 # if we know the width AND our set size >= width, treat as full-table grant
                 if width is not None and len(col_list_sorted) >= width:
-                    policy_sqls.append(f'GRANT SELECT ON "{tbl}" TO "{role}";')
+                    policy_sqls.append(f'GRANT SELECT ON {qualify(schema, tbl)} TO "{role}";')
                 else:
                     col_idents = ", ".join(f'"{c}"' for c in col_list_sorted)
-                    policy_sqls.append(f'GRANT SELECT ({col_idents}) ON "{tbl}" TO "{role}";')
+                    policy_sqls.append(f'GRANT SELECT ({col_idents}) ON {qualify(schema, tbl)} TO "{role}";')
 
         pol_rows.append({"db_id": db, "access_policy_sql": "\n".join(policy_sqls)})
 
@@ -120,14 +144,18 @@ def main():
         w = csv.DictWriter(f, fieldnames=["db_id", "access_policy_sql", "db_schema_ddl"])
         w.writeheader()
         for row in pol_rows:
-            ddl = snapshot_schema_ddl(row["db_id"])
+            with METRICS.timer("schema_snapshot", db=row["db_id"]):
+                ddl = snapshot_schema_ddl(row["db_id"])
             w.writerow({
                 "db_id": row["db_id"],
                 "access_policy_sql": row["access_policy_sql"],
                 "db_schema_ddl": ddl
             })
 
+    SESSIONS.close()
     print(f"✅ Wrote {OUT_POL} and {OUT_FULL}")
+    METRICS.inc("policies_written", len(pol_rows))
+    METRICS.report()
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, csv, json, argparse
+import os, sys, csv, json, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+
+METRICS = Metrics("bird_build")
 
 # Defaults: keep everything in the current (preprocessing) directory
 GROUNDTRUTH_CSV = "ground_truth.csv"                 # produced by dataset-groundtruth-bird.py
@@ -32,6 +37,45 @@ def load_policies_full(path):
             }
     return d
 
+def keep_row(row, drop_nonselect_or_skip=False, only_privilege_or_permit=False):
+    sqlstate = (row.get("sqlstate") or "").strip()
+    if drop_nonselect_or_skip and sqlstate == "SKIP":
+        return False
+    if only_privilege_or_permit:
+        if not (row["permit"] == 1 or sqlstate == "42501"):
+            return False
+    return True
+
+def make_record(row, pol):
+    """One JSONL example from a ground-truth row and the per-DB policies."""
+    dbname = (row.get("dbname") or "").strip().lower()
+    policy = pol.get(dbname, {"policy_sql": "", "schema_ddl": ""})
+    sqlstate = (row.get("sqlstate") or "").strip()
+    return {
+        # identity
+        "split": row.get("split", ""),
+        "db_id": (row.get("db_id") or "").strip(),
+        "dbname": dbname,
+        "user": row.get("role", ""),          # rename 'role' -> 'user' for clarity
+
+        # question + SQL
+        "qid": row.get("qid", ""),
+        "question": row.get("question", "") or "",
+        "sql": row.get("sql_original", "") or "",
+        "sql_wrapped": row.get("sql_wrapped", "") or "",
+
+        # label
+        "decision": "PERMIT" if row["permit"] == 1 else "DENY",
+        "permit": bool(row["permit"]),
+        "sqlstate": sqlstate,
+        "error": row.get("error", "") or "",
+
+        # context
+        "evidence": row.get("evidence", "") or "",
+        "policy_sql": policy["policy_sql"],
+        "schema_ddl": policy["schema_ddl"],
+    }
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--groundtruth", default=GROUNDTRUTH_CSV)
@@ -43,52 +87,21 @@ def main():
                     help="Keep only rows that are permitted OR denied due to insufficient privilege (SQLSTATE 42501).")
     args = ap.parse_args()
 
-    gt  = load_groundtruth(args.groundtruth)
-    pol = load_policies_full(args.policies_full)
+    with METRICS.timer("load_inputs"):
+        gt  = load_groundtruth(args.groundtruth)
+        pol = load_policies_full(args.policies_full)
 
     n_in = len(gt)
     out = []
 
     for row in gt:
-        dbname = (row.get("dbname") or "").strip().lower()
-        policy = pol.get(dbname, {"policy_sql": "", "schema_ddl": ""})
-
-        sqlstate = (row.get("sqlstate") or "").strip()
-        if args.drop_nonselect_or_skip and sqlstate == "SKIP":
+        if not keep_row(row, args.drop_nonselect_or_skip, args.only_privilege_or_permit):
             continue
-        if args.only_privilege_or_permit:
-            if not (row["permit"] == 1 or sqlstate == "42501"):
-                continue
-
-        ex = {
-            # identity
-            "split": row.get("split", ""),
-            "db_id": (row.get("db_id") or "").strip(),
-            "dbname": dbname,
-            "user": row.get("role", ""),          # rename 'role' -> 'user' for clarity
-
-            # question + SQL
-            "qid": row.get("qid", ""),
-            "question": row.get("question", "") or "",
-            "sql": row.get("sql_original", "") or "",
-            "sql_wrapped": row.get("sql_wrapped", "") or "",
-
-            # label
-            "decision": "PERMIT" if row["permit"] == 1 else "DENY",
-            "permit": bool(row["permit"]),
-            "sqlstate": sqlstate,
-            "error": row.get("error", "") or "",
-
-            # context
-            "evidence": row.get("evidence", "") or "",
-            "policy_sql": policy["policy_sql"],
-            "schema_ddl": policy["schema_ddl"],
-        }
-        out.append(ex)
+        out.append(make_record(row, pol))
 
     # Save next to the script (preprocessing folder)
     os.makedirs(os.path.dirname(args.out_jsonl) or ".", exist_ok=True)
-    with open(args.out_jsonl, "w", encoding="utf-8") as f:
+    with open(args.out_jsonl, "w", encoding="utf-8") as f, METRICS.timer("write_jsonl"):
         for ex in out:
             f.write(json.dumps(ex, ensure_ascii=False) + "\n")
 
@@ -99,6 +112,9 @@ def main():
     print(f"✅ Wrote {args.out_jsonl}")
     print(f"ℹ️ Input rows: {n_in}  →  Output rows: {len(out)}")
     print(f"   Permitted: {permits} | Denied: {denies} | Denied (42501): {priv_denies}")
+    METRICS.inc("records_in", n_in)
+    METRICS.inc("records_out", len(out))
+    METRICS.report()
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, csv, re, psycopg2
+import os, sys, csv, re, time, psycopg2
 from psycopg2 import sql
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.label_cache import open_label_cache, schema_fingerprint
+from common.metrics import Metrics
+from common.layout import SessionCache, consolidated, target
+from common.roles import RoleSpec
+from common.sql_translate import translate
+
+METRICS = Metrics("bird_groundtruth")
+
 # ── Connection (BIRD stack) ──────────────────────────────────────────────────
 PG_USER = os.getenv("PG_USER", "username")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
@@ -12,9 +21,11 @@ PG_PORT = int(os.getenv("PG_PORT", 5433))
 # ── Paths (run from preprocessing folder) ────────────────────────────────────
 PAIRS_CSV = "questions_sqls.csv"   # input produced by extractor (in this folder)
 OUT_CSV   = "ground_truth.csv"     # output written here too
+PERMS_CSV = os.getenv("PERMS_CSV", "user_permissions_bird.csv")  # used to fingerprint grants
+LABEL_CACHE = os.getenv("LABEL_CACHE", "label_cache.sqlite")     # set LABEL_CACHE="" to disable
 
-# ── Roles per DB ─────────────────────────────────────────────────────────────
-ROLE_SUFFIXES = ["User_1", "User_2", "User_3", "User_4"]
+# ── Roles per DB ($ROLES_FILE, same spec user_permissions_bird.py used) ──────
+ROLE_SUFFIXES = RoleSpec.load().names
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 MUTATING_PAT = re.compile(
@@ -23,8 +34,6 @@ MUTATING_PAT = re.compile(
 )
 SELECT_PAT   = re.compile(r"^\s*SELECT\b", re.IGNORECASE | re.DOTALL)
 
-BACKTICK_IDENT = re.compile(r"`([^`]+)`")  # `Identifier` → "identifier"
-
 def normalize_dbname(db_id: str) -> str:
     # DBs are named exactly as BIRD db_id (lowercased), no 'bird_' prefix.
     return (db_id or "").strip().lower()
@@ -37,51 +46,71 @@ def is_select(sql_text: str) -> bool:
 
 def normalize_sql_for_postgres(sql_text: str) -> str:
     """
-    Make BIRD gold SQL friendlier to Postgres:
-      - backticks → double quotes (lower-cased to match migrated schema)
-      - CAST ... AS REAL → AS DOUBLE PRECISION
-      - IFNULL(a,b) → COALESCE(a,b)
+    Make BIRD gold SQL friendlier to Postgres (common/sql_translate.py):
+    backticks, AS REAL, IFNULL, IIF, STRFTIME, LIMIT a, b, double-quoted
+    strings, ... Memoised, so each gold SQL is translated once for all roles.
     """
-    if not sql_text:
-        return sql_text
-
-    # 1) `Identifier` -> "identifier" (lowercase)
-    def _bt_sub(m):
-        return '"' + m.group(1).strip().lower() + '"'
-    sql_text = BACKTICK_IDENT.sub(_bt_sub, sql_text)
-
-    # 2) AS REAL → AS DOUBLE PRECISION (covers CAST/expressions)
-    sql_text = re.sub(r"\bAS\s+REAL\b", "AS DOUBLE PRECISION", sql_text, flags=re.IGNORECASE)
-
-    # 3) IFNULL(a,b) → COALESCE(a,b)
-    #    naive but effective; doesn't try to balance nested parens deeply
-    sql_text = re.sub(r"\bIFNULL\s*\(", "COALESCE(", sql_text, flags=re.IGNORECASE)
-
-    return sql_text
+    translated, rewrites = translate(sql_text)
+    for rule in rewrites:
+        METRICS.inc("sql_rewrites", rule=rule)
+    return translated
 
 def wrap_select_limit1(sql_text: str) -> str:
     """Cap results safely to 1 row via a wrapper CTE."""
     return f"WITH __q AS (\n{(sql_text or '').rstrip(';')}\n) SELECT * FROM __q LIMIT 1;"
 
 def connect(dbname):
+    METRICS.inc("connection_opens", db=dbname)
     return psycopg2.connect(
         dbname=dbname, user=PG_USER, password=PG_PASSWORD,
         host=PG_HOST, port=PG_PORT
     )
 
+SESSIONS = SessionCache(connect)  # schema layout: one warm session for the whole corpus
+
+SESSION_SETUP = sql.SQL(
+    "SET statement_timeout = '15s'; SET lock_timeout = '5s'; "
+    "SET idle_in_transaction_session_timeout = '10s'; "
+    "SET search_path TO {}; SET ROLE {};"
+)
+
+SCHEMA_FPS = {}
+
+def schema_fp(dbname: str):
+    """Schema fingerprint of dbname as loaded, once per run; None if it cannot be read."""
+    if dbname not in SCHEMA_FPS:
+        pg_database, schema = target(dbname)
+        conn = None
+        try:
+            conn = SESSIONS.get(pg_database) if consolidated() else connect(pg_database)
+            with conn.cursor() as cur:
+                SCHEMA_FPS[dbname] = schema_fingerprint(cur, schema)
+        except psycopg2.Error:
+            if consolidated():
+                SESSIONS.discard(pg_database)
+            return None   # not cached: try_exec reports the failure
+        finally:
+            if conn is not None and not consolidated():
+                conn.close()
+    return SCHEMA_FPS[dbname]
+
 def try_exec(dbname: str, role: str, sql_wrapped: str):
+    pg_database, schema = target(dbname)
+    conn = None
     try:
-        with connect(dbname) as conn, conn.cursor() as cur:
+        if consolidated():
+            conn = SESSIONS.get(pg_database)
+        else:
+            conn = connect(pg_database)
             conn.autocommit = True
-            cur.execute("SET statement_timeout = '15s';")
-            cur.execute("SET lock_timeout = '5s';")
-            cur.execute("SET idle_in_transaction_session_timeout = '10s';")
-            cur.execute("SET search_path TO public;")
-            # switch role
-            cur.execute(sql.SQL('SET ROLE {}').format(sql.Identifier(role)))
+        with conn.cursor() as cur:
+            # timeouts, schema and role in one round trip
+            cur.execute(SESSION_SETUP.format(sql.Identifier(schema), sql.Identifier(role)))
 
+            t0 = time.perf_counter()
             try:
                 cur.execute(sql_wrapped)
+                METRICS.query(time.perf_counter() - t0, sql_wrapped, db=dbname, role=role)
                 # success → reset and return
                 cur.execute("RESET ROLE;")
                 return True, "", ""
@@ -89,6 +118,7 @@ def try_exec(dbname: str, role: str, sql_wrapped: str):
                 # capture original error
                 code = getattr(e, 'pgcode', '') or ''
                 msg  = str(e).replace('\n', ' ')[:400]
+                METRICS.query(time.perf_counter() - t0, sql_wrapped, code=code, db=dbname, role=role)
                 # rollback this failed tx, then reset role safely
                 try:
                     conn.rollback()
@@ -97,87 +127,123 @@ def try_exec(dbname: str, role: str, sql_wrapped: str):
                 try:
                     cur.execute("RESET ROLE;")
                 except Exception:
-                    pass
+                    # a shared session must never keep a user role → drop it
+                    SESSIONS.discard(pg_database)
                 return False, code, msg
     except Exception as e:
         code = getattr(e, 'pgcode', '') or ''
         msg  = str(e).replace('\n', ' ')[:400]
+        METRICS.inc("session_failures", db=dbname, role=role)
+        if consolidated() and (conn is None or conn.closed):
+            SESSIONS.discard(pg_database)
         return False, code, msg
+    finally:
+        if conn is not None and not consolidated():
+            conn.close()
+
+
+OUT_FIELDS = ["split", "db_id", "qid", "dbname", "role", "permit", "sqlstate", "error",
+              "question", "sql_original", "sql_wrapped", "evidence"]
+
+
+def label_pair(row, cache=None, grant_fps=None):
+    """
+    Output rows for one questions_sqls.csv row: one per role, a single SKIP row
+    for non-SELECT SQL, or none when db_id/SQL is missing.
+    """
+    split    = (row.get("split") or "").strip()
+    qid      = (row.get("qid") or "").strip()
+    question = (row.get("question") or "").strip()
+    sql_text = (row.get("gold_sql") or "").strip()
+    db_id    = (row.get("db_id") or "").strip()
+    evidence = (row.get("evidence") or "").strip()
+
+    dbname = normalize_dbname(db_id)
+    if not dbname or not sql_text:
+        return []
+
+    # Only evaluate SELECTs; mark others
+    if is_mutating(sql_text) or not is_select(sql_text):
+        return [{
+            "split": split,
+            "db_id": db_id,
+            "qid": qid,
+            "dbname": dbname,
+            "role": "",
+            "permit": 0,
+            "sqlstate": "SKIP",
+            "error": "mutating_or_nonselect_sql",
+            "question": question,
+            "sql_original": sql_text,
+            "sql_wrapped": "",
+            "evidence": evidence,
+        }]
+
+    # Normalize to PG (handle backticks, REAL, IFNULL, etc.)
+    sql_text_norm = normalize_sql_for_postgres(sql_text)
+    sql_wrapped = wrap_select_limit1(sql_text_norm)
+
+    # Evaluate for every role
+    out = []
+    db_fp = schema_fp(dbname) if cache is not None else None
+    for suf in ROLE_SUFFIXES:
+        role = f"{dbname}_{suf}"
+        if db_fp is not None:
+            key = cache.key(dbname, role, sql_wrapped, (grant_fps or {}).get(role, ""), db_fp)
+            hit = cache.get(key)
+            if hit is not None:
+                permitted, code, msg = hit
+                METRICS.inc("label_cache_hits", db=dbname)
+            else:
+                permitted, code, msg = try_exec(dbname, role, sql_wrapped)
+                cache.put(key, permitted, code, msg)
+        else:
+            permitted, code, msg = try_exec(dbname, role, sql_wrapped)
+        METRICS.inc("pairs_labelled", db=dbname, decision="PERMIT" if permitted else "DENY")
+        out.append({
+            "split": split,
+            "db_id": db_id,
+            "qid": qid,
+            "dbname": dbname,
+            "role": role,
+            "permit": 1 if permitted else 0,
+            "sqlstate": code,
+            "error": "" if permitted else msg,
+            "question": question,
+            "sql_original": sql_text,       # keep original for transparency
+            "sql_wrapped": sql_wrapped,     # wrapped, normalized SQL actually executed
+            "evidence": evidence,
+        })
+    return out
 
 
 def main():
     if not os.path.isfile(PAIRS_CSV):
         raise SystemExit(f"❌ Missing {PAIRS_CSV}. Run extract-questions-SQLs-bird.py first (CSV output).")
 
+    cache, grant_fps = open_label_cache(LABEL_CACHE, PERMS_CSV)
+
     out_rows = []
     with open(PAIRS_CSV, newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            split    = (row.get("split") or "").strip()
-            qid      = (row.get("qid") or "").strip()
-            question = (row.get("question") or "").strip()
-            sql_text = (row.get("gold_sql") or "").strip()
-            db_id    = (row.get("db_id") or "").strip()
-            evidence = (row.get("evidence") or "").strip()
-
-            dbname = normalize_dbname(db_id)
-            if not dbname or not sql_text:
-                continue
-
-            # Only evaluate SELECTs; mark others
-            if is_mutating(sql_text) or not is_select(sql_text):
-                out_rows.append({
-                    "split": split,
-                    "db_id": db_id,
-                    "qid": qid,
-                    "dbname": dbname,
-                    "role": "",
-                    "permit": 0,
-                    "sqlstate": "SKIP",
-                    "error": "mutating_or_nonselect_sql",
-                    "question": question,
-                    "sql_original": sql_text,
-                    "sql_wrapped": "",
-                    "evidence": evidence,
-                })
-                continue
-
-            # Normalize to PG (handle backticks, REAL, IFNULL, etc.)
-            sql_text_norm = normalize_sql_for_postgres(sql_text)
-            sql_wrapped = wrap_select_limit1(sql_text_norm)
-
-            # Evaluate for all four roles
-            for suf in ROLE_SUFFIXES:
-                role = f"{dbname}_{suf}"
-                permitted, code, msg = try_exec(dbname, role, sql_wrapped)
-                out_rows.append({
-                    "split": split,
-                    "db_id": db_id,
-                    "qid": qid,
-                    "dbname": dbname,
-                    "role": role,
-                    "permit": 1 if permitted else 0,
-                    "sqlstate": code,
-                    "error": "" if permitted else msg,
-                    "question": question,
-                    "sql_original": sql_text,       # keep original for transparency
-                    "sql_wrapped": sql_wrapped,     # wrapped, normalized SQL actually executed
-                    "evidence": evidence,
-                })
+        for row in csv.DictReader(f):
+            out_rows.extend(label_pair(row, cache, grant_fps))
+
+    if cache is not None:
+        cache.close()
+        print(f"ℹ️ Label cache {LABEL_CACHE}: {cache.hits} hit(s), {cache.misses} executed")
 
     # Write out (in current folder)
     with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=[
-            "split","db_id","qid","dbname","role","permit","sqlstate","error",
-            "question","sql_original","sql_wrapped","evidence"
-        ])
+        w = csv.DictWriter(f, fieldnames=OUT_FIELDS)
         w.writeheader()
         w.writerows(out_rows)
 
+    SESSIONS.close()
     total = sum(1 for r in out_rows if r["role"])
     permits = sum(1 for r in out_rows if r["role"] and r["permit"] == 1)
     print(f"✅ Wrote {OUT_CSV}")
     print(f"ℹ️ Evaluated {total} (role, query) pairs; permitted={permits}, denied={total-permits}")
+    METRICS.report()
 
 if __name__ == "__main__":
     main()
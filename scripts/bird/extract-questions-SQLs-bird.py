@@ -1,13 +1,31 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import json, csv, os, sys, re, argparse
+"""
+Unify BIRD dev + train questions into one JSONL (and optionally a CSV).
+
+The JSON inputs are streamed (common/json_stream.py) and both outputs are
+written from the same record stream, so memory does not grow with the size
+of train.json. Repeated (db_id, question, sql) records are written once.
+"""
+import json, csv, os, sys, re, hashlib, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.json_stream import NotAnArray, iter_json_array
+from common.metrics import Metrics
+
+METRICS = Metrics("bird_extract")
 
 # ---------- helpers ----------
-def load_json(path):
+GOLD_HEADER = re.compile(r"\s*--\s*db:\s*([^\s]+)\s+qid:\s*([^\s]+)\s*$", re.I)
+
+def iter_json(path):
+    """Stream the items of a BIRD JSON array file; nothing if it is missing or not an array."""
     if not os.path.isfile(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return
+    try:
+        yield from iter_json_array(path)
+    except NotAnArray as e:
+        print(f"⚠️  {e}, skipped", file=sys.stderr)
 
 def normalize_item(item, default_qid):
     q = item.get("question") or item.get("utterance") or ""
@@ -18,13 +36,14 @@ def normalize_item(item, default_qid):
     return {"question": q, "sql": sql, "db_id": dbid, "evidence": evidence, "qid": qid}
 
 def load_gold_sql_map(sql_path):
+    """{(db, qid): sql} from '-- db: X qid: Y' blocks, one pass over the file."""
     if not os.path.isfile(sql_path):
         return {}
     m = {}
     with open(sql_path, "r", encoding="utf-8") as f:
         cur_db, cur_qid, buf = None, None, []
         for line in f:
-            cm = re.match(r"\s*--\s*db:\s*([^\s]+)\s+qid:\s*([^\s]+)\s*$", line, re.I)
+            cm = GOLD_HEADER.match(line) if "--" in line else None
             if cm:
                 if cur_db and cur_qid and buf:
                     m[(cur_db, cur_qid)] = "".join(buf).strip().rstrip(";")
@@ -36,11 +55,37 @@ def load_gold_sql_map(sql_path):
             m[(cur_db, cur_qid)] = "".join(buf).strip().rstrip(";")
     return m
 
-def write_jsonl(path, rows):
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        for r in rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+class GoldSQL:
+    """Gold SQL lookup for items without an inline query; the file is parsed on first use."""
+
+    def __init__(self, sql_path):
+        self.sql_path = sql_path
+        self.map = None
+
+    def get(self, db_id, qid):
+        if self.map is None:
+            with METRICS.timer("load_gold_sql"):
+                self.map = load_gold_sql_map(self.sql_path)
+        return self.map.get((db_id, qid), "")
+
+def iter_records(dev_json, dev_sql, train_json, train_sql, tied_index):
+    """Unified records (dev first, then train) with a 'split' field, one at a time."""
+    for split, json_path, gold in (("dev", dev_json, GoldSQL(dev_sql)), ("train", train_json, GoldSQL(train_sql))):
+        for i, item in enumerate(iter_json(json_path)):
+            norm = normalize_item(item, default_qid=i)
+            if split == "dev" and not norm["evidence"]:
+                norm["evidence"] = tied_index.get((norm["question"], norm["db_id"]), "")
+            if not norm["sql"]:
+                norm["sql"] = gold.get(norm["db_id"], norm["qid"])
+            yield {"split": split, **norm}
+
+def record_digest(r):
+    # de-duplication key (db_id, question, sql), 16 bytes per record kept in memory
+    h = hashlib.blake2b(digest_size=16)
+    for part in (r["db_id"], r["question"], r["sql"]):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.digest()
 
 # ---------- main ----------
 def main():
@@ -60,6 +105,8 @@ def main():
     ap.add_argument("--also_csv", action="store_true",
                     help="Also write a CSV summary for convenience")
     ap.add_argument("--out_csv", default="../data/questions_sqls.csv")
+    ap.add_argument("--keep_duplicates", action="store_true",
+                    help="Keep repeated (db_id, question, sql) records")
     args = ap.parse_args()
 
     bird_dir = args.bird_dir
@@ -69,69 +116,56 @@ def main():
     train_sql  = args.train_sql  or os.path.join(bird_dir, "train_gold.sql")
     tied_path  = args.tied_append or os.path.join(bird_dir, "dev_tied_append.json")
 
-    dev   = load_json(dev_json)
-    train = load_json(train_json)
-    tied  = load_json(tied_path)
-
     # optional evidence index for dev
     tied_index = {}
-    if isinstance(tied, list):
-        for i, item in enumerate(tied):
+    with METRICS.timer("load_tied_evidence"):
+        for i, item in enumerate(iter_json(tied_path)):
             tnorm = normalize_item(item, default_qid=i)
-            key = (tnorm["question"], tnorm["db_id"])
-            if key not in tied_index:
-                tied_index[key] = tnorm.get("evidence", "")
-
-    dev_gold   = load_gold_sql_map(dev_sql)
-    train_gold = load_gold_sql_map(train_sql)
-
-    unified = []         # JSONL rows with 'split'
-    summary_rows = []    # optional CSV
-
-    # DEV (include all)
-    if isinstance(dev, list) and dev:
-        for i, item in enumerate(dev):
-            norm = normalize_item(item, default_qid=i)
-            key = (norm["question"], norm["db_id"])
-            if key in tied_index and not norm["evidence"]:
-                norm["evidence"] = tied_index[key]
-            if not norm["sql"]:
-                norm["sql"] = dev_gold.get((norm["db_id"], norm["qid"]), "")
-            unified.append({"split":"dev", **norm})
-            summary_rows.append({"split":"dev", **norm})
-
-    # TRAIN (include all)
-    if isinstance(train, list) and train:
-        for i, item in enumerate(train):
-            norm = normalize_item(item, default_qid=i)
-            if not norm["sql"]:
-                norm["sql"] = train_gold.get((norm["db_id"], norm["qid"]), "")
-            unified.append({"split":"train", **norm})
-            summary_rows.append({"split":"train", **norm})
+            tied_index.setdefault((tnorm["question"], tnorm["db_id"]), tnorm.get("evidence", ""))
+
+    # one pass over the record stream, JSONL and CSV written side by side
+    outputs = [args.out_jsonl] + ([args.out_csv] if args.also_csv else [])
+    for path in outputs:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    seen, dbs = set(), set()
+    n_written = n_dupes = 0
+    with METRICS.timer("stream_records"), open(args.out_jsonl + ".tmp", "w", encoding="utf-8") as fj, \
+            open(args.out_csv + ".tmp" if args.also_csv else os.devnull, "w", newline="", encoding="utf-8") as fc:
+        w = csv.writer(fc)
+        if args.also_csv:
+            w.writerow(["split","db_id","qid","question","gold_sql","evidence"])
+        for r in iter_records(dev_json, dev_sql, train_json, train_sql, tied_index):
+            if not args.keep_duplicates:
+                d = record_digest(r)
+                if d in seen:
+                    n_dupes += 1
+                    continue
+                seen.add(d)
+            fj.write(json.dumps(r, ensure_ascii=False) + "\n")
+            if args.also_csv:
+                w.writerow([r["split"], r["db_id"], r["qid"], r["question"], r["sql"], r["evidence"]])
+            dbs.add(r["db_id"])
+            n_written += 1
 
-    if not unified:
+    if not n_written:
+        for path in outputs:
+            os.remove(path + ".tmp")
         print("❌ No data found. Check dev/train JSON and SQL maps.", file=sys.stderr)
         sys.exit(1)
+    for path in outputs:
+        os.replace(path + ".tmp", path)
 
-    # Write unified JSONL
-    write_jsonl(args.out_jsonl, unified)
-
-    # Optional CSV summary
-    if args.also_csv:
-        os.makedirs(os.path.dirname(args.out_csv) or ".", exist_ok=True)
-        with open(args.out_csv, "w", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            w.writerow(["split","db_id","qid","question","gold_sql","evidence"])
-            for r in summary_rows:
-                w.writerow([r["split"], r["db_id"], r["qid"], r["question"], r["sql"], r["evidence"]])
-
-    print(f"✅ Wrote unified JSONL → {args.out_jsonl}  (rows: {len(unified)})")
+    print(f"✅ Wrote unified JSONL → {args.out_jsonl}  (rows: {n_written})")
     if args.also_csv:
-        print(f"   and CSV summary   → {args.out_csv}      (rows: {len(summary_rows)})")
+        print(f"   and CSV summary   → {args.out_csv}      (rows: {n_written})")
+    if n_dupes:
+        print(f"ℹ️  Dropped {n_dupes} duplicate (db_id, question, sql) record(s)")
 
-    dbs = sorted({r['db_id'] for r in unified})
+    dbs = sorted(dbs)
     print(f"ℹ️  Unique DBs in unified file: {len(dbs)} → {dbs[:20]}{' ...' if len(dbs) > 20 else ''}")
+    METRICS.inc("records_written", n_written)
+    METRICS.inc("duplicates_dropped", n_dupes)
+    METRICS.report()
 
 if __name__ == "__main__":
     main()
-
@@ -1,15 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, re, sqlite3, datetime, subprocess, psycopg2
+import os, re, sys, time, datetime, subprocess, psycopg2
 from psycopg2 import sql, extras
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.layout import PG_CORPUS_DB, consolidated, target
+from common.load_profile import FinishPass, WalMeter, create_table_sql, finish_pass
+from common.sqlite_indexes import IndexRebuild
+from common.sqlite_reader import open_source, iter_batches
+from common.type_profile import TYPE_CACHE, TypeProfiler, DoesNotFit
+
+METRICS = Metrics("bird_load")
+
 # ── Postgres connection ───────────────────────────────────────────────────────
 PG_USER = os.getenv("PG_USER", "username")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
 PG_HOST = os.getenv("PG_HOST", "localhost")
 PG_PORT = int(os.getenv("PG_PORT", 5433))  # Postgres exposed on 5433
+PG_ADMIN_DB = os.getenv("PG_ADMIN_DB", "birddb")  # used to list existing databases
 
 # ── Path to all SQLite DBs ───────────────────────────────────────────────────
 BIRD_DB_ROOT = os.getenv(
@@ -20,6 +31,7 @@ BIRD_DB_ROOT = os.getenv(
 # ── Performance tuning ───────────────────────────────────────────────────────
 BATCH_SIZE = 5000
 MAX_WORKERS = 4
+LOAD_INDEXES = os.getenv("LOAD_INDEXES", "0") == "1"  # rebuild SQLite keys/indexes after the load
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
@@ -57,6 +69,7 @@ def createdb(db_name: str):
 
 
 def connect_pg(db_name: str):
+    METRICS.inc("connection_opens", db=db_name)
     return psycopg2.connect(
         dbname=db_name, user=PG_USER, password=PG_PASSWORD, host=PG_HOST, port=PG_PORT
     )
@@ -125,19 +138,81 @@ def parse_dateish(val):
     return None
 
 
+def clean_value(col_name, val):
+    """Decode bytes and map the null markers; shared by the profiler and the load."""
+    if isinstance(val, bytes):
+        try:
+            val = val.decode("utf-8", "replace")
+        except Exception:
+            val = ""
+    if isinstance(val, str):
+        v = val.strip()
+        if v in {"0000-00-00", "0000/00/00"} or v.upper() == "NULL":
+            val = None
+    return val
+
+
+def clean_column(col_name, values):
+    """clean_value() over one column of a batch; numbers and NULLs pass through."""
+    return [clean_value(col_name, v) if isinstance(v, (bytes, str)) else v for v in values]
+
+
+def legacy_date(val):
+    if isinstance(val, int):
+        if 10101 <= val <= 99991231:
+            try:
+                return datetime.date(val // 10000, (val % 10000) // 100, val % 100)
+            except Exception:
+                return parse_dateish(val)
+        return parse_dateish(val)
+    if isinstance(val, str):
+        return parse_dateish(val)
+    return val
+
+
+def convert_column(types, idx, values):
+    """Convert one cleaned column to its Postgres type, choosing the conversion once."""
+    pg_type = types.types[idx]
+    if types.profiled[idx]:
+        return types.fit_column(idx, values)
+    if pg_type not in ("TEXT", "VARCHAR"):
+        values = [None if v == "" else v for v in values]
+    if pg_type in ("TIMESTAMP", "DATE"):
+        values = [legacy_date(v) for v in values]
+    return values
+
+
+def report_types(types, pg_db):
+    """Count inferred types; returns the number of columns whose type changed."""
+    for t in types.types:
+        METRICS.inc("column_types", db=pg_db, type=t, source=types.source)
+    changed = types.changed()
+    if changed:
+        METRICS.inc("columns_retyped", len(changed), db=pg_db)
+    return len(changed)
+
+
 def migrate_one_sqlite(sqlite_path: str):
     dbid = os.path.splitext(os.path.basename(sqlite_path))[0]
     pg_db = dbid.lower()  # ← no prefix
-    createdb(pg_db)
+    t_db = time.perf_counter()
+    pg_database, schema = target(pg_db)
+    if not consolidated():
+        createdb(pg_database)
 
-    sqlite_conn = sqlite3.connect(sqlite_path)
-    sqlite_conn.text_factory = bytes
+    sqlite_conn = open_source(sqlite_path)
     s_cur = sqlite_conn.cursor()
 
-    pg_conn = connect_pg(pg_db)
+    pg_conn = connect_pg(pg_database)
     pg_conn.autocommit = False
     p_cur = pg_conn.cursor()
 
+    if consolidated():
+        # one schema per source DB; unqualified names below resolve into it
+        p_cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(schema)))
+        p_cur.execute(sql.SQL("SET search_path TO {}").format(sql.Identifier(schema)))
+        pg_conn.commit()
+
     p_cur.execute("SET synchronous_commit TO OFF;")
     p_cur.execute("SET client_min_messages TO WARNING;")
     p_cur.execute("SET work_mem TO '128MB';")
@@ -149,13 +224,16 @@ def migrate_one_sqlite(sqlite_path: str):
         for row in s_cur.fetchall()
     ]
 
+    profiler = TypeProfiler(sqlite_path, pg_db, clean_value)
+    n_columns = n_retyped = n_kept = 0
     for table in tables:
         table_l = table.lower()
+        t_table = time.perf_counter()
 
         s_cur.execute(f'PRAGMA table_info("{table}")')
         cols_info = s_cur.fetchall()
 
-        columns, col_defs_list = [], []
+        columns, declared = [], []
         for col in cols_info:
             col_name = col[1]
             col_type = col[2]
@@ -164,81 +242,87 @@ def migrate_one_sqlite(sqlite_path: str):
             if isinstance(col_type, bytes):
                 col_type = col_type.decode("utf-8", "replace")
             col_name = col_name.lower()
-            pg_type = map_sqlite_type_to_postgres(col_type, col_name)
             columns.append(col_name)
-            col_defs_list.append(f'"{col_name}" {pg_type}')
-        col_defs = ", ".join(col_defs_list)
-
-        p_cur.execute(sql.SQL('DROP TABLE IF EXISTS {} CASCADE').format(sql.Identifier(table_l)))
-        p_cur.execute(sql.SQL('CREATE UNLOGGED TABLE {} ({})').format(sql.Identifier(table_l), sql.SQL(col_defs)))
-
-        s_cur.execute(f'SELECT * FROM "{table}"')
-
-        def gen_rows():
-            first_row_checked = False
-            for row in s_cur:
-                raw = list(row)
-
-                if not first_row_checked:
-                    header_check_vals = []
-                    for idx, val in enumerate(raw):
-                        if isinstance(val, bytes):
-                            try:
-                                val = val.decode("utf-8", "replace")
-                            except Exception:
-                                val = ""
-                        header_check_vals.append(val)
-                    if is_header_like(header_check_vals, columns):
-                        first_row_checked = True
-                        continue
-                    first_row_checked = True
-
-                clean = []
-                for idx, val in enumerate(raw):
-                    if isinstance(val, bytes):
-                        try:
-                            val = val.decode("utf-8", "replace")
-                        except Exception:
-                            val = ""
-                    if isinstance(val, str):
-                        v = val.strip()
-                        if v in {"0000-00-00", "0000/00/00"} or v.upper() == "NULL":
-                            val = None
-                    target_pg_type = col_defs_list[idx].split()[-1].upper()
-                    if val == "" and target_pg_type not in ["TEXT", "VARCHAR"]:
-                        val = None
-                    if target_pg_type in ["TIMESTAMP", "DATE"]:
-                        if isinstance(val, int):
-                            if 10101 <= val <= 99991231:
-                                try:
-                                    y = val // 10000
-                                    m = (val % 10000) // 100
-                                    d = val % 100
-                                    val = datetime.date(y, m, d)
-                                except Exception:
-                                    val = parse_dateish(val)
-                            else:
-                                val = parse_dateish(val)
-                        elif isinstance(val, str):
-                            val = parse_dateish(val)
-                    clean.append(val)
-
-                if all(c is None for c in clean):
-                    continue
-                yield clean
-
-        copy_table(p_cur, table_l, gen_rows(), len(columns))
-        pg_conn.commit()
-        p_cur.execute(sql.SQL('ALTER TABLE {} SET LOGGED').format(sql.Identifier(table_l)))
-        pg_conn.commit()
+            declared.append(map_sqlite_type_to_postgres(col_type, col_name))
+
+        profiler.skip_first = lambda vals: is_header_like(vals, columns)
+        t_profile = time.perf_counter()
+        types = profiler.table(table_l, columns, declared)
+        METRICS.observe("type_profile", time.perf_counter() - t_profile, db=pg_db)
+        n_columns += len(columns)
+        n_kept += sum(types.kept)
+        n_retyped += report_types(types, pg_db)
+
+        p_cur.execute("SAVEPOINT table_load")
+        while True:
+            stats = {"rows": 0, "bytes": 0, "header": 0, "all_null": 0}
+            col_defs = ", ".join(f'"{c}" {t}' for c, t in zip(columns, types.types))
+            p_cur.execute(sql.SQL('DROP TABLE IF EXISTS {} CASCADE').format(sql.Identifier(table_l)))
+            # same transaction as the fill: with LOAD_PROFILE=bulk the server can skip WAL for it
+            p_cur.execute(sql.SQL(create_table_sql(True) + ' {} ({})').format(
+                sql.Identifier(table_l), sql.SQL(col_defs)))
+
+            def gen_rows():
+                first = True
+                for batch in iter_batches(sqlite_conn, table):
+                    if first:
+                        first = False
+                        head = [v.decode("utf-8", "replace") if isinstance(v, bytes) else v
+                                for v in (c[0] for c in batch.columns)] if batch.n else []
+                        if head and is_header_like(head, columns):
+                            stats["header"] += 1
+                            batch.drop_first()
+                    stats["bytes"] += batch.nbytes
+                    cols = [convert_column(types, idx, clean_column(columns[idx], values))
+                            for idx, values in enumerate(batch.columns)]
+                    for row in zip(*cols):
+                        if all(c is None for c in row):
+                            stats["all_null"] += 1
+                            continue
+                        stats["rows"] += 1
+                        yield row
+
+            try:
+                copy_table(p_cur, table_l, gen_rows(), len(columns))
+                break
+            except DoesNotFit as e:
+                # value outside the profile (sampling): widen the column and reload the table
+                p_cur.execute("ROLLBACK TO SAVEPOINT table_load")
+                new = types.widen(e.index, e.value)
+                METRICS.inc("type_fallbacks", db=pg_db, table=table_l, column=columns[e.index])
+                print(f"↩️  {pg_db}.{table_l}.{columns[e.index]}: {e.value!r} does not fit {e.pg_type}, reloading as {new}")
 
+        pg_conn.commit()
+        if not finish_pass():
+            t_logged = time.perf_counter()
+            p_cur.execute(sql.SQL('ALTER TABLE {} SET LOGGED').format(sql.Identifier(table_l)))
+            pg_conn.commit()
+            METRICS.observe("set_logged", time.perf_counter() - t_logged, db=pg_db)
+        METRICS.observe("table_load", time.perf_counter() - t_table, db=pg_db, table=table_l)
+        METRICS.inc("rows_loaded", stats["rows"], db=pg_db, table=table_l)
+        METRICS.inc("bytes_read", stats["bytes"], db=pg_db, table=table_l)
+        for reason in ("header", "all_null"):
+            if stats[reason]:
+                METRICS.inc("rows_skipped", stats[reason], db=pg_db, table=table_l, reason=reason)
+
+    profiler.close()
+    if profiler.mode != "off":
+        print(f"🔎 {pg_db}: {n_retyped}/{n_columns} column type(s) inferred from data ({TYPE_CACHE}), "
+              f"{n_kept} kept as declared (TYPE_PROFILE_KEEP)")
     p_cur.close()
     pg_conn.close()
     sqlite_conn.close()
+    METRICS.observe("db_load", time.perf_counter() - t_db, db=pg_db)
     print(f"✅ done: {pg_db}")
     return pg_db
 
 
+def migrate_worker(sqlite_path: str):
+    """Process-pool entry point: migrate one file and hand its metrics back."""
+    pg_db = migrate_one_sqlite(sqlite_path)
+    return pg_db, METRICS.drain()
+
+
 def find_all_sqlites(root_dir: str):
     hits = []
     for r, _, files in os.walk(root_dir):
@@ -249,13 +333,18 @@ def find_all_sqlites(root_dir: str):
 
 
 def get_existing_dbs():
+    if consolidated():
+        # already-loaded source DBs are the schemas of the corpus database
+        dbname, query = PG_CORPUS_DB, "SELECT nspname FROM pg_namespace;"
+    else:
+        dbname, query = PG_ADMIN_DB, "SELECT datname FROM pg_database WHERE datistemplate = false;"
     cmd = [
         "psql", "-h", PG_HOST, "-p", str(PG_PORT),
-        "-U", PG_USER, "-d", "birddb",
-        "-Atc", "SELECT datname FROM pg_database WHERE datistemplate = false;"
+        "-U", PG_USER, "-d", dbname,
+        "-Atc", query
     ]
     result = subprocess.run(
-        cmd, check=True, capture_output=True, text=True,
+        cmd, check=not consolidated(), capture_output=True, text=True,
         env={**os.environ, "PGPASSWORD": PG_PASSWORD}
     )
     return set(line.strip() for line in result.stdout.splitlines() if line.strip())
@@ -271,6 +360,10 @@ def main():
         print("❌ No SQLite files found.")
         return
 
+    if consolidated():
+        createdb(PG_CORPUS_DB)
+        print(f"🗃️  Schema layout: every database becomes a schema of {PG_CORPUS_DB}")
+
     existing = get_existing_dbs()
     todo = []
     for sp in sqlites:
@@ -283,16 +376,35 @@ def main():
 
     print(f"➡️  Will migrate {len(todo)} database(s).")
 
+    wal = WalMeter(connect_pg, PG_ADMIN_DB, METRICS)
+    loaded = []
     if todo:
-        with ProcessPoolExecutor(max_workers=MAX_WORKERS) as ex:
-            futs = [ex.submit(migrate_one_sqlite, sp) for sp in todo]
+        with wal.phase("load"), ProcessPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            futs = {ex.submit(migrate_worker, sp): sp for sp in todo}
             for f in as_completed(futs):
                 try:
-                    f.result()
+                    pg_db, snap = f.result()
+                    METRICS.merge(snap)
+                    loaded.append(pg_db)
                 except Exception as e:
+                    METRICS.inc("worker_failures", db=os.path.basename(futs[f]))
                     print("❌ worker failed:", e)
 
+    if loaded and finish_pass():
+        # the index rebuild analyses each table itself
+        with wal.phase("finish"):
+            FinishPass(connect_pg, workers=MAX_WORKERS, analyze=not LOAD_INDEXES, metrics=METRICS).run(loaded)
+
+    if LOAD_INDEXES:
+        files = {os.path.splitext(os.path.basename(sp))[0].lower(): sp for sp in sqlites}
+        with wal.phase("rebuild_indexes"):
+            counts = IndexRebuild(connect_pg, workers=MAX_WORKERS, metrics=METRICS).run(files)
+        print(f"🗂️  indexes: {counts.get('indexes_built', 0)} built on {counts.get('tables', 0)} table(s), "
+              f"{counts.get('index_failures', 0)} failed")
+    wal.close()
+
     print("🎉 Full BIRD databases migration completed.")
+    METRICS.report()
 
 
 if __name__ == "__main__":
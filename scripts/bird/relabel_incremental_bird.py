@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental relabelling after a grant change.
+
+Diffs the permission table the current ground_truth.csv was labelled with
+(--old_perms) against the new one (--perms), and re-executes in Postgres only
+the (query, role) pairs whose label can have changed:
+
+  • the role's grants changed, and
+  • the query reads a column that was granted or revoked, or counts rows of a
+    table the role gained or lost all access to (COUNT(*) semantics), or
+  • the query's dependencies are unknown (not in query_deps.sqlite, or it did
+    not compile in SQLite) → re-executed to be safe
+
+ground_truth.csv is patched in place. If the dataset JSONL exists, its records
+for relabelled pairs (and for every pair of a database whose policy changed)
+are rebuilt with the builder's own make_record(); all other lines are copied
+byte for byte. Pass the same --drop_nonselect_or_skip /
+--only_privilege_or_permit flags the JSONL was built with.
+
+Typical loop (run from the preprocessing folder):
+    cp user_permissions_bird.csv user_permissions_bird.prev.csv
+    SEED=7 python ../scripts/bird/user_permissions_bird.py
+    python ../scripts/bird/access-policies-per-db-bird.py
+    python ../scripts/bird/relabel_incremental_bird.py --old_perms user_permissions_bird.prev.csv
+
+Labels for the changed roles are also written to the label cache under the
+new grant fingerprints, so a later full run of dataset-groundtruth-bird.py
+does not re-execute them.
+"""
+
+import os, sys, csv, json, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.deps_index import DependencyIndex
+from common.label_cache import open_label_cache
+from common.metrics import Metrics
+from common.script_loader import load_script
+from common.sqlite_acl import load_role_grants
+
+METRICS = Metrics("bird_relabel")
+
+GT_FIELDS = ["split", "db_id", "qid", "dbname", "role", "permit", "sqlstate", "error",
+             "question", "sql_original", "sql_wrapped", "evidence"]
+
+
+def grant_changes(old, new):
+    """
+    {role: (changed columns {(table, column)}, tables whose any-column access flipped)}
+    for every role whose grants differ between two load_role_grants() results.
+    """
+    changes = {}
+    for role in set(old) | set(new):
+        o, n = old.get(role, {}), new.get(role, {})
+        if o == n:
+            continue
+        o_cols = {(t, c) for t, cols in o.items() for c in cols}
+        n_cols = {(t, c) for t, cols in n.items() for c in cols}
+        flipped = {t for t in set(o) | set(n) if bool(o.get(t)) != bool(n.get(t))}
+        changes[role] = (o_cols ^ n_cols, flipped)
+    return changes
+
+
+def is_affected(refs, changed_cols, flipped_tables):
+    for tbl, col in refs:
+        if col and (tbl, col) in changed_cols:
+            return True
+        if not col and tbl in flipped_tables:
+            return True
+    return False
+
+
+def write_csv_atomic(path, rows, fields):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        w.writerows(rows)
+    os.replace(tmp, path)
+
+
+def row_key(split, qid, dbname, role):
+    return (split or "", qid or "", (dbname or "").strip().lower(), role or "")
+
+
+def patch_jsonl(path, gt_rows, rebuild, builder, pol, drop_skip, only_priv):
+    """Rewrite `path`: rebuilt records for keys in `rebuild`, verbatim lines otherwise."""
+    old_lines = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            ex = json.loads(line)
+            old_lines[row_key(ex.get("split"), ex.get("qid"), ex.get("dbname"), ex.get("user"))] = line
+
+    tmp, n_rebuilt = path + ".tmp", 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        for row in gt_rows:
+            k = row_key(row["split"], row["qid"], row["dbname"], row["role"])
+            if k not in rebuild:
+                if k in old_lines:
+                    f.write(old_lines[k])
+                continue
+            row = dict(row, permit=int(row["permit"]))
+            if builder.keep_row(row, drop_skip, only_priv):
+                f.write(json.dumps(builder.make_record(row, pol), ensure_ascii=False) + "\n")
+                n_rebuilt += 1
+    os.replace(tmp, path)
+    return n_rebuilt
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-label only the pairs affected by a grant change.")
+    ap.add_argument("--old_perms", required=True, help="Permissions the current ground truth was labelled with")
+    ap.add_argument("--perms", default="user_permissions_bird.csv")
+    ap.add_argument("--groundtruth", default="ground_truth.csv")
+    ap.add_argument("--deps", default="query_deps.sqlite",
+                    help="Dependency index (build_dependency_index.py); without it every pair of a changed role is re-run")
+    ap.add_argument("--out_jsonl", default="bird_acl_dataset_all.jsonl")
+    ap.add_argument("--policies_full", default="db_access_policies_full.csv")
+    ap.add_argument("--drop_nonselect_or_skip", action="store_true")
+    ap.add_argument("--only_privilege_or_permit", action="store_true")
+    ap.add_argument("--dry_run", action="store_true", help="Only report what would be re-executed")
+    args = ap.parse_args()
+
+    for p in (args.old_perms, args.perms, args.groundtruth):
+        if not os.path.isfile(p):
+            raise SystemExit(f"❌ Missing {p}")
+
+    with METRICS.timer("diff_grants"):
+        changes = grant_changes(load_role_grants(args.old_perms), load_role_grants(args.perms))
+    changed_dbs = set()
+    with open(args.groundtruth, newline="", encoding="utf-8") as f:
+        gt_rows = list(csv.DictReader(f))
+    print(f"🔍 {len(changes)} role(s) with changed grants; {len(gt_rows):,} ground-truth rows")
+
+    idx = None
+    if os.path.isfile(args.deps):
+        with METRICS.timer("load_deps"):
+            idx = DependencyIndex.load(args.deps)
+    else:
+        print(f"⚠️  {args.deps} not found → every pair of a changed role is re-executed")
+
+    todo, unchanged = [], []   # row indices
+    for i, row in enumerate(gt_rows):
+        role = (row.get("role") or "").strip()
+        change = changes.get(role.lower())
+        if not role or change is None:
+            continue
+        changed_dbs.add((row.get("dbname") or "").strip().lower())
+        refs = idx.refs(row["dbname"], row["qid"]) if idx is not None else None
+        if not refs or idx.error(row["dbname"], row["qid"]) or is_affected(refs, *change):
+            todo.append(i)
+        else:
+            unchanged.append(i)
+    METRICS.inc("pairs_reexecuted", len(todo))
+    METRICS.inc("pairs_pruned", len(unchanged))
+    print(f"➡️  Re-executing {len(todo):,} pair(s); {len(unchanged):,} pair(s) of changed roles are unaffected")
+    if args.dry_run:
+        METRICS.report()
+        return
+
+    gt = load_script("bird/dataset-groundtruth-bird.py")
+    cache, grant_fps = open_label_cache(gt.LABEL_CACHE, args.perms)
+    flips = 0
+    for i in todo:
+        row = gt_rows[i]
+        permitted, code, msg = gt.try_exec(row["dbname"], row["role"], row["sql_wrapped"])
+        flips += int(row["permit"]) != int(permitted)
+        row.update(permit=1 if permitted else 0, sqlstate=code, error="" if permitted else msg)
+
+    if cache is not None:
+        for i in todo + unchanged:
+            row = gt_rows[i]
+            db_fp = gt.schema_fp(row["dbname"])
+            if db_fp is None:
+                continue
+            key = cache.key(row["dbname"], row["role"], row["sql_wrapped"], grant_fps.get(row["role"], ""), db_fp)
+            cache.put(key, int(row["permit"]) == 1, row["sqlstate"], row["error"])
+        cache.close()
+    gt.SESSIONS.close()
+    METRICS.merge(gt.METRICS.drain())
+    METRICS.inc("labels_flipped", flips)
+
+    write_csv_atomic(args.groundtruth, gt_rows, GT_FIELDS)
+    print(f"✅ Patched {args.groundtruth}: {flips:,} label(s) changed")
+
+    if os.path.isfile(args.out_jsonl):
+        if not os.path.isfile(args.policies_full):
+            raise SystemExit(f"❌ Missing {args.policies_full} (needed to rebuild policy_sql in {args.out_jsonl})")
+        builder = load_script("bird/build_access_control_dataset_bitd.py")
+        pol = builder.load_policies_full(args.policies_full)
+        rebuild = {row_key(r["split"], r["qid"], r["dbname"], r["role"])
+                   for r in gt_rows if (r.get("dbname") or "").strip().lower() in changed_dbs}
+        with METRICS.timer("patch_jsonl"):
+            n = patch_jsonl(args.out_jsonl, gt_rows, rebuild, builder, pol,
+                            args.drop_nonselect_or_skip, args.only_privilege_or_permit)
+        print(f"✅ Patched {args.out_jsonl}: {n:,} record(s) rebuilt for {len(changed_dbs)} database(s)")
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run the BIRD generation pipeline as a cached DAG:
+
+    extract ──────────────┬─> deps        (query_deps.sqlite)
+                          ├─> groundtruth ──┐
+    permissions ──────────┤                 ├─> build
+                          ├─> policies ─────┘
+                          └─> privileges  (user_permissions_bird.npz)
+
+Each stage is one of the existing scripts, executed in --workdir. A stage is
+skipped when the hash of its script, arguments, relevant env vars and input
+files matches a previous run; its outputs are restored from .pipeline_cache/.
+Independent stages (extract ∥ permissions, groundtruth ∥ policies) run
+concurrently.
+
+groundtruth additionally keeps a per-pair label cache (label_cache.sqlite), so
+when only question/evidence text changes it re-writes ground_truth.csv
+without re-executing any query in Postgres.
+
+Note: `permissions` has side effects in Postgres (roles + grants). If the
+databases were re-migrated, force it with --force permissions groundtruth;
+the label cache keys on each database's schema fingerprint, so only the
+pairs of re-migrated databases are executed again.
+"""
+
+import os, sys, argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from common.pipeline import Stage, run_pipeline
+
+COMMON = os.path.join(HERE, "..", "common")
+TOOLS = os.path.join(HERE, "..", "tools")
+PG_ENV = ["PG_HOST", "PG_PORT", "PG_USER"]
+
+
+def bird_stages(args):
+    bird_dir = os.path.expanduser(args.bird_dir)
+    bird_inputs = [
+        os.path.join(bird_dir, name)
+        for name in ("dev.json", "dev.sql", "train.json", "train_gold.sql", "dev_tied_append.json")
+    ]
+    # role spec (common/roles.py) keys permissions and groundtruth; relative to --workdir
+    roles_file = os.getenv("ROLES_FILE", "")
+    roles_inputs = [os.path.expanduser(roles_file)] if roles_file else []
+    build_args = []
+    if args.drop_nonselect_or_skip:
+        build_args.append("--drop_nonselect_or_skip")
+    if args.only_privilege_or_permit:
+        build_args.append("--only_privilege_or_permit")
+
+    return [
+        Stage(
+            "extract",
+            os.path.join(HERE, "extract-questions-SQLs-bird.py"),
+            args=["--bird_dir", bird_dir, "--also_csv",
+                  "--out_jsonl", "bird_questions_sql_all.jsonl",
+                  "--out_csv", "questions_sqls.csv"],
+            inputs=bird_inputs,
+            outputs=["bird_questions_sql_all.jsonl", "questions_sqls.csv"],
+            code=[os.path.join(COMMON, "json_stream.py")],
+        ),
+        Stage(
+            "deps",
+            os.path.join(TOOLS, "build_dependency_index.py"),
+            args=["--dataset", "bird", "--db_root", bird_dir,
+                  "--pairs", "questions_sqls.csv", "--out", "query_deps.sqlite"],
+            inputs=["questions_sqls.csv"],
+            outputs=["query_deps.sqlite"],
+            deps=["extract"],
+            code=[os.path.join(COMMON, "deps_index.py"), os.path.join(COMMON, "sqlite_acl.py")],
+        ),
+        Stage(
+            "permissions",
+            os.path.join(HERE, "user_permissions_bird.py"),
+            inputs=roles_inputs,
+            outputs=["user_permissions_bird.csv"],
+            params={"SEED": args.seed},
+            env_keys=PG_ENV + ["ROLES_FILE"],
+            code=[os.path.join(COMMON, "roles.py")],
+        ),
+        Stage(
+            "policies",
+            os.path.join(HERE, "access-policies-per-db-bird.py"),
+            inputs=["user_permissions_bird.csv"],
+            outputs=["db_access_policies.csv", "db_access_policies_full.csv"],
+            deps=["permissions"],
+            env_keys=PG_ENV,
+        ),
+        Stage(
+            "privileges",
+            os.path.join(TOOLS, "compile_privileges.py"),
+            args=["--perms", "user_permissions_bird.csv", "--out", "user_permissions_bird.npz"],
+            inputs=["user_permissions_bird.csv"],
+            outputs=["user_permissions_bird.npz"],
+            deps=["permissions"],
+            code=[os.path.join(COMMON, "privileges.py")],
+        ),
+        Stage(
+            "groundtruth",
+            os.path.join(HERE, "dataset-groundtruth-bird.py"),
+            inputs=["questions_sqls.csv", "user_permissions_bird.csv"] + roles_inputs,
+            outputs=["ground_truth.csv"],
+            deps=["extract", "permissions"],
+            env_keys=PG_ENV + ["ROLES_FILE"],
+            code=[os.path.join(COMMON, "label_cache.py"), os.path.join(COMMON, "roles.py")],
+        ),
+        Stage(
+            "build",
+            os.path.join(HERE, "build_access_control_dataset_bitd.py"),
+            args=build_args,
+            inputs=["ground_truth.csv", "db_access_policies_full.csv"],
+            outputs=["bird_acl_dataset_all.jsonl"],
+            deps=["groundtruth", "policies"],
+        ),
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cached, concurrent BIRD pipeline runner.")
+    ap.add_argument("--bird_dir", default=os.getenv("BIRD_DIR", "~/path/to/BIRD/bird"))
+    ap.add_argument("--workdir", default=".", help="Where intermediate CSV/JSONL files live.")
+    ap.add_argument("--cache_dir", default=None, help="Defaults to <workdir>/.pipeline_cache")
+    ap.add_argument("--seed", type=int, default=int(os.getenv("SEED", "1337")))
+    ap.add_argument("--jobs", type=int, default=2, help="Max stages running at once.")
+    ap.add_argument("--force", nargs="*", default=[],
+                    help="Stage names to re-run regardless of cache ('all' for every stage).")
+    ap.add_argument("--dry_run", action="store_true", help="Only report which stages would run.")
+    ap.add_argument("--drop_nonselect_or_skip", action="store_true")
+    ap.add_argument("--only_privilege_or_permit", action="store_true")
+    args = ap.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    status = run_pipeline(bird_stages(args), workdir=args.workdir, cache_dir=args.cache_dir,
+                          jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+
+    print("\nℹ️ Stage summary: " + ", ".join(f"{k}={v}" for k, v in status.items()))
+    if any(v in ("failed", "blocked") for v in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,21 @@ Create four per-database roles and grant:
   • User_2  – ~50% tables, all columns
   • User_3  – all tables, ~50% columns in each
   • User_4  – ~50% tables, ~50% columns in those tables
+Set ROLES_FILE to a JSON role spec for any other number of roles / rules
+(see common/roles.py).
 
 Targets ALL user databases (excludes system DBs and 'birddb' seed).
 Writes: user_permissions_bird.csv
 """
 
-import psycopg2, csv, traceback, random, os
+import psycopg2, csv, random, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.layout import PG_CORPUS_DB, SessionCache, consolidated, list_schemas, qualify, target
+from common.roles import RoleSpec, apply_grants, permission_rows
+
+METRICS = Metrics("bird_permissions")
 
 # ── Connection parameters (BIRD stack) ───────────────────────────────────────
 PG_ADMIN_DB = os.getenv("PG_ADMIN_DB", "postgres")  # control/database-listing DB
@@ -20,7 +29,7 @@ PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
 PG_HOST     = os.getenv("PG_HOST", "localhost")
 PG_PORT     = int(os.getenv("PG_PORT", 5433))
 
-USER_LABELS = ["User_1", "User_2", "User_3", "User_4"]
+ROLES       = RoleSpec.load()   # $ROLES_FILE, default: the four roles above
 CSV_OUTPUT  = "user_permissions_bird.csv"
 
 # Reproducible halves (set env SEED to override)
@@ -30,6 +39,7 @@ random.seed(SEED)
 SYSTEM_DB_EXCLUDES = {"postgres", "template0", "template1", PG_ADMIN_DB}
 
 def connect(dbname):
+    METRICS.inc("connection_opens", db=dbname)
     return psycopg2.connect(
         dbname=dbname, user=PG_USER, password=PG_PASSWORD,
         host=PG_HOST, port=PG_PORT
@@ -38,7 +48,19 @@ def connect(dbname):
 def get_databases():
     """
     Return candidate DBs: exclude system DBs and any without user tables in 'public'.
+    In the schema layout, the candidates are the non-empty schemas of PG_CORPUS_DB.
     """
+    if consolidated():
+        with connect(PG_CORPUS_DB) as c, c.cursor() as cur:
+            schemas = list_schemas(cur)
+            cur.execute("""
+                SELECT DISTINCT table_schema
+                  FROM information_schema.tables
+                 WHERE table_schema = ANY(%s)
+            """, (schemas,))
+            non_empty = {r[0] for r in cur.fetchall()}
+        return [s for s in schemas if s in non_empty]
+
     with connect(PG_ADMIN_DB) as c, c.cursor() as cur:
         cur.execute("""
             SELECT d.datname
@@ -76,96 +98,47 @@ def setup_permissions():
     targets = get_databases()
     print(f"🔎 Databases to configure ({len(targets)}): {targets}")
 
+    sessions = SessionCache(connect)
     for db in targets:
         print(f"\n🗂️  Database: {db}")
-        with connect(db) as conn, conn.cursor() as cur:
-            conn.autocommit = True
+        pg_database, pg_schema = target(db)
+        if not consolidated():
+            sessions.close()              # previous DB's connection
+        conn = sessions.get(pg_database)  # one shared session in the schema layout
+        with conn.cursor() as cur, METRICS.timer("db_provision", db=db):
+            cur = METRICS.wrap_cursor(cur, db=db)
+            sch = q_ident(pg_schema)
 
             # gather schema info
             cur.execute("""
                 SELECT table_name, column_name
                   FROM information_schema.columns
-                 WHERE table_schema = 'public'
+                 WHERE table_schema = %s
               ORDER BY table_name, ordinal_position;
-            """)
+            """, (pg_schema,))
             schema = {}
             for tbl, col in cur.fetchall():
                 schema.setdefault(tbl, []).append(col)
 
             if not schema:
-                print("  ⚠️  No tables in public schema, skipping.")
+                print(f"  ⚠️  No tables in schema {pg_schema}, skipping.")
                 continue
 
-            tables = sorted(schema.keys())
-            rnd_tables = tables[:]
-            random.shuffle(rnd_tables)
-            half_tables = set(rnd_tables[: max(1, len(rnd_tables)//2)])
-
-            # ensure base usage and clean slate for each role
-            for label in USER_LABELS:
-                role = f'{db}_{label}'
-                print(f"  • (re)creating role {role}")
-                try:
-                    cur.execute(f'DROP ROLE IF EXISTS {q_ident(role)};')
-                    cur.execute(f'CREATE ROLE {q_ident(role)} LOGIN PASSWORD %s;', ('pass123',))
-                    # Base privileges and cleanup
-                    cur.execute(f'GRANT USAGE ON SCHEMA public TO {q_ident(role)};')
-                    cur.execute(f'REVOKE ALL PRIVILEGES ON ALL TABLES IN SCHEMA public FROM {q_ident(role)};')
-                    cur.execute(f'REVOKE ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public FROM {q_ident(role)};')
-                    # Make future tables default to no access for these roles (explicit grants only)
-                    cur.execute("ALTER DEFAULT PRIVILEGES IN SCHEMA public REVOKE ALL ON TABLES FROM PUBLIC;")
-                except Exception as e:
-                    print("    ❌ role create error →", e)
-                    traceback.print_exc()
-                    continue
-
-            # User_1: everything (all tables, all columns)
-            label = "User_1"
-            role = f'{db}_{label}'
-            cur.execute(f'GRANT SELECT ON ALL TABLES IN SCHEMA public TO {q_ident(role)};')
-            for tbl, cols in schema.items():
-                rows.append((db, role, tbl, ",".join(cols)))
-
-            # User_2: half the tables, all their columns
-            label = "User_2"
-            role = f'{db}_{label}'
-            for tbl in tables:
-                if tbl in half_tables:
-                    cur.execute(f'GRANT SELECT ON {q_ident(tbl)} TO {q_ident(role)};')
-                    rows.append((db, role, tbl, ",".join(schema[tbl])))
-
-            # User_3: all tables, half the columns each
-            label = "User_3"
-            role = f'{db}_{label}'
-            for tbl, cols in schema.items():
-                if not cols:
-                    continue
-                allowed = cols[: max(1, len(cols)//2)]
-                col_list = ", ".join(q_ident(c) for c in allowed)
-                cur.execute(f'GRANT SELECT ({col_list}) ON {q_ident(tbl)} TO {q_ident(role)};')
-                rows.append((db, role, tbl, ",".join(allowed)))
-
-            # User_4: half the tables, half the columns
-            label = "User_4"
-            role = f'{db}_{label}'
-            for tbl in tables:
-                if tbl not in half_tables:
-                    continue
-                cols = schema[tbl]
-                if not cols:
-                    continue
-                allowed = cols[: max(1, len(cols)//2)]
-                col_list = ", ".join(q_ident(c) for c in allowed)
-                cur.execute(f'GRANT SELECT ({col_list}) ON {q_ident(tbl)} TO {q_ident(role)};')
-                rows.append((db, role, tbl, ",".join(allowed)))
-
-    # sort output grouped by db, then User_1..User_4
-    def sort_key(r):
-        db, role, *_ = r
-        idx = next(i for i, lbl in enumerate(USER_LABELS) if role.endswith(lbl))
-        return (db, idx)
-
-    rows.sort(key=sort_key)
+            # roles and grants as one batch (one round trip per database)
+            assigned = ROLES.assign(schema, random, tables=sorted(schema))
+            # Make future tables default to no access for these roles (explicit grants only)
+            tail = f"ALTER DEFAULT PRIVILEGES IN SCHEMA {sch} REVOKE ALL ON TABLES FROM PUBLIC;"
+            print(f"  • (re)creating {len(assigned)} roles: {db}_{ROLES.names[0]} … {db}_{ROLES.names[-1]}")
+            applied, errors = apply_grants(cur, db, pg_schema, assigned, schema, qualify, tail)
+            for role, err in errors:
+                print(f"    ❌ {role or 'grant batch'} →", err)
+                METRICS.inc("grant_failures", db=db)
+            rows.extend(permission_rows(db, applied))
+    sessions.close()
+
+    # sort output grouped by db, then in role declaration order
+    rank = {name: i for i, name in enumerate(ROLES.names)}
+    rows.sort(key=lambda r: (r[0], rank[r[1][len(r[0]) + 1:]]))
 
     with open(CSV_OUTPUT, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
@@ -173,6 +146,8 @@ def setup_permissions():
         w.writerows(rows)
 
     print(f"\n✅ Finished. Grants applied. CSV written → {CSV_OUTPUT}")
+    METRICS.inc("grant_rows", len(rows))
+    METRICS.report()
 
 if __name__ == "__main__":
     setup_permissions()
@@ -0,0 +1 @@
+"""Helpers shared by the Spider and BIRD generation scripts."""
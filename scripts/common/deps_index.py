@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query → object dependency index for a whole corpus.
+
+Each gold SQL is compiled once on its SQLite source file (EXPLAIN, nothing is
+executed) with an authorizer that records every column read. SQLite resolves
+the names, so `SELECT *`, aliases, CTEs and subqueries come out as the real
+(table, column) pairs. A read that touches a table but no column (COUNT(*)) is
+stored as column "".
+
+    idx = DependencyIndex.load("query_deps.sqlite")
+    idx.tables("california_schools", "12")            # {"frpm", "schools"}
+    idx.columns("california_schools", "12")           # {("frpm", "county name"), ...}
+    idx.queries_touching("california_schools", "frpm")            # {(db_id, qid), ...}
+    idx.queries_touching("california_schools", "frpm", "county name")
+    idx.unused_columns("california_schools", schema_columns)
+
+Queries are identified by (db_id lower-cased, qid); Spider pairs have no qid,
+so their row number in spider_nl_sql_pairs.csv is used. Queries that do not
+compile in SQLite are kept with their error and no objects.
+
+Persisted as one SQLite file with integer ids:
+    objects(id, db_id, tbl, col)   queries(id, db_id, qid, error)
+    refs(query_id, object_id)      + an index on (object_id, query_id)
+"""
+
+import os, sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from common.sqlite_reader import read_only_uri
+
+FORMAT_VERSION = "1"
+
+
+def table_columns(conn):
+    """{table (lower): [columns (lower), declaration order]} of a SQLite database."""
+    out = {}
+    for (tbl,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"):
+        cols = conn.execute(f'PRAGMA table_info("{tbl}")').fetchall()
+        out[tbl.lower()] = [c[1].lower() for c in cols]
+    return out
+
+
+class ReadCollector:
+    """set_authorizer callback that records (table, column) reads and allows everything."""
+
+    def __init__(self, declared):
+        self.declared = {t: set(cols) for t, cols in declared.items()}
+        self.reads = set()
+
+    def __call__(self, action, arg1, arg2, dbname, source):
+        if action == sqlite3.SQLITE_READ and arg1:
+            tbl = arg1.lower()
+            col = (arg2 or "").lower()
+            # rowid aliases are not real columns: count them as a table-only read
+            self.reads.add((tbl, col if col in self.declared.get(tbl, ()) else ""))
+        return sqlite3.SQLITE_OK
+
+
+def index_database(sqlite_path, items):
+    """Process-pool entry point: [(qid, sql)] → [(qid, {(table, column)}, error)]."""
+    conn = sqlite3.connect(read_only_uri(sqlite_path), uri=True, cached_statements=0)
+    try:
+        collector = ReadCollector(table_columns(conn))
+        conn.set_authorizer(collector)
+        out = []
+        for qid, sql_text in items:
+            collector.reads = set()
+            try:
+                conn.execute("EXPLAIN " + (sql_text or "").strip().rstrip(";")).fetchall()
+                out.append((qid, collector.reads, ""))
+            except sqlite3.Error as e:
+                out.append((qid, set(), str(e).replace("\n", " ")[:400]))
+        return out
+    finally:
+        conn.close()
+
+
+class DependencyIndex:
+    def __init__(self):
+        self.objects = []        # id → (db_id, table, column)
+        self.obj_id = {}         # (db_id, table, column) → id
+        self.query_objs = {}     # (db_id, qid) → set(object ids)
+        self.errors = {}         # (db_id, qid) → SQLite error text
+        self.by_object = {}      # object id → set((db_id, qid))
+
+    # ── building ─────────────────────────────────────────────────────────────
+    def _intern(self, db_id, tbl, col):
+        key = (db_id, tbl, col)
+        i = self.obj_id.get(key)
+        if i is None:
+            i = self.obj_id[key] = len(self.objects)
+            self.objects.append(key)
+        return i
+
+    def add(self, db_id, qid, reads, error=""):
+        q = (db_id.lower(), str(qid))
+        ids = {self._intern(q[0], t, c) for t, c in reads}
+        self.query_objs[q] = ids
+        if error:
+            self.errors[q] = error
+        for i in ids:
+            self.by_object.setdefault(i, set()).add(q)
+
+    @classmethod
+    def build(cls, queries, sqlite_files, workers=1):
+        """
+        queries: iterable of (db_id, qid, sql); sqlite_files: {db_id lower: path}.
+        Databases are compiled in parallel, one process per database.
+        """
+        by_db = {}
+        for db_id, qid, sql_text in queries:
+            by_db.setdefault(db_id.lower(), []).append((str(qid), sql_text))
+        idx = cls()
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as ex:
+            futs = {}
+            for db, items in by_db.items():
+                path = sqlite_files.get(db)
+                if path is None:
+                    for qid, _ in items:
+                        idx.add(db, qid, (), f'no SQLite file for database "{db}"')
+                    continue
+                futs[ex.submit(index_database, path, items)] = db
+            for f in as_completed(futs):
+                for qid, reads, err in f.result():
+                    idx.add(futs[f], qid, reads, err)
+        return idx
+
+    # ── lookups ──────────────────────────────────────────────────────────────
+    def refs(self, db_id, qid):
+        """[(table, column)] read by a query ("" column = table-only read)."""
+        return [self.objects[i][1:] for i in self.query_objs.get((db_id.lower(), str(qid)), ())]
+
+    def tables(self, db_id, qid):
+        return {t for t, _ in self.refs(db_id, qid)}
+
+    def columns(self, db_id, qid):
+        return {(t, c) for t, c in self.refs(db_id, qid) if c}
+
+    def error(self, db_id, qid):
+        return self.errors.get((db_id.lower(), str(qid)), "")
+
+    def queries(self, db_id=None):
+        if db_id is None:
+            return set(self.query_objs)
+        db_id = db_id.lower()
+        return {q for q in self.query_objs if q[0] == db_id}
+
+    def queries_touching(self, db_id, table, column=None):
+        """Queries reading `table` (any column, or COUNT(*)), or one column of it."""
+        db_id, table = db_id.lower(), table.lower()
+        if column is not None:
+            i = self.obj_id.get((db_id, table, column.lower()))
+            return set(self.by_object.get(i, ())) if i is not None else set()
+        out = set()
+        for (d, t, _), i in self.obj_id.items():
+            if d == db_id and t == table:
+                out |= self.by_object.get(i, set())
+        return out
+
+    def referenced_columns(self, db_id):
+        db_id = db_id.lower()
+        return {(t, c) for (d, t, c), i in self.obj_id.items() if d == db_id and c and self.by_object.get(i)}
+
+    def unused_columns(self, db_id, schema_columns):
+        """Columns of `schema_columns` ({table: [columns]}) that no query reads."""
+        used = self.referenced_columns(db_id)
+        return sorted((t.lower(), c.lower()) for t, cols in schema_columns.items() for c in cols
+                      if (t.lower(), c.lower()) not in used)
+
+    # ── persistence ──────────────────────────────────────────────────────────
+    def save(self, path):
+        tmp = path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(tmp)
+        with conn:
+            conn.executescript("""
+                CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+                CREATE TABLE objects (id INTEGER PRIMARY KEY, db_id TEXT, tbl TEXT, col TEXT);
+                CREATE TABLE queries (id INTEGER PRIMARY KEY, db_id TEXT, qid TEXT, error TEXT);
+                CREATE TABLE refs (query_id INTEGER, object_id INTEGER,
+                                   PRIMARY KEY (query_id, object_id)) WITHOUT ROWID;
+            """)
+            conn.execute("INSERT INTO meta VALUES ('version', ?)", (FORMAT_VERSION,))
+            conn.executemany("INSERT INTO objects VALUES (?, ?, ?, ?)",
+                             ((i, *o) for i, o in enumerate(self.objects)))
+            queries = sorted(self.query_objs)
+            conn.executemany("INSERT INTO queries VALUES (?, ?, ?, ?)",
+                             ((n, d, q, self.errors.get((d, q), "")) for n, (d, q) in enumerate(queries)))
+            conn.executemany("INSERT INTO refs VALUES (?, ?)",
+                             ((n, i) for n, q in enumerate(queries) for i in sorted(self.query_objs[q])))
+            conn.execute("CREATE INDEX refs_by_object ON refs (object_id, query_id)")
+            conn.execute("CREATE INDEX queries_by_key ON queries (db_id, qid)")
+        conn.close()
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        conn = sqlite3.connect(read_only_uri(path), uri=True)
+        try:
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if not version or version[0] != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported dependency index version {version}")
+            idx = cls()
+            for i, db_id, tbl, col in conn.execute("SELECT id, db_id, tbl, col FROM objects ORDER BY id"):
+                idx.objects.append((db_id, tbl, col))
+                idx.obj_id[(db_id, tbl, col)] = i
+            qkeys = {}
+            for n, db_id, qid, err in conn.execute("SELECT id, db_id, qid, error FROM queries"):
+                qkeys[n] = (db_id, qid)
+                idx.query_objs[(db_id, qid)] = set()
+                if err:
+                    idx.errors[(db_id, qid)] = err
+            for n, i in conn.execute("SELECT query_id, object_id FROM refs"):
+                q = qkeys[n]
+                idx.query_objs[q].add(i)
+                idx.by_object.setdefault(i, set()).add(q)
+            return idx
+        finally:
+            conn.close()
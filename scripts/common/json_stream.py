@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental reader for large top-level JSON arrays (BIRD train.json & co.).
+
+    for item in iter_json_array("train.json"):
+        ...
+
+The file is read in chunks and decoded one element at a time with
+json.JSONDecoder.raw_decode, so memory is bounded by the chunk size plus the
+largest single element instead of the whole document.
+"""
+
+import json
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",]"   # what may follow a complete element
+
+
+class NotAnArray(ValueError):
+    """The document is valid so far but its top level is not an array."""
+
+
+def iter_json_array(path, chunk_size=CHUNK_SIZE):
+    """Yield the elements of the JSON array stored in `path`."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof = "", 0, False
+
+        def fill():
+            nonlocal buf, pos, eof
+            more = f.read(chunk_size)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            return bool(more)
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in chars:
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return
+
+        skip(WHITESPACE + "\ufeff")   # BOM
+        if pos >= len(buf) or buf[pos] != "[":
+            raise NotAnArray(f"{path}: expected a top-level JSON array")
+        pos += 1
+        while True:
+            skip(WHITESPACE + ",")
+            if pos >= len(buf):
+                raise ValueError(f"{path}: unterminated JSON array")
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof or not fill():
+                    raise
+                continue
+            if not eof and (end == len(buf) or buf[end] not in DELIMITERS) and fill():
+                continue   # a scalar cut at the chunk edge ("12|3", "-1|.5", "1e|5"): decode again
+            pos = end
+            yield item
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-pair label cache for the ground-truth labellers.
+
+A label depends on the SQL that was executed, the role, the grants held by
+that role, and the database it ran against: column types and the loaded data
+decide whether a query fails before the privilege check (22P02, 22007, 42883,
+...) or at all. The cache key is therefore
+    sha256(dbname, role, sql_wrapped, grant fingerprint of the role,
+           schema fingerprint of the database)
+and deliberately excludes question text, evidence, split and qid. Editing an
+evidence string (or re-extracting the questions) reuses every label; changing
+one role's grants only invalidates that role's pairs. The schema fingerprint
+covers every column's name and type and the OID of its table. A loader run
+recreates the tables, so re-migrating (or retyping) a database invalidates all
+of its labels. A template snapshot reset keeps the OIDs and the data, and so
+keeps its labels.
+
+Outcomes that depend on the environment rather than the policy (timeouts,
+connection failures) are never cached.
+"""
+
+import csv, os, sqlite3, hashlib
+
+# SQLSTATEs that describe the run, not the policy → always re-execute
+TRANSIENT_SQLSTATES = {"57014", "55P03", "57P01", "53300", "40001", "40P01"}
+
+FLUSH_EVERY = 1000
+
+
+def grant_fingerprints(perms_csv):
+    """
+    Return {role: sha256 of its (object, accessible_columns) rows} from a
+    user_permissions*.csv file. Roles with no rows get no entry.
+    """
+    by_role = {}
+    with open(perms_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            role = row["user"]
+            cols = ",".join(sorted(c for c in (row["accessible_columns"] or "").split(",") if c))
+            by_role.setdefault(role, []).append(f"{row['database']}|{row['object']}|{cols}")
+    return {
+        role: hashlib.sha256("\n".join(sorted(items)).encode("utf-8")).hexdigest()
+        for role, items in by_role.items()
+    }
+
+
+def schema_fingerprint(cur, schema):
+    """sha256 of (table OID, table, column, type) for every column in `schema`."""
+    cur.execute("""
+        SELECT c.oid, c.relname, a.attname, format_type(a.atttypid, a.atttypmod)
+          FROM pg_class c
+          JOIN pg_namespace n ON n.oid = c.relnamespace
+          JOIN pg_attribute a ON a.attrelid = c.oid
+         WHERE n.nspname = %s
+           AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+           AND a.attnum > 0 AND NOT a.attisdropped
+         ORDER BY c.relname, a.attnum;
+    """, (schema,))
+    h = hashlib.sha256()
+    for row in cur.fetchall():
+        h.update("|".join(str(v) for v in row).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def is_cacheable(permitted, sqlstate):
+    if permitted:
+        return True
+    if not sqlstate or sqlstate in TRANSIENT_SQLSTATES:
+        return False
+    return not sqlstate.startswith("08")  # connection exceptions
+
+
+class LabelCache:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS labels (
+                key      TEXT PRIMARY KEY,
+                permit   INTEGER NOT NULL,
+                sqlstate TEXT NOT NULL,
+                error    TEXT NOT NULL
+            )
+        """)
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(dbname, role, sql_wrapped, grants_fp, schema_fp):
+        h = hashlib.sha256()
+        for part in (dbname, role, grants_fp, schema_fp, sql_wrapped):
+            h.update((part or "").encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def get(self, key):
+        row = self.conn.execute(
+            "SELECT permit, sqlstate, error FROM labels WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bool(row[0]), row[1], row[2]
+
+    def put(self, key, permitted, sqlstate, error):
+        if not is_cacheable(permitted, sqlstate):
+            return
+        self.pending.append((key, 1 if permitted else 0, sqlstate or "", error or ""))
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?)", self.pending
+                )
+            self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def open_label_cache(cache_path, perms_csv):
+    """
+    Return (LabelCache, {role: fingerprint}) or (None, {}) when caching is
+    disabled or the permissions CSV needed for fingerprints is missing.
+    """
+    if not cache_path:
+        return None, {}
+    if not os.path.isfile(perms_csv):
+        print(f"⚠️  {perms_csv} not found → label cache disabled (grants cannot be fingerprinted)")
+        return None, {}
+    return LabelCache(cache_path), grant_fingerprints(perms_csv)
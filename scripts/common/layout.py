@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Where a Spider/BIRD database lives in Postgres.
+
+PG_LAYOUT=database (default)  one Postgres database per source DB, tables in 'public'
+PG_LAYOUT=schema              one Postgres database ($PG_CORPUS_DB), one schema per source DB
+
+The schema layout lets a single session reach the whole corpus: loaders,
+provisioning and labelling switch `search_path` instead of reconnecting, and
+roles get USAGE on their own schema only, so cross-database access is still
+denied.
+"""
+
+import os
+
+PG_LAYOUT = os.getenv("PG_LAYOUT", "database").strip().lower()
+PG_CORPUS_DB = os.getenv("PG_CORPUS_DB", "acl_corpus")
+
+SYSTEM_SCHEMAS = ("public", "information_schema", "pg_catalog", "pg_toast")
+
+if PG_LAYOUT not in ("database", "schema"):
+    raise SystemExit(f"❌ PG_LAYOUT must be 'database' or 'schema', got {PG_LAYOUT!r}")
+
+
+def consolidated():
+    return PG_LAYOUT == "schema"
+
+
+def target(db_id):
+    """Return (postgres database, schema) holding the tables of `db_id`."""
+    db_id = (db_id or "").strip().lower()
+    if consolidated():
+        return PG_CORPUS_DB, db_id
+    return db_id, "public"
+
+
+def qualify(schema, name):
+    """Quoted table reference as it should appear in generated SQL text."""
+    ident = '"' + str(name).replace('"', '""') + '"'
+    if schema == "public":
+        return ident
+    return '"' + str(schema).replace('"', '""') + '".' + ident
+
+
+def list_schemas(cur):
+    """Corpus schemas (one per source DB) in the consolidated database."""
+    cur.execute("""
+        SELECT nspname
+          FROM pg_namespace
+         WHERE nspname NOT IN %s
+           AND nspname NOT LIKE 'pg\\_%%'
+         ORDER BY nspname;
+    """, (SYSTEM_SCHEMAS,))
+    return [r[0] for r in cur.fetchall()]
+
+
+class SessionCache:
+    """
+    Reuse one admin connection per Postgres database. In the schema layout this
+    is a single connection for the whole corpus.
+    """
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.conns = {}
+
+    def get(self, pg_db):
+        conn = self.conns.get(pg_db)
+        if conn is None or conn.closed:
+            conn = self.connect(pg_db)
+            conn.autocommit = True
+            self.conns[pg_db] = conn
+        return conn
+
+    def discard(self, pg_db):
+        conn = self.conns.pop(pg_db, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close(self):
+        for pg_db in list(self.conns):
+            self.discard(pg_db)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+How the loaders write tables ($LOAD_PROFILE), and the finishing pass after them.
+
+LOAD_PROFILE=default   as before. BIRD creates tables UNLOGGED, fills them and
+                       runs ALTER TABLE ... SET LOGGED per table; Spider creates
+                       logged tables. SET LOGGED rewrites the table through WAL,
+                       so BIRD writes its data about twice.
+LOAD_PROFILE=bulk      CREATE TABLE and fill it in the same transaction. With
+                       wal_level=minimal the server skips WAL for the new table
+                       and syncs its file at commit. Otherwise the data goes
+                       through WAL once. VACUUM and ANALYZE run afterwards in
+                       one parallel pass.
+LOAD_PROFILE=unlogged  For scratch environments: tables stay UNLOGGED (no WAL,
+                       emptied after a server crash). Same finishing pass.
+
+WalMeter times each loader phase and reads how far the server's WAL position
+moved during it (pg_current_wal_lsn; cluster-wide, so other traffic on the
+server counts too). FinishPass adds the size of every table it touches. WAL
+bytes plus table bytes is roughly what the load wrote to disk.
+"""
+
+import os, threading, time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from common.layout import SessionCache, qualify, target
+
+LOAD_PROFILE = os.getenv("LOAD_PROFILE", "default").strip().lower()
+PROFILES = ("default", "bulk", "unlogged")
+
+if LOAD_PROFILE not in PROFILES:
+    raise SystemExit(f"❌ LOAD_PROFILE must be one of {', '.join(PROFILES)}, got {LOAD_PROFILE!r}")
+
+
+def create_table_sql(unlogged_by_default):
+    """CREATE [UNLOGGED] TABLE for the active profile."""
+    if LOAD_PROFILE == "unlogged" or (LOAD_PROFILE == "default" and unlogged_by_default):
+        return "CREATE UNLOGGED TABLE"
+    return "CREATE TABLE"
+
+
+def finish_pass():
+    """True when the loaders should run FinishPass instead of per-table work."""
+    return LOAD_PROFILE != "default"
+
+
+def _lsn(text):
+    hi, lo = text.split("/")
+    return (int(hi, 16) << 32) + int(lo, 16)
+
+
+def _size(n):
+    return f"{n / 2**20:,.1f} MiB"
+
+
+class WalMeter:
+    """
+    Per-phase wall time and WAL bytes, recorded in `metrics` as the
+    `phase` timer and the `wal_bytes` counter (label phase=...).
+    """
+
+    def __init__(self, connect, admin_db, metrics):
+        self.metrics = metrics
+        self.conn = None
+        self.wal_level = "?"
+        try:
+            self.conn = connect(admin_db)
+            self.conn.autocommit = True
+            with self.conn.cursor() as cur:
+                cur.execute("SHOW wal_level;")
+                self.wal_level = cur.fetchone()[0]
+        except Exception as e:
+            print(f"⚠️  WAL metering off ({e})")
+            self.conn = None
+        print(f"🧾 LOAD_PROFILE={LOAD_PROFILE}, wal_level={self.wal_level}")
+        if LOAD_PROFILE == "bulk" and self.wal_level not in ("minimal", "?"):
+            print("   (set wal_level=minimal and max_wal_senders=0 on the server to skip WAL for new tables)")
+
+    def position(self):
+        if self.conn is None:
+            return None
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT pg_current_wal_lsn()::text;")
+                return _lsn(cur.fetchone()[0])
+        except Exception:
+            return None
+
+    @contextmanager
+    def phase(self, name):
+        lsn0, t0 = self.position(), time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self.metrics.observe("phase", seconds, phase=name)
+            lsn1 = self.position()
+            wal = lsn1 - lsn0 if lsn0 is not None and lsn1 is not None else None
+            if wal is not None:
+                self.metrics.inc("wal_bytes", wal, phase=name)
+            print(f"⏱️  {name}: {seconds:,.1f}s" + (f", {_size(wal)} WAL" if wal is not None else ""))
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+class FinishPass:
+    """
+    SET LOGGED (tables still UNLOGGED, unless the profile keeps them so),
+    VACUUM and ANALYZE over every table of the given source DBs, in parallel
+    across tables. One autocommit session per worker and Postgres database.
+    connect(pg_db) → psycopg2 connection.
+    """
+
+    def __init__(self, connect, workers=4, analyze=True, metrics=None):
+        self.connect = connect
+        self.workers = max(1, workers)
+        self.set_logged = LOAD_PROFILE != "unlogged"
+        self.analyze = analyze
+        self.metrics = metrics
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def _count(self, what, n=1, **labels):
+        with self.lock:
+            self.counts[what] = self.counts.get(what, 0) + n
+        if self.metrics is not None:
+            self.metrics.inc(what, n, **labels)
+
+    def _observe(self, what, seconds, **labels):
+        if self.metrics is not None:
+            self.metrics.observe(what, seconds, **labels)
+
+    def _cursor(self, pg_db):
+        cache = getattr(self.local, "sessions", None)
+        if cache is None:
+            cache = self.local.sessions = SessionCache(self.connect)
+            with self.lock:
+                self.sessions.append(cache)
+        return cache.get(pg_db).cursor()
+
+    def _tables(self, db):
+        """[(table, unlogged)] of one source DB."""
+        pg_db, schema = target(db)
+        with self._cursor(pg_db) as cur:
+            cur.execute("""
+                SELECT c.relname, c.relpersistence = 'u'
+                  FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                 WHERE n.nspname = %s AND c.relkind = 'r'
+                 ORDER BY c.relname;
+            """, (schema,))
+            return cur.fetchall()
+
+    def _table(self, db, table, unlogged):
+        pg_db, schema = target(db)
+        ref = qualify(schema, table)
+        with self._cursor(pg_db) as cur:
+            if unlogged and self.set_logged:
+                t0 = time.perf_counter()
+                cur.execute(f"ALTER TABLE {ref} SET LOGGED")
+                self._observe("set_logged", time.perf_counter() - t0, db=db)
+                self._count("tables_set_logged", db=db)
+            t0 = time.perf_counter()
+            cur.execute(f"VACUUM (ANALYZE) {ref}" if self.analyze else f"VACUUM {ref}")
+            self._observe("vacuum", time.perf_counter() - t0, db=db)
+            cur.execute("SELECT pg_total_relation_size(%s::regclass);", (ref,))
+            self._count("table_bytes", cur.fetchone()[0], db=db)
+
+    def run(self, dbs):
+        """dbs: iterable of source db_ids. Returns a {counter: n} summary."""
+        tasks = []
+        try:
+            for db in sorted(set(dbs)):
+                try:
+                    tasks += [(db, t, u) for t, u in self._tables(db)]
+                except Exception as e:
+                    self._count("finish_failures", db=db)
+                    print(f"❌ {db}: {e}")
+            with ThreadPoolExecutor(max_workers=self.workers) as ex:
+                futs = {ex.submit(self._table, *task): task for task in tasks}
+                for f in as_completed(futs):
+                    try:
+                        f.result()
+                    except Exception as e:
+                        self._count("finish_failures", db=futs[f][0])
+                        print(f"❌ {futs[f][0]}.{futs[f][1]}: {e}")
+        finally:
+            for cache in self.sessions:
+                cache.close()
+        self.counts["tables"] = len(tasks)
+        print(f"🧹 finished {len(tasks)} table(s): {self.counts.get('tables_set_logged', 0)} set LOGGED, "
+              f"{_size(self.counts.get('table_bytes', 0))} on disk, {self.counts.get('finish_failures', 0)} failed")
+        return dict(self.counts)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Disposable local Postgres cluster (initdb + pg_ctl under a temp directory).
+
+Used by the benchmarks and scripts/tools/local_pg.py so runs never touch the
+long-lived Docker stack:
+
+    with LocalPostgres() as pg:
+        os.environ.update(pg.env())          # every pipeline script reads PG_*
+        conn = psycopg2.connect(**pg.params("postgres"))
+
+The cluster is tuned for throwaway bulk work (BULK_SETTINGS): no fsync, no
+full-page writes, wal_level=minimal, autovacuum off and a large
+shared_buffers (a quarter of RAM, capped at 8 GB; $LOCAL_PG_SHARED_BUFFERS
+overrides). A crash loses it, which is fine here. The data directory goes to
+tmpfs (/dev/shm) when that has $LOCAL_PG_MIN_TMPFS_MB free (default 2048),
+otherwise to the system temp directory; $LOCAL_PG_DIR picks the parent
+explicitly. The server only listens on a Unix socket in the temp directory,
+so no TCP port is opened and no network is needed.
+
+Needs the Postgres server binaries (initdb, pg_ctl) on PATH or in PG_BIN.
+initdb refuses to run as root; as root the cluster is run as
+$LOCAL_PG_OS_USER (default nobody) through runuser.
+"""
+
+import os, atexit, shutil, socket, tempfile, subprocess
+
+PG_BIN = os.getenv("PG_BIN", "")
+LOCAL_PG_USER = "postgres"
+LOCAL_PG_PASSWORD = "postgres"
+LOCAL_PG_DIR = os.getenv("LOCAL_PG_DIR", "")
+LOCAL_PG_OS_USER = os.getenv("LOCAL_PG_OS_USER", "nobody")
+LOCAL_PG_MIN_TMPFS_MB = int(os.getenv("LOCAL_PG_MIN_TMPFS_MB", 2048))
+TMPFS = "/dev/shm"
+
+BULK_SETTINGS = {
+    "fsync": "off",
+    "synchronous_commit": "off",
+    "full_page_writes": "off",
+    "wal_level": "minimal",
+    "max_wal_senders": "0",
+    "max_wal_size": "8GB",
+    "checkpoint_timeout": "1h",
+    "autovacuum": "off",
+    "work_mem": "64MB",
+    "maintenance_work_mem": "1GB",
+    "max_connections": "200",
+    "listen_addresses": "''",
+}
+
+
+def find_pg_binary(name):
+    if PG_BIN:
+        p = os.path.join(PG_BIN, name)
+        return p if os.access(p, os.X_OK) else None
+    hit = shutil.which(name)
+    if hit:
+        return hit
+    # Debian/Ubuntu keep the server binaries out of PATH
+    root = "/usr/lib/postgresql"
+    if os.path.isdir(root):
+        for ver in sorted(os.listdir(root), reverse=True):
+            p = os.path.join(root, ver, "bin", name)
+            if os.access(p, os.X_OK):
+                return p
+    return None
+
+
+def postgres_available():
+    return bool(find_pg_binary("initdb") and find_pg_binary("pg_ctl"))
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def shared_buffers():
+    env = os.getenv("LOCAL_PG_SHARED_BUFFERS")
+    if env:
+        return env
+    try:
+        ram = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return "1GB"
+    return f"{max(128, min(ram // 4, 8 << 30) >> 20)}MB"
+
+
+def tmpfs_dir():
+    """/dev/shm when it is writable and has room, else None."""
+    try:
+        st = os.statvfs(TMPFS)
+    except OSError:
+        return None
+    if not os.access(TMPFS, os.W_OK) or st.f_bavail * st.f_frsize < LOCAL_PG_MIN_TMPFS_MB << 20:
+        return None
+    return TMPFS
+
+
+class LocalPostgres:
+    def __init__(self, base_dir=None, port=None, settings=None, use_tmpfs=True, keep=False):
+        """keep=True: the cluster outlives this process until stop() (local_pg.py start/stop)."""
+        self.base_dir = base_dir or LOCAL_PG_DIR or (tmpfs_dir() if use_tmpfs else None)
+        self.port = port or free_port()
+        self.settings = {**BULK_SETTINGS, "shared_buffers": shared_buffers(), **(settings or {})}
+        self.keep = keep
+        self.root = None
+        self.data_dir = None
+        self.socket_dir = None
+
+    @classmethod
+    def attach(cls, root, port):
+        """A handle on a cluster started earlier (e.g. by `local_pg.py start`)."""
+        pg = cls(base_dir=os.path.dirname(root), port=port)
+        pg.root = root
+        pg.data_dir = os.path.join(root, "data")
+        pg.socket_dir = os.path.join(root, "sock")
+        return pg
+
+    def _as_owner(self):
+        # initdb/postgres refuse to run as root
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            if not shutil.which("runuser"):
+                raise RuntimeError("initdb cannot run as root and runuser is missing; run as a regular user")
+            return ["runuser", "-u", LOCAL_PG_OS_USER, "--"]
+        return []
+
+    def _run(self, name, *args, **kw):
+        return subprocess.run([*self._as_owner(), find_pg_binary(name), *args], **kw)
+
+    def start(self):
+        if not postgres_available():
+            raise RuntimeError("initdb/pg_ctl not found (install the Postgres server or set PG_BIN)")
+        self.root = tempfile.mkdtemp(prefix="acl-pg-", dir=self.base_dir)
+        self.data_dir = os.path.join(self.root, "data")
+        self.socket_dir = os.path.join(self.root, "sock")
+        os.makedirs(self.socket_dir)
+        if not self.keep:
+            atexit.register(self.stop)   # torn down even if the caller dies half-way
+
+        pwfile = os.path.join(self.root, "pwfile")
+        with open(pwfile, "w") as f:
+            f.write(LOCAL_PG_PASSWORD + "\n")
+        if self._as_owner():
+            subprocess.run(["chown", "-R", LOCAL_PG_OS_USER, self.root], check=True)
+        self._run("initdb", "-D", self.data_dir, "-U", LOCAL_PG_USER, "--pwfile", pwfile,
+                  "--auth=trust", "--encoding=UTF8", "--no-locale",
+                  check=True, stdout=subprocess.DEVNULL)
+        with open(os.path.join(self.data_dir, "postgresql.conf"), "a") as f:
+            f.write("\n# local_pg.py: throwaway bulk-load cluster\n")
+            for k, v in self.settings.items():
+                f.write(f"{k} = {v}\n")
+        self._run("pg_ctl", "-D", self.data_dir, "-o", f"-p {self.port} -k {self.socket_dir}",
+                  "-l", os.path.join(self.root, "server.log"), "-w", "start",
+                  check=True, stdout=subprocess.DEVNULL)
+        return self
+
+    def stop(self):
+        if self.data_dir and os.path.isdir(self.data_dir):
+            self._run("pg_ctl", "-D", self.data_dir, "-m", "immediate", "-w", "stop",
+                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if self.root:
+            shutil.rmtree(self.root, ignore_errors=True)
+        self.root = self.data_dir = None
+
+    def params(self, dbname="postgres"):
+        """psycopg2.connect() keyword arguments."""
+        return {"dbname": dbname, "user": LOCAL_PG_USER, "password": LOCAL_PG_PASSWORD,
+                "host": self.socket_dir, "port": self.port}
+
+    def dsn(self, dbname="postgres"):
+        return " ".join(f"{k}={v}" for k, v in self.params(dbname).items())
+
+    def env(self):
+        """Environment variables understood by every pipeline script."""
+        return {
+            "PG_HOST": self.socket_dir,
+            "PG_PORT": str(self.port),
+            "PG_USER": LOCAL_PG_USER,
+            "PG_PASSWORD": LOCAL_PG_PASSWORD,
+            "PG_ADMIN_DB": "postgres",
+            "PGPASSWORD": LOCAL_PG_PASSWORD,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
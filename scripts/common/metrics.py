@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared instrumentation for the pipeline scripts.
+
+Each script creates one registry for its stage:
+
+    METRICS = Metrics("bird_load")
+    METRICS.inc("rows_loaded", n, db=db, table=t)
+    with METRICS.timer("table_load", db=db, table=t): ...
+    cur = METRICS.wrap_cursor(conn.cursor(), db=db, role=role)  # times every execute()
+    METRICS.write()
+
+Series are identified by a name plus labels (stage, db, table, role, code ...).
+Timers keep exact count/sum and a bounded reservoir for p50/p95/p99. Failed
+statements are counted by SQLSTATE, and the K slowest statements of the run are
+kept in a slow-query log.
+
+write() emits, under $METRICS_DIR (default ./metrics, "" disables):
+  <stage>.jsonl       one JSON line per series + a run summary line (appended per run)
+  <stage>.prom        Prometheus textfile-collector format (replaced per run)
+  <stage>.slow.jsonl  top-K slowest statements (replaced per run)
+
+Worker processes return snapshot() to the parent, which merge()s them.
+"""
+
+import os, json, time, heapq, random, resource, threading
+from contextlib import contextmanager
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+SLOW_QUERY_TOP_K = int(os.getenv("SLOW_QUERY_TOP_K", "50"))
+RESERVOIR_SIZE = 10000
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def peak_rss_mb():
+    kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+             resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return kb / 1024.0
+
+
+def quantile(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+
+class Timer:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count, self.total, self.max, self.samples = 0, 0.0, 0.0, []
+
+    def add(self, seconds, rnd):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(seconds)
+        else:  # reservoir sampling keeps the quantiles unbiased on long runs
+            j = rnd.randrange(self.count)
+            if j < RESERVOIR_SIZE:
+                self.samples[j] = seconds
+
+    def summary(self):
+        s = sorted(self.samples)
+        out = {"count": self.count, "sum": round(self.total, 6), "max": round(self.max, 6)}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}"] = round(quantile(s, q), 6)
+        return out
+
+
+class Metrics:
+    def __init__(self, stage):
+        self.stage = stage
+        self.started = time.time()
+        self.counters = {}
+        self.timers = {}
+        self.slow = []          # min-heap of (seconds, seq, record)
+        self._seq = 0
+        self.worker_peak_rss_mb = 0.0   # max over merged worker snapshots
+        self._rnd = random.Random(0)
+        self._lock = threading.Lock()
+
+    # ── recording ────────────────────────────────────────────────────────────
+    def inc(self, name, value=1, **labels):
+        k = _key(name, labels)
+        with self._lock:
+            self.counters[k] = self.counters.get(k, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        k = _key(name, labels)
+        with self._lock:
+            t = self.timers.get(k)
+            if t is None:
+                t = self.timers[k] = Timer()
+            t.add(seconds, self._rnd)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def sqlstate(self, code, **labels):
+        self.inc("sqlstate", code=code or "none", **labels)
+
+    def slow_query(self, seconds, sql_text, **labels):
+        rec = {"seconds": round(seconds, 6), "sql": (sql_text or "")[:2000], **labels}
+        with self._lock:
+            self._seq += 1
+            item = (seconds, self._seq, rec)
+            if len(self.slow) < SLOW_QUERY_TOP_K:
+                heapq.heappush(self.slow, item)
+            elif seconds > self.slow[0][0]:
+                heapq.heapreplace(self.slow, item)
+
+    def query(self, seconds, sql_text, code=None, **labels):
+        """One executed statement: latency, count, SQLSTATE (on failure), slow log."""
+        self.observe("query_latency", seconds, **labels)
+        self.inc("queries_executed", **labels)
+        if code is not None:
+            self.sqlstate(code, **labels)
+        self.slow_query(seconds, sql_text, **labels)
+
+    def wrap_cursor(self, cur, **labels):
+        return InstrumentedCursor(cur, self, labels)
+
+    # ── aggregation across processes ─────────────────────────────────────────
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "timers": [[n, list(l), t.count, t.total, t.max, t.samples]
+                           for (n, l), t in self.timers.items()],
+                "slow": [rec for _, _, rec in self.slow],
+                "peak_rss_mb": peak_rss_mb(),
+            }
+
+    def drain(self):
+        """snapshot() and reset, for workers that report after each task."""
+        snap = self.snapshot()
+        with self._lock:
+            self.counters, self.timers, self.slow = {}, {}, []
+        return snap
+
+    def merge(self, snap):
+        with self._lock:
+            for n, l, v in snap["counters"]:
+                k = (n, tuple(tuple(x) for x in l))
+                self.counters[k] = self.counters.get(k, 0) + v
+            for n, l, count, total, mx, samples in snap["timers"]:
+                k = (n, tuple(tuple(x) for x in l))
+                t = self.timers.get(k)
+                if t is None:
+                    t = self.timers[k] = Timer()
+                t.count += count
+                t.total += total
+                t.max = max(t.max, mx)
+                room = RESERVOIR_SIZE - len(t.samples)
+                t.samples.extend(samples[:room])
+        for rec in snap["slow"]:
+            rec = dict(rec)
+            self.slow_query(rec.pop("seconds"), rec.pop("sql"), **rec)
+        self.worker_peak_rss_mb = max(self.worker_peak_rss_mb, snap.get("peak_rss_mb", 0))
+
+    # ── export ───────────────────────────────────────────────────────────────
+    def _labels(self, labels):
+        return {"stage": self.stage, **dict(labels)}
+
+    def records(self):
+        recs = []
+        with self._lock:
+            for (n, l), v in sorted(self.counters.items()):
+                recs.append({"type": "counter", "name": n, "labels": self._labels(l), "value": v})
+            for (n, l), t in sorted(self.timers.items()):
+                recs.append({"type": "timer", "name": n, "labels": self._labels(l), **t.summary()})
+        return recs
+
+    def prometheus_text(self):
+        def esc(v):
+            return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def fmt(labels):
+            return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+        lines, seen = [], set()
+        for r in self.records():
+            metric = "acl_" + r["name"]
+            labels = r["labels"]
+            if r["type"] == "counter":
+                metric += "_total"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} counter")
+                    seen.add(metric)
+                lines.append(f"{metric}{fmt(labels)} {r['value']}")
+            else:
+                metric += "_seconds"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} summary")
+                    seen.add(metric)
+                for q in QUANTILES:
+                    lines.append(f"{metric}{fmt({**labels, 'quantile': q})} {r[f'p{int(q * 100)}']}")
+                lines.append(f"{metric}_sum{fmt(labels)} {r['sum']}")
+                lines.append(f"{metric}_count{fmt(labels)} {r['count']}")
+        st = {"stage": self.stage}
+        lines.append("# TYPE acl_run_wall_seconds gauge")
+        lines.append(f"acl_run_wall_seconds{fmt(st)} {round(time.time() - self.started, 3)}")
+        lines.append("# TYPE acl_peak_rss_megabytes gauge")
+        lines.append(f"acl_peak_rss_megabytes{fmt(st)} {round(peak_rss_mb(), 1)}")
+        if self.worker_peak_rss_mb:
+            lines.append(f"acl_peak_rss_megabytes{fmt({**st, 'process': 'worker'})} "
+                         f"{round(self.worker_peak_rss_mb, 1)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, out_dir=None):
+        out_dir = METRICS_DIR if out_dir is None else out_dir
+        if not out_dir:
+            return None
+        os.makedirs(out_dir, exist_ok=True)
+        base = os.path.join(out_dir, self.stage)
+        run = {"type": "run", "stage": self.stage, "started": self.started,
+               "wall_seconds": round(time.time() - self.started, 3),
+               "peak_rss_mb": round(peak_rss_mb(), 1),
+               "worker_peak_rss_mb": round(self.worker_peak_rss_mb, 1)}
+        with open(base + ".jsonl", "a", encoding="utf-8") as f:
+            for r in self.records() + [run]:
+                f.write(json.dumps({"run_started": self.started, **r}, ensure_ascii=False) + "\n")
+        tmp = f"{base}.prom.{os.getpid()}.tmp"   # several workers may share the directory
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, base + ".prom")
+        with open(base + ".slow.jsonl", "w", encoding="utf-8") as f:
+            for _, _, rec in sorted(self.slow, reverse=True):
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        return base
+
+    def report(self, top=5):
+        """Print a short 'where did the time go' summary and write the files."""
+        wall = time.time() - self.started
+        with self._lock:
+            by_name = {}
+            for (n, _), t in self.timers.items():
+                by_name[n] = by_name.get(n, 0.0) + t.total
+        print(f"⏱️  {self.stage}: wall {wall:,.1f} s, peak RSS {peak_rss_mb():,.0f} MB")
+        for n, secs in sorted(by_name.items(), key=lambda kv: -kv[1])[:top]:
+            print(f"   {n:<28} {secs:10,.1f} s")
+        base = self.write()
+        if base:
+            print(f"   metrics → {base}.jsonl / .prom / .slow.jsonl")
+
+
+class InstrumentedCursor:
+    """DB-API cursor proxy that feeds every execute() into a Metrics registry."""
+
+    def __init__(self, cur, metrics, labels):
+        self._cur = cur
+        self._metrics = metrics
+        self._labels = labels
+
+    def execute(self, query, params=None):
+        t0 = time.perf_counter()
+        code = None
+        try:
+            return self._cur.execute(query, params)
+        except Exception as e:
+            code = getattr(e, "pgcode", None) or type(e).__name__
+            raise
+        finally:
+            if isinstance(query, str):
+                text = query
+            elif hasattr(query, "as_string"):   # psycopg2.sql.Composed
+                text = query.as_string(self._cur)
+            else:
+                text = str(query)
+            self._metrics.query(time.perf_counter() - t0, text, code=code, **self._labels)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
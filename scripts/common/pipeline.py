@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content-addressed stage runner for the generation pipeline.
+
+A pipeline is a list of Stage objects. Each stage runs one of the existing
+scripts as a subprocess and declares the files it reads and writes. A stage's
+cache key is a hash over:
+  • the script source (plus any helper modules it imports),
+  • its command-line arguments and parameters,
+  • selected environment variables (e.g. PG_PORT, SEED),
+  • the content digests of its input files.
+
+After a successful run the outputs are stored as content-addressed blobs under
+the cache directory. On the next run, a stage whose key is unchanged is not
+executed; its outputs are restored from the blob store (or left untouched if
+they already match). Stages whose dependencies are satisfied run concurrently.
+"""
+
+import os, sys, json, time, shutil, hashlib, subprocess, threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+CACHE_DIR_DEFAULT = ".pipeline_cache"
+HASH_CHUNK = 1 << 20
+
+
+class Stage:
+    def __init__(self, name, script, args=(), inputs=(), outputs=(), deps=(),
+                 params=None, env_keys=(), code=()):
+        self.name = name
+        self.script = script
+        self.args = [str(a) for a in args]
+        self.inputs = list(inputs)        # files read (relative to workdir)
+        self.outputs = list(outputs)      # files written (relative to workdir)
+        self.deps = list(deps)            # stage names that must finish first
+        self.params = dict(params or {})  # extra values that affect the result
+        self.env_keys = list(env_keys)    # environment variables that affect the result
+        self.code = list(code)            # helper modules whose source counts as "code version"
+
+
+# ── Hashing ──────────────────────────────────────────────────────────────────
+class DigestMemo:
+    """
+    sha256 of files, memoized on (size, mtime_ns) so unchanged multi-GB inputs
+    are not re-read on every run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.memo = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.memo = json.load(f)
+            except Exception:
+                self.memo = {}
+
+    def digest(self, path):
+        if not os.path.isfile(path):
+            return "missing"
+        st = os.stat(path)
+        ap = os.path.abspath(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        with self.lock:
+            hit = self.memo.get(ap)
+        if hit and hit[:2] == stamp:
+            return hit[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        d = h.hexdigest()
+        with self.lock:
+            self.memo[ap] = stamp + [d]
+        return d
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self.lock, open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.memo, f)
+        os.replace(tmp, self.path)
+
+
+def stage_key(stage, workdir, digests):
+    h = hashlib.sha256()
+    h.update(stage.name.encode())
+    for path in [stage.script] + stage.code:
+        h.update(b"code:" + digests.digest(path).encode())
+    h.update(json.dumps(stage.args).encode())
+    h.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+    for k in stage.env_keys:
+        h.update(f"env:{k}={os.getenv(k, '')}".encode())
+    for rel in stage.inputs:
+        h.update(f"in:{rel}={digests.digest(os.path.join(workdir, rel))}".encode())
+    return h.hexdigest()
+
+
+# ── Blob store ───────────────────────────────────────────────────────────────
+class StageCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "objects")
+        self.stage_dir = os.path.join(cache_dir, "stages")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.stage_dir, exist_ok=True)
+
+    def _manifest_path(self, stage_name, key):
+        return os.path.join(self.stage_dir, stage_name, key + ".json")
+
+    def lookup(self, stage_name, key):
+        p = self._manifest_path(stage_name, key)
+        if not os.path.isfile(p):
+            return None
+        with open(p, encoding="utf-8") as f:
+            manifest = json.load(f)
+        for blob in manifest["outputs"].values():
+            if not os.path.isfile(os.path.join(self.blob_dir, blob)):
+                return None
+        return manifest
+
+    def store(self, stage, key, workdir, digests, elapsed):
+        outputs = {}
+        for rel in stage.outputs:
+            src = os.path.join(workdir, rel)
+            if not os.path.isfile(src):
+                raise RuntimeError(f"stage {stage.name} did not produce {rel}")
+            d = digests.digest(src)
+            blob = os.path.join(self.blob_dir, d)
+            if not os.path.isfile(blob):
+                shutil.copyfile(src, blob + ".tmp")
+                os.replace(blob + ".tmp", blob)
+            outputs[rel] = d
+        p = self._manifest_path(stage.name, key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump({"stage": stage.name, "key": key, "outputs": outputs,
+                       "elapsed_s": round(elapsed, 3), "created": time.time()}, f, indent=1)
+
+    def restore(self, manifest, workdir, digests):
+        """Materialize cached outputs; returns the number of files actually copied."""
+        copied = 0
+        for rel, d in manifest["outputs"].items():
+            dst = os.path.join(workdir, rel)
+            if digests.digest(dst) == d:
+                continue
+            os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+            shutil.copyfile(os.path.join(self.blob_dir, d), dst + ".tmp")
+            os.replace(dst + ".tmp", dst)
+            copied += 1
+        return copied
+
+
+# ── DAG execution ────────────────────────────────────────────────────────────
+def toposort(stages):
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        for d in s.deps:
+            if d not in by_name:
+                raise ValueError(f"stage {s.name} depends on unknown stage {d}")
+    order, state = [], {}
+
+    def visit(name):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "active":
+            raise ValueError(f"dependency cycle through {name}")
+        state[name] = "active"
+        for d in by_name[name].deps:
+            visit(d)
+        state[name] = "done"
+        order.append(by_name[name])
+
+    for s in stages:
+        visit(s.name)
+    return order
+
+
+def run_stage_process(stage, workdir):
+    cmd = [sys.executable, stage.script] + stage.args
+    env = {**os.environ, **{k: str(v) for k, v in stage.params.items() if k.isupper()}}
+    t0 = time.time()
+    proc = subprocess.run(cmd, cwd=workdir, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"stage {stage.name} exited with {proc.returncode}")
+    return time.time() - t0
+
+
+def run_pipeline(stages, workdir=".", cache_dir=None, jobs=2, force=(), dry_run=False):
+    """
+    Run `stages` in dependency order, skipping those whose key is cached.
+    Returns {stage_name: "cached" | "ran" | "failed" | "blocked" | "would-run"}.
+    """
+    workdir = os.path.abspath(workdir)
+    cache_dir = cache_dir or os.path.join(workdir, CACHE_DIR_DEFAULT)
+    cache = StageCache(cache_dir)
+    digests = DigestMemo(os.path.join(cache_dir, "digests.json"))
+    force = set(force)
+
+    ordered = toposort(stages)
+    status = {}
+    pending = {s.name: s for s in ordered}
+    running = {}
+
+    def ready(s):
+        return all(status.get(d) in ("cached", "ran", "would-run") for d in s.deps)
+
+    def blocked(s):
+        return any(status.get(d) in ("failed", "blocked") for d in s.deps)
+
+    def execute(s):
+        key = stage_key(s, workdir, digests)
+        manifest = None if (s.name in force or "all" in force) else cache.lookup(s.name, key)
+        if manifest is not None:
+            copied = cache.restore(manifest, workdir, digests)
+            note = f", restored {copied} file(s)" if copied else ""
+            print(f"⏭️  {s.name}: cached ({key[:12]}{note})")
+            return "cached"
+        if dry_run:
+            print(f"🔸 {s.name}: would run ({key[:12]})")
+            return "would-run"
+        print(f"▶️  {s.name}: running ({key[:12]})")
+        elapsed = run_stage_process(s, workdir)
+        cache.store(s, key, workdir, digests, elapsed)
+        print(f"✅ {s.name}: done in {elapsed:,.1f} s")
+        return "ran"
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        while pending or running:
+            for name, s in list(pending.items()):
+                if blocked(s):
+                    status[name] = "blocked"
+                    print(f"⛔ {name}: blocked by failed dependency")
+                    del pending[name]
+                elif ready(s):
+                    running[ex.submit(execute, s)] = name
+                    del pending[name]
+            if not running:
+                break
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    status[name] = fut.result()
+                except Exception as e:
+                    status[name] = "failed"
+                    print(f"❌ {name}: {e}")
+
+    digests.save()
+    return status
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Policy sweeps: K random policies per database, labelled statically.
+
+A policy is a list of roles; role 1 reads everything, every other role gets a
+random share of the tables (table_frac) and, in each of them, a random share
+of the columns (col_frac). Fractions and the role count are drawn per policy
+from the ranges in a SweepSpec.
+
+Labels come from the dependency index (common/deps_index.py) instead of
+Postgres: a query is permitted for a role iff every column it reads is
+granted, and every table it only counts rows of has at least one granted
+column. That is the GRANT semantics the Postgres labellers observe.
+For one database all (policy, role) pairs are labelled at once:
+
+    missing columns = R · ¬G        R: queries × columns read
+    missing tables  = T · ¬any(G)   T: queries × tables counted (COUNT(*))
+    permit          = both == 0
+
+Identical privilege sets (common across random policies) are labelled once.
+
+Grants are stored as hex of np.packbits over the database's column list
+(QueryMatrix.privs.columns); decode_grants() turns them back into
+{table: [columns]}.
+"""
+
+import random
+import numpy as np
+
+from common.privileges import DatabasePrivileges
+
+
+class SweepSpec:
+    """
+    Distribution of generated policies. Ranges are inclusive (lo, hi) tuples.
+
+    policies:   K policies per database
+    roles:      number of roles per policy
+    table_frac: share of tables granted to a non-admin role
+    col_frac:   share of columns granted in each of those tables
+    seeds:      explicit per-policy seeds (overrides policies/seed)
+    """
+
+    def __init__(self, policies=100, roles=(4, 4), table_frac=(0.3, 0.7),
+                 col_frac=(0.3, 0.7), seeds=None, seed=0):
+        self.policies = policies
+        self.roles = roles
+        self.table_frac = table_frac
+        self.col_frac = col_frac
+        self.seeds = list(seeds) if seeds else None
+        self.seed = seed
+
+    def policy_seeds(self):
+        return self.seeds if self.seeds else [self.seed * 1_000_003 + k for k in range(self.policies)]
+
+    def rng(self, db_id, policy_seed):
+        # independent stream per (database, policy) → order/parallelism don't change results
+        return random.Random(f"{policy_seed}:{db_id}")
+
+
+def random_policy(rnd, schema, spec):
+    """
+    schema: {table: [columns]}. Returns (params, [{table: [columns]}] per role).
+    """
+    tables = sorted(schema)
+    n_roles = rnd.randint(*spec.roles)
+    t_frac = rnd.uniform(*spec.table_frac)
+    c_frac = rnd.uniform(*spec.col_frac)
+    roles = [{t: list(schema[t]) for t in tables}]
+    for _ in range(n_roles - 1):
+        chosen = rnd.sample(tables, max(1, round(len(tables) * t_frac))) if tables else []
+        grants = {}
+        for t in sorted(chosen):
+            cols = schema[t]
+            if cols:
+                grants[t] = sorted(rnd.sample(cols, max(1, round(len(cols) * c_frac))), key=cols.index)
+        roles.append(grants)
+    params = {"roles": n_roles, "table_frac": round(t_frac, 4), "col_frac": round(c_frac, 4)}
+    return params, roles
+
+
+class QueryMatrix:
+    """Read requirements of one database's queries as dense 0/1 matrices."""
+
+    def __init__(self, db_id, schema, idx):
+        self.privs = DatabasePrivileges(db_id, [(t, c) for t in sorted(schema) for c in schema[t]])
+        self.tables = [t for t in sorted(schema) if schema[t]]
+        self.starts = np.array([self.privs.table_range[t][0] for t in self.tables], dtype=np.int64)
+        t_id = {t: i for i, t in enumerate(self.tables)}
+
+        self.qids, self.unresolved = [], []
+        col_rows, tab_rows = [], []
+        for db, qid in sorted(idx.queries(db_id)):
+            refs = idx.refs(db, qid)
+            if idx.error(db, qid) or not refs:
+                self.unresolved.append(qid)
+                continue
+            cols = [(t, c) for t, c in refs if c]
+            counted = [t_id[t] for t, c in refs if not c and t in t_id]
+            if any(tc not in self.privs.col_id for tc in cols) or any(not c and t not in t_id for t, c in refs):
+                self.unresolved.append(qid)   # reads something outside the schema snapshot
+                continue
+            self.qids.append(qid)
+            col_rows.append(self.privs.mask(cols))
+            row = np.zeros(len(self.tables), dtype=bool)
+            row[counted] = True
+            tab_rows.append(row)
+        n_cols = len(self.privs.columns)
+        self.R = np.array(col_rows, dtype=np.float32).reshape(-1, n_cols)
+        self.T = np.array(tab_rows, dtype=np.float32).reshape(-1, len(self.tables))
+
+    def role_bits(self, grants):
+        return self.privs.mask((t, c) for t, cols in grants.items() for c in cols)
+
+    def label(self, G):
+        """G: roles × columns bool. Returns (queries × roles bool, unique privilege sets)."""
+        if len(G) == 0 or len(self.qids) == 0:
+            return np.zeros((len(self.qids), len(G)), dtype=bool), 0
+        uniq, inverse = np.unique(G, axis=0, return_inverse=True)
+        missing_cols = self.R @ (~uniq).T.astype(np.float32)
+        if len(self.tables):
+            any_tab = np.logical_or.reduceat(uniq, self.starts, axis=1)
+            missing_tabs = self.T @ (~any_tab).T.astype(np.float32)
+        else:
+            missing_tabs = np.zeros_like(missing_cols)
+        permit = (missing_cols == 0) & (missing_tabs == 0)
+        return permit[:, inverse.reshape(-1)], len(uniq)
+
+
+def encode_grants(bits):
+    return np.packbits(bits).tobytes().hex()
+
+
+def decode_grants(hex_bits, columns):
+    """Inverse of encode_grants for a database's [(table, column)] list."""
+    bits = np.unpackbits(np.frombuffer(bytes.fromhex(hex_bits), dtype=np.uint8), count=len(columns))
+    out = {}
+    for i in np.flatnonzero(bits):
+        tbl, col = columns[i]
+        out.setdefault(tbl, []).append(col)
+    return out
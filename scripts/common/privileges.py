@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compiled privilege model: one column bitmap per (database, role).
+
+Every (table, column) of a database is interned to a column id; a table's
+columns get a contiguous id range. A role's privileges are then a NumPy bool
+vector over those ids, so "can role R read T.C" is a dict lookup plus one
+index, and comparing roles is vectorised set algebra.
+
+    model = PrivilegeModel.from_permissions_csv("user_permissions_bird.csv")
+    db = model["california_schools"]
+    db.can_read("california_schools_User_3", "frpm", "county name")
+    db.is_subset("california_schools_User_4", "california_schools_User_2")
+    db.equivalence_classes()                     # roles with identical grants
+    model.save("user_permissions_bird.npz")      # compact form shipped with the dataset
+    model = PrivilegeModel.load("user_permissions_bird.npz")
+
+The column universe of a database is the union of all columns granted to any
+of its roles (User_1 holds every column), plus anything passed in `schema`.
+Role, table and column names are lower-cased, as in the migrated Postgres
+schema; lookups accept any case.
+"""
+
+import csv
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+class DatabasePrivileges:
+    def __init__(self, db, columns, roles=None):
+        self.db = db
+        self.columns = list(columns)                       # [(table, column)] by id
+        self.col_id = {tc: i for i, tc in enumerate(self.columns)}
+        self.table_range = {}                              # table → (first id, last id + 1)
+        for i, (tbl, _) in enumerate(self.columns):
+            lo, _ = self.table_range.get(tbl, (i, i))
+            self.table_range[tbl] = (lo, i + 1)
+        self.roles = dict(roles or {})                     # role → bool vector
+
+    # ── construction ─────────────────────────────────────────────────────────
+    def mask(self, cols):
+        """Bool vector for an iterable of (table, column); unknown names are ignored."""
+        m = np.zeros(len(self.columns), dtype=bool)
+        ids = [self.col_id[(t.lower(), c.lower())] for t, c in cols if (t.lower(), c.lower()) in self.col_id]
+        m[ids] = True
+        return m
+
+    def set_role(self, role, cols):
+        self.roles[role.lower()] = self.mask(cols)
+
+    def bits(self, role):
+        return self.roles[role.lower()]
+
+    # ── lookups ──────────────────────────────────────────────────────────────
+    def can_read(self, role, table, column):
+        i = self.col_id.get((table.lower(), column.lower()))
+        return i is not None and bool(self.roles[role.lower()][i])
+
+    def can_read_table(self, role, table):
+        """Any column of `table` granted (what Postgres requires for COUNT(*))."""
+        r = self.table_range.get(table.lower())
+        return r is not None and bool(self.roles[role.lower()][r[0]:r[1]].any())
+
+    def has_full_table(self, role, table):
+        r = self.table_range.get(table.lower())
+        return r is not None and bool(self.roles[role.lower()][r[0]:r[1]].all())
+
+    def covers(self, role, cols):
+        """True when every (table, column) in `cols` is granted to `role`."""
+        bits = self.roles[role.lower()]
+        for t, c in cols:
+            i = self.col_id.get((t.lower(), c.lower()))
+            if i is None or not bits[i]:
+                return False
+        return True
+
+    def granted(self, role):
+        """{table: [columns]} in column-id order."""
+        out = {}
+        for i in np.flatnonzero(self.roles[role.lower()]):
+            tbl, col = self.columns[i]
+            out.setdefault(tbl, []).append(col)
+        return out
+
+    # ── set algebra ──────────────────────────────────────────────────────────
+    def union(self, *roles):
+        return np.logical_or.reduce([self.bits(r) for r in roles])
+
+    def intersection(self, *roles):
+        return np.logical_and.reduce([self.bits(r) for r in roles])
+
+    def difference(self, a, b):
+        """Columns `a` can read and `b` cannot."""
+        return self.bits(a) & ~self.bits(b)
+
+    def is_subset(self, a, b):
+        return not self.difference(a, b).any()
+
+    def equivalence_classes(self):
+        """Groups of roles with identical privileges (largest first)."""
+        groups = {}
+        for role, bits in self.roles.items():
+            groups.setdefault(np.packbits(bits).tobytes(), []).append(role)
+        return sorted((sorted(g) for g in groups.values()), key=lambda g: (-len(g), g))
+
+
+class PrivilegeModel:
+    def __init__(self):
+        self.dbs = {}
+        self.role_db = {}   # role → db
+
+    def __getitem__(self, db):
+        return self.dbs[db.lower()]
+
+    def __contains__(self, db):
+        return db.lower() in self.dbs
+
+    def __iter__(self):
+        return iter(self.dbs.values())
+
+    def for_role(self, role):
+        return self.dbs[self.role_db[role.lower()]]
+
+    def can_read(self, role, table, column):
+        db = self.role_db.get(role.lower())
+        return db is not None and self.dbs[db].can_read(role, table, column)
+
+    @classmethod
+    def from_grants(cls, rows, schema=None):
+        """
+        rows: iterable of (database, role, table, [columns]).
+        schema: optional {database: {table: [columns]}} adding ungranted columns.
+        """
+        per_db = {}
+        for db, role, tbl, cols in rows:
+            per_db.setdefault(db.lower(), []).append((role.lower(), tbl.lower(), [c.lower() for c in cols]))
+        for db in (schema or {}):
+            per_db.setdefault(db.lower(), [])
+
+        model = cls()
+        for db, grants in per_db.items():
+            universe = {}   # table → {column: None}, keeps first-seen column order
+            for tbl, cols in ((schema or {}).get(db, {}) or {}).items():
+                universe.setdefault(tbl.lower(), {}).update((c.lower(), None) for c in cols)
+            for _, tbl, cols in grants:
+                universe.setdefault(tbl, {}).update((c, None) for c in cols)
+            columns = [(t, c) for t in sorted(universe) for c in universe[t]]
+
+            dbp = DatabasePrivileges(db, columns)
+            by_role = {}
+            for role, tbl, cols in grants:
+                by_role.setdefault(role, []).extend((tbl, c) for c in cols)
+            for role, cols in by_role.items():
+                dbp.set_role(role, cols)
+                model.role_db[role] = db
+            model.dbs[db] = dbp
+        return model
+
+    @classmethod
+    def from_permissions_csv(cls, perms_csv, schema=None):
+        """Compile a user_permissions*.csv (database, user, object, accessible_columns)."""
+        rows = []
+        with open(perms_csv, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                cols = [c.strip() for c in (row["accessible_columns"] or "").split(",") if c.strip()]
+                rows.append((row["database"].strip(), row["user"].strip(), row["object"].strip(), cols))
+        return cls.from_grants(rows, schema)
+
+    # ── serialisation ────────────────────────────────────────────────────────
+    def save(self, path):
+        """One .npz: interned column names + packed role bitmaps (np.packbits)."""
+        dbs = sorted(self.dbs)
+        col_start, col_table, col_name = [0], [], []
+        roles, role_db, bit_start, chunks = [], [], [0], []
+        for di, db in enumerate(dbs):
+            dbp = self.dbs[db]
+            col_table += [t for t, _ in dbp.columns]
+            col_name += [c for _, c in dbp.columns]
+            col_start.append(len(col_table))
+            for role in sorted(dbp.roles):
+                packed = np.packbits(dbp.roles[role])
+                roles.append(role)
+                role_db.append(di)
+                chunks.append(packed)
+                bit_start.append(bit_start[-1] + len(packed))
+        np.savez_compressed(
+            path,
+            version=np.array([FORMAT_VERSION]),
+            dbs=np.array(dbs, dtype=str),
+            col_start=np.array(col_start, dtype=np.int64),
+            col_table=np.array(col_table, dtype=str),
+            col_name=np.array(col_name, dtype=str),
+            roles=np.array(roles, dtype=str),
+            role_db=np.array(role_db, dtype=np.int32),
+            bit_start=np.array(bit_start, dtype=np.int64),
+            bits=np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8),
+        )
+
+    @classmethod
+    def load(cls, path):
+        z = np.load(path, allow_pickle=False)
+        if int(z["version"][0]) != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported privilege model version {int(z['version'][0])}")
+        dbs, col_start = z["dbs"].tolist(), z["col_start"]
+        col_table, col_name = z["col_table"].tolist(), z["col_name"].tolist()
+        model = cls()
+        for di, db in enumerate(dbs):
+            lo, hi = int(col_start[di]), int(col_start[di + 1])
+            model.dbs[db] = DatabasePrivileges(db, zip(col_table[lo:hi], col_name[lo:hi]))
+        bit_start, bits = z["bit_start"], z["bits"]
+        for ri, (role, di) in enumerate(zip(z["roles"].tolist(), z["role_db"].tolist())):
+            dbp = model.dbs[dbs[di]]
+            packed = bits[int(bit_start[ri]):int(bit_start[ri + 1])]
+            dbp.roles[role] = np.unpackbits(packed, count=len(dbp.columns)).astype(bool)
+            model.role_db[role] = dbs[di]
+        return model
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Role definitions: how many roles each database gets and what each one reads.
+
+Roles are declared in a JSON file ($ROLES_FILE); without one, the four
+original roles are used (same shuffles, same splits):
+
+    {
+      "table_sets": {"half": {"fraction": 0.5}},
+      "roles": [
+        {"name": "User_1"},
+        {"name": "User_2", "tables": {"set": "half"}},
+        {"name": "User_3", "columns": {"prefix": 0.5}},
+        {"name": "User_4", "tables": {"set": "half"}, "columns": {"prefix": 0.5}}
+      ]
+    }
+
+Role `name` is the suffix of the Postgres role (<db>_<name>). Rules:
+
+  tables   "all" (default), or an object with
+             set       draw shared by every role naming it (table_sets), so
+                       e.g. User_2 and User_4 see the same tables
+             fraction  independent random share of the candidate tables
+             count     fixed number of candidate tables
+             match / exclude   regex filters on the table name (case-insensitive)
+             min       lower bound for fraction (default: the spec's "min", 1)
+  columns  "all" (default), or an object with
+             prefix    first share of the columns, declaration order
+             fraction  random share of the columns (kept in declaration order)
+             count     fixed number of columns
+             match / exclude   regex filters on the column name
+             min       as above
+  parent   name of an earlier role: candidates are the parent's tables and
+           columns instead of the whole schema, so tiers nest (child ⊆ parent)
+
+A table set is drawn once per database, in declaration order, by shuffling
+the table list and keeping a prefix; a rule with "fraction" or "count" draws
+the same way. Grants are always materialised per role (no Postgres role
+membership), so the permission CSV lists each role's effective privileges.
+
+grant_script() renders one database's roles as a single SQL batch (one round
+trip) with identical grants merged across roles and tables. apply_grants()
+runs it and, if the batch fails, runs each role's own script separately, so a
+failing GRANT only costs that role.
+"""
+
+import os, re, json
+
+ROLES_FILE = os.getenv("ROLES_FILE", "")
+ROLE_PASSWORD = "pass123"
+
+DEFAULT_SPEC = {
+    "table_sets": {"half": {"fraction": 0.5}},
+    "roles": [
+        {"name": "User_1"},
+        {"name": "User_2", "tables": {"set": "half"}},
+        {"name": "User_3", "columns": {"prefix": 0.5}},
+        {"name": "User_4", "tables": {"set": "half"}, "columns": {"prefix": 0.5}},
+    ],
+}
+
+TABLE_KEYS = {"set", "fraction", "count", "match", "exclude", "min"}
+COLUMN_KEYS = {"prefix", "fraction", "count", "match", "exclude", "min"}
+NAME_PAT = re.compile(r"^[A-Za-z0-9_]+$")
+
+
+def q_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _share(n, rule, key, floor_min):
+    k = int(n * rule[key]) if key in ("fraction", "prefix") else int(rule[key])
+    return min(n, max(rule.get("min", floor_min), k))
+
+
+class RoleSpec:
+    def __init__(self, spec, min_count=1):
+        """min_count: default floor for fraction/prefix rules (Spider's original split has none → 0)."""
+        self.min = spec.get("min", min_count)
+        self.table_sets = dict(spec.get("table_sets") or {})
+        self.roles = [dict({"tables": "all", "columns": "all"}, **r) for r in spec.get("roles") or []]
+        self.validate()
+
+    @classmethod
+    def load(cls, path=None, min_count=1):
+        """$ROLES_FILE (or `path`) if set, else the four default roles."""
+        path = path if path is not None else ROLES_FILE
+        if not path:
+            return cls(DEFAULT_SPEC, min_count)
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), min_count)
+
+    @property
+    def names(self):
+        return [r["name"] for r in self.roles]
+
+    def validate(self):
+        if not self.roles:
+            raise ValueError("role spec declares no roles")
+        seen = set()
+        for r in self.roles:
+            name = r.get("name") or ""
+            if not NAME_PAT.match(name):
+                raise ValueError(f"role name {name!r}: use letters, digits and '_'")
+            if name in seen:
+                raise ValueError(f"duplicate role {name!r}")
+            if r.get("parent") is not None and r["parent"] not in seen:
+                raise ValueError(f"role {name!r}: parent {r['parent']!r} must be declared before it")
+            seen.add(name)
+            for what, rule, keys in (("tables", r["tables"], TABLE_KEYS), ("columns", r["columns"], COLUMN_KEYS)):
+                if rule == "all":
+                    continue
+                if not isinstance(rule, dict) or set(rule) - keys:
+                    raise ValueError(f"role {name!r}: bad {what} rule {rule!r}")
+                if len({"set", "fraction", "count", "prefix"} & set(rule)) > 1:
+                    raise ValueError(f"role {name!r}: {what} rule mixes selectors {rule!r}")
+                if rule.get("set") is not None and rule["set"] not in self.table_sets:
+                    raise ValueError(f"role {name!r}: unknown table set {rule['set']!r}")
+        for sname, rule in self.table_sets.items():
+            if not isinstance(rule, dict) or set(rule) - (TABLE_KEYS - {"set"}):
+                raise ValueError(f"table set {sname!r}: bad rule {rule!r}")
+
+    # ── selection ────────────────────────────────────────────────────────────
+    def _pick(self, rnd, items, rule, floor_min):
+        if rule == "all":
+            return list(items)
+        pool = list(items)
+        if "match" in rule:
+            pool = [x for x in pool if re.search(rule["match"], x, re.IGNORECASE)]
+        if "exclude" in rule:
+            pool = [x for x in pool if not re.search(rule["exclude"], x, re.IGNORECASE)]
+        if "prefix" in rule:
+            return pool[:_share(len(pool), rule, "prefix", floor_min)]
+        if "fraction" in rule or "count" in rule:
+            drawn = pool[:]
+            rnd.shuffle(drawn)
+            keep = set(drawn[:_share(len(pool), rule, "fraction" if "fraction" in rule else "count", floor_min)])
+            return [x for x in pool if x in keep]
+        return pool
+
+    def assign(self, schema, rnd, tables=None):
+        """
+        schema: {table: [columns]}; rnd: random source (random module or Random);
+        tables: table order to draw from (default: schema order).
+        Returns [(role name, {table: [columns]})] in declaration order.
+        """
+        tables = list(schema) if tables is None else list(tables)
+        sets = {name: set(self._pick(rnd, tables, rule, self.min)) for name, rule in self.table_sets.items()}
+        out, by_name = [], {}
+        for r in self.roles:
+            parent = by_name.get(r.get("parent"))
+            cand = [t for t in tables if t in parent] if parent is not None else tables
+            rule = r["tables"]
+            if rule != "all" and "set" in rule:
+                filters = {k: v for k, v in rule.items() if k != "set"}
+                picked = [t for t in self._pick(rnd, cand, filters, self.min) if t in sets[rule["set"]]]
+            else:
+                picked = self._pick(rnd, cand, rule, self.min)
+            grants = {}
+            for t in picked:
+                cols = parent[t] if parent is not None else schema[t]
+                allowed = self._pick(rnd, cols, r["columns"], self.min)
+                if allowed:
+                    grants[t] = allowed
+            by_name[r["name"]] = grants
+            out.append((r["name"], grants))
+        return out
+
+
+def grant_script(db, pg_schema, assigned, schema, qualify, password=ROLE_PASSWORD):
+    """
+    One SQL batch that (re)creates every role of `db` and applies its grants.
+    Roles holding every table in full get GRANT ... ON ALL TABLES; identical
+    (columns, roles) grants are merged into one statement.
+    """
+    roles = [f"{db}_{name}" for name, _ in assigned]
+    names = ", ".join("'" + r.replace("'", "''") + "'" for r in roles)
+    stmts = [
+        "DO $$DECLARE r text; BEGIN "
+        f"FOREACH r IN ARRAY ARRAY[{names}]::text[] LOOP "
+        "IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = r) THEN "
+        "EXECUTE format('DROP OWNED BY %I', r); EXECUTE format('DROP ROLE %I', r); "
+        "END IF; END LOOP; END$$;"
+    ]
+    pw = "'" + password.replace("'", "''") + "'"
+    stmts += [f"CREATE ROLE {q_ident(r)} LOGIN PASSWORD {pw};" for r in roles]
+    stmts.append(f"GRANT USAGE ON SCHEMA {q_ident(pg_schema)} TO {', '.join(q_ident(r) for r in roles)};")
+
+    everything, full, partial = [], {}, {}
+    for role, (_, grants) in zip(roles, assigned):
+        if grants and all(grants.get(t) == cols for t, cols in schema.items()):
+            everything.append(role)
+            continue
+        whole = tuple(t for t, cols in grants.items() if cols == schema[t])
+        if whole:
+            full.setdefault(whole, []).append(role)
+        for tbl, cols in grants.items():
+            if cols != schema[tbl]:
+                partial.setdefault((tbl, tuple(cols)), []).append(role)
+    if everything:
+        stmts.append(f"GRANT SELECT ON ALL TABLES IN SCHEMA {q_ident(pg_schema)} "
+                     f"TO {', '.join(q_ident(r) for r in everything)};")
+    for tbls, rs in full.items():
+        stmts.append(f"GRANT SELECT ON {', '.join(qualify(pg_schema, t) for t in tbls)} "
+                     f"TO {', '.join(q_ident(r) for r in rs)};")
+    for (tbl, cols), rs in partial.items():
+        stmts.append(f"GRANT SELECT ({', '.join(q_ident(c) for c in cols)}) ON {qualify(pg_schema, tbl)} "
+                     f"TO {', '.join(q_ident(r) for r in rs)};")
+    return "\n".join(stmts)
+
+
+def apply_grants(cur, db, pg_schema, assigned, schema, qualify, tail="", password=ROLE_PASSWORD):
+    """
+    Run grant_script() (plus the `tail` SQL) on an autocommit cursor. The batch
+    is one implicit transaction, so when it fails nothing is applied. Each role's
+    own script is then run separately, followed by `tail`. Returns (the
+    `assigned` entries in place, [(role, error)]); role is None for errors that
+    are not tied to a role (`tail`, or a batch error no single role reproduces).
+    """
+    try:
+        cur.execute(grant_script(db, pg_schema, assigned, schema, qualify, password)
+                    + ("\n" + tail if tail else ""))
+        return list(assigned), []
+    except Exception as e:
+        batch_error = f"batch: {str(e).strip()}"
+    applied, errors = [], []
+    for entry in assigned:
+        try:
+            cur.execute(grant_script(db, pg_schema, [entry], schema, qualify, password))
+            applied.append(entry)
+        except Exception as e:
+            errors.append((f"{db}_{entry[0]}", str(e).strip()))
+    if tail:
+        try:
+            cur.execute(tail)
+        except Exception as e:
+            errors.append((None, str(e).strip()))
+    return applied, errors or [(None, batch_error)]
+
+
+def permission_rows(db, assigned):
+    """[(database, role, table, "col,col")] rows of the permission CSV, in role order."""
+    return [(db, f"{db}_{name}", tbl, ",".join(cols))
+            for name, grants in assigned for tbl, cols in grants.items()]
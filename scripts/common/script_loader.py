@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Import the pipeline scripts as modules.
+
+Most scripts have hyphenated file names (dataset-groundtruth-bird.py) and read
+their configuration from the environment at import time, so set PG_* etc.
+before calling load_script().
+"""
+
+import os, re, sys, importlib.util
+
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def load_script(rel_path):
+    """load_script("bird/dataset-groundtruth-bird.py") → module object (cached)."""
+    path = os.path.join(SCRIPTS_DIR, rel_path)
+    mod_name = "acl_" + re.sub(r"\W", "_", os.path.splitext(rel_path)[0])
+    if mod_name in sys.modules:
+        return sys.modules[mod_name]
+    spec = importlib.util.spec_from_file_location(mod_name, path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[mod_name] = mod
+    try:
+        spec.loader.exec_module(mod)
+    except BaseException:
+        del sys.modules[mod_name]
+        raise
+    return mod
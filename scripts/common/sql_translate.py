@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite → Postgres translation of gold SQL, for the Postgres labellers.
+
+    sql_pg, rewrites = translate("SELECT IIF(`Free Meal` > 0, 1, 0) FROM frpm LIMIT 5, 10")
+    # 'SELECT (CASE WHEN "free meal" > 0 THEN 1 ELSE 0 END) FROM frpm LIMIT 10 OFFSET 5'
+    # ('backtick', 'iif', 'limit_offset')
+
+The SQL is tokenised once (string literals and comments are never touched)
+and rewritten at token level; results are memoised by source text, so the
+same gold SQL labelled for N roles is translated once. translate_many()
+does a batch. Each result carries the names of the rules that fired:
+
+  backtick, bracket    `Name` / [Name] → "name" (migrated schemas are lower-case)
+  dq_ident             "Name" → "name" when used as an identifier
+  dq_string            "text" → 'text' where SQLite reads it as a string literal
+                       (after a comparison, LIKE/GLOB, THEN/ELSE or in an IN list)
+  eq_eq                == → =
+  cast_real            AS REAL → AS DOUBLE PRECISION
+  ifnull               IFNULL(a, b) → COALESCE(a, b)
+  iif                  IIF(c, a, b) → (CASE WHEN c THEN a ELSE b END)
+  substr_text, length_text, instr
+                       SUBSTR / LENGTH / INSTR(→ STRPOS) on CAST(x AS TEXT)
+  strftime             STRFTIME('%Y-%m', x) → TO_CHAR(CAST(x AS TIMESTAMP), 'YYYY-MM')
+  now                  DATETIME('now') / DATE('now') → NOW() / CURRENT_DATE
+  group_concat         GROUP_CONCAT(x[, sep]) → STRING_AGG(CAST(x AS TEXT), sep)
+  round_numeric        ROUND(x, n) → ROUND(CAST(x AS NUMERIC), n)
+  limit_offset         LIMIT a, b → LIMIT b OFFSET a
+  like_text            col LIKE ... → CAST(col AS TEXT) LIKE ... (numeric columns)
+  concat_text          col || ... → CAST(col AS TEXT) || ... (SQLite coerces, Postgres does not)
+
+Anything else is passed through unchanged.
+"""
+
+import re
+from functools import lru_cache
+
+TOKEN_RE = re.compile(r"""
+     (?P<ws>\s+)
+    |(?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<str>'(?:[^']|'')*')
+    |(?P<dq>"(?:[^"]|"")*")
+    |(?P<bq>`[^`]*`)
+    |(?P<br>\[[^\]]*\])
+    |(?P<num>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<op>\|\||<=|>=|<>|!=|==)
+    |(?P<other>.)
+""", re.S | re.X)
+
+# a double-quoted token after one of these is a string literal in SQLite
+LITERAL_CONTEXT = {"=", "==", "<>", "!=", "<", ">", "<=", ">=", "LIKE", "GLOB", "THEN", "ELSE"}
+KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "AND", "OR", "NOT", "ON", "AS", "CASE", "WHEN", "THEN", "ELSE",
+    "END", "IS", "NULL", "IN", "BY", "GROUP", "ORDER", "HAVING", "LIMIT", "OFFSET", "JOIN",
+    "INNER", "LEFT", "RIGHT", "OUTER", "CROSS", "UNION", "ALL", "DISTINCT", "EXISTS", "BETWEEN",
+    "LIKE", "GLOB", "ASC", "DESC", "WITH", "USING", "EXCEPT", "INTERSECT",
+}
+STRFTIME_MAP = {"%Y": "YYYY", "%m": "MM", "%d": "DD", "%H": "HH24", "%M": "MI", "%S": "SS",
+                "%j": "DDD", "%%": "%"}
+STRFTIME_SPEC = re.compile(r"%.")
+STRFTIME_LITERAL_OK = re.compile(r"^[\s\-/:.,T]*$")
+
+ARITHMETIC = {"+", "-", "*", "/", "%"}
+OPERATOR_CHARS = {"(", ",", "=", "<", ">"} | ARITHMETIC
+
+TRANSLATE_CACHE_SIZE = 65536
+
+
+def tokenize(sql_text):
+    return [[m.lastgroup, m.group()] for m in TOKEN_RE.finditer(sql_text)]
+
+
+def _text(toks):
+    return "".join(t[1] for t in toks)
+
+
+def _dq_ident(raw):
+    return '"' + raw.replace('""', '"').lower().replace('"', '""') + '"'
+
+
+def _sig_before(toks, i):
+    """Index of the previous non-whitespace, non-comment token (or -1)."""
+    i -= 1
+    while i >= 0 and toks[i][0] in ("ws", "comment"):
+        i -= 1
+    return i
+
+
+def _sig_after(toks, i):
+    i += 1
+    while i < len(toks) and toks[i][0] in ("ws", "comment"):
+        i += 1
+    return i
+
+
+def _close_paren(toks, i):
+    depth = 0
+    for j in range(i, len(toks)):
+        if toks[j][1] == "(":
+            depth += 1
+        elif toks[j][1] == ")":
+            depth -= 1
+            if depth == 0:
+                return j
+    return -1
+
+
+def _split_args(toks):
+    args, cur, depth = [], [], 0
+    for t in toks:
+        if t[1] == "(":
+            depth += 1
+        elif t[1] == ")":
+            depth -= 1
+        if t[1] == "," and depth == 0:
+            args.append(cur)
+            cur = []
+        else:
+            cur.append(t)
+    args.append(cur)
+    return [_text(a).strip() for a in args]
+
+
+# ── pass 1: identifiers, literals, operators ─────────────────────────────────
+def _lexical(toks, applied):
+    in_list = []   # paren stack: True when the group is an IN (...) list
+    for i, (kind, text) in enumerate(toks):
+        if kind == "other" and text == "(":
+            p = _sig_before(toks, i)
+            in_list.append(p >= 0 and toks[p][1].upper() == "IN")
+        elif kind == "other" and text == ")":
+            if in_list:
+                in_list.pop()
+        elif kind == "bq":
+            toks[i] = ["dq", _dq_ident(text[1:-1].strip())]
+            applied.add("backtick")
+        elif kind == "br":
+            toks[i] = ["dq", _dq_ident(text[1:-1].strip())]
+            applied.add("bracket")
+        elif kind == "op" and text == "==":
+            toks[i] = ["op", "="]
+            applied.add("eq_eq")
+        elif kind == "word" and text.upper() == "REAL":
+            p = _sig_before(toks, i)
+            if p >= 0 and toks[p][1].upper() == "AS":
+                toks[i] = ["word", "DOUBLE PRECISION"]
+                applied.add("cast_real")
+        elif kind == "dq":
+            p = _sig_before(toks, i)
+            prev = toks[p][1].upper() if p >= 0 else ""
+            n = _sig_after(toks, i)
+            qualified = prev == "." or (n < len(toks) and toks[n][1] == ".")   # "t"."col"
+            if not qualified and (prev in LITERAL_CONTEXT or (in_list and in_list[-1] and prev in ("(", ","))):
+                body = text[1:-1].replace('""', '"').replace("'", "''")
+                toks[i] = ["str", f"'{body}'"]
+                applied.add("dq_string")
+            else:
+                lowered = _dq_ident(text[1:-1])
+                if lowered != text:
+                    toks[i] = ["dq", lowered]
+                    applied.add("dq_ident")
+    return toks
+
+
+# ── pass 2: functions, LIMIT, operand casts (per parenthesis level) ──────────
+def _strftime(args):
+    if len(args) != 2 or not args[0].startswith("'") or not args[0].endswith("'"):
+        return None
+    fmt = args[0][1:-1]
+    if any(s not in STRFTIME_MAP for s in STRFTIME_SPEC.findall(fmt)):
+        return None
+    if not STRFTIME_LITERAL_OK.match(STRFTIME_SPEC.sub("", fmt)):
+        return None   # letters in the literal part would be read as to_char patterns
+    pg_fmt = STRFTIME_SPEC.sub(lambda m: STRFTIME_MAP[m.group()], fmt)
+    value = "NOW()" if args[1].lower() == "'now'" else f"CAST({args[1]} AS TIMESTAMP)"
+    return f"TO_CHAR({value}, '{pg_fmt}')"
+
+
+def _as_text(arg):
+    return arg if arg.startswith("'") else f"CAST({arg} AS TEXT)"
+
+
+def _function(name, args):
+    """Return (replacement text, rule) or None to keep the call."""
+    n = len(args)
+    if name == "IFNULL" and n == 2:
+        return f"COALESCE({args[0]}, {args[1]})", "ifnull"
+    if name == "IIF" and n == 3:
+        return f"(CASE WHEN {args[0]} THEN {args[1]} ELSE {args[2]} END)", "iif"
+    if name in ("SUBSTR", "SUBSTRING") and n in (2, 3) and not args[0].startswith("'"):
+        return f"SUBSTR({', '.join([_as_text(args[0])] + args[1:])})", "substr_text"
+    if name == "LENGTH" and n == 1 and not args[0].startswith("'"):
+        return f"LENGTH({_as_text(args[0])})", "length_text"
+    if name == "INSTR" and n == 2:
+        return f"STRPOS({_as_text(args[0])}, {args[1]})", "instr"
+    if name == "STRFTIME":
+        out = _strftime(args)
+        return (out, "strftime") if out else None
+    if name in ("DATETIME", "DATE") and n == 1 and args[0].lower() == "'now'":
+        return ("NOW()" if name == "DATETIME" else "CURRENT_DATE"), "now"
+    if name == "GROUP_CONCAT" and n in (1, 2):
+        expr, distinct = args[0], ""
+        if expr.upper().startswith("DISTINCT "):
+            distinct, expr = "DISTINCT ", expr[9:].strip()
+        sep = args[1] if n == 2 else "','"
+        return f"STRING_AGG({distinct}{_as_text(expr)}, {sep})", "group_concat"
+    if name == "ROUND" and n == 2:
+        return f"ROUND(CAST({args[0]} AS NUMERIC), {args[1]})", "round_numeric"
+    return None
+
+
+FUNCTIONS = {"IFNULL", "IIF", "SUBSTR", "SUBSTRING", "LENGTH", "INSTR", "STRFTIME", "DATETIME",
+             "DATE", "GROUP_CONCAT", "ROUND"}
+
+
+def _unary_sign(toks, i):
+    """True when toks[i] is a + / - sign applied to what follows (not a binary operator)."""
+    if toks[i][1] not in ("-", "+"):
+        return False
+    p = _sig_before(toks, i)
+    if p < 0:
+        return True
+    kind, text = toks[p]
+    return kind == "op" or text in OPERATOR_CHARS or (kind == "word" and text.upper() in KEYWORDS)
+
+
+def _ref_span(toks, end, step):
+    """
+    Span (lo, hi) of a plain column reference or number ending (step=-1) or
+    starting (step=+1) at significant token `end`; None if it is anything else.
+    An ending span takes a unary sign in front of it along (-1 || x casts -1);
+    an operand of + - * / % is not a plain reference (those bind tighter).
+    """
+    def is_ident(t):
+        return t[0] == "dq" or (t[0] == "word" and t[1].upper() not in KEYWORDS)
+
+    if end < 0 or end >= len(toks):
+        return None
+    lo = hi = end
+    if toks[end][0] != "num":
+        if not is_ident(toks[end]):
+            return None
+        while True:   # qualified names: t.col
+            j = lo - 1 if step < 0 else hi + 1
+            k = j - 1 if step < 0 else j + 1
+            if 0 <= j < len(toks) and toks[j][1] == "." and 0 <= k < len(toks) and is_ident(toks[k]):
+                lo, hi = (k, hi) if step < 0 else (lo, k)
+            else:
+                break
+        if step > 0:   # a function call is not a plain reference
+            nxt = _sig_after(toks, hi)
+            if nxt < len(toks) and toks[nxt][1] == "(":
+                return None
+    if step < 0:
+        p = _sig_before(toks, lo)
+        if p >= 0 and _unary_sign(toks, p):
+            lo = p
+        elif p >= 0 and toks[p][1] in ARITHMETIC:
+            return None   # a - b || x is (a - b) || x: casting b alone breaks the arithmetic
+    else:
+        n = _sig_after(toks, hi)
+        if n < len(toks) and toks[n][1] in ARITHMETIC:
+            return None
+    return lo, hi
+
+
+def _structural(toks, applied):
+    out, i = [], 0
+    while i < len(toks):
+        kind, text = toks[i]
+        if kind == "word" and text.upper() in FUNCTIONS:
+            j = _sig_after(toks, i)
+            if j < len(toks) and toks[j][1] == "(":
+                close = _close_paren(toks, j)
+                if close > 0:
+                    inner = _structural(toks[j + 1:close], applied)
+                    rewritten = _function(text.upper(), _split_args(inner))
+                    if rewritten:
+                        out.append(["sql", rewritten[0]])
+                        applied.add(rewritten[1])
+                    else:
+                        out += [[kind, text], ["other", "("]] + inner + [["other", ")"]]
+                    i = close + 1
+                    continue
+        if text == "(":
+            close = _close_paren(toks, i)
+            if close > 0:
+                out += [["other", "("]] + _structural(toks[i + 1:close], applied) + [["other", ")"]]
+                i = close + 1
+                continue
+        out.append([kind, text])
+        i += 1
+    return _operands(_limit(out, applied), applied)
+
+
+def _limit(toks, applied):
+    for i, (kind, text) in enumerate(toks):
+        if kind == "word" and text.upper() == "LIMIT":
+            a = _sig_after(toks, i)
+            c = _sig_after(toks, a)
+            b = _sig_after(toks, c)
+            if b < len(toks) and toks[a][0] == "num" and toks[c][1] == "," and toks[b][0] == "num":
+                toks[a:b + 1] = [["sql", f"{toks[b][1]} OFFSET {toks[a][1]}"]]
+                applied.add("limit_offset")
+                break
+    return toks
+
+
+def _operands(toks, applied):
+    wrap = {}   # lo → (hi, rule)
+    for i, (kind, text) in enumerate(toks):
+        if kind == "word" and text.upper() == "LIKE":
+            p = _sig_before(toks, i)
+            if p >= 0 and toks[p][1].upper() == "NOT":
+                p = _sig_before(toks, p)
+            span = _ref_span(toks, p, -1)
+            if span and toks[span[1]][0] != "num":
+                wrap[span[0]] = (span[1], "like_text")
+        elif kind == "op" and text == "||":
+            for span in (_ref_span(toks, _sig_before(toks, i), -1), _ref_span(toks, _sig_after(toks, i), +1)):
+                if span:
+                    wrap[span[0]] = (span[1], "concat_text")
+    if not wrap:
+        return toks
+    out, i = [], 0
+    while i < len(toks):
+        if i in wrap:
+            hi, rule = wrap[i]
+            out.append(["sql", f"CAST({_text(toks[i:hi + 1])} AS TEXT)"])
+            applied.add(rule)
+            i = hi + 1
+        else:
+            out.append(toks[i])
+            i += 1
+    return out
+
+
+@lru_cache(maxsize=TRANSLATE_CACHE_SIZE)
+def translate(sql_text):
+    """Return (Postgres SQL, sorted tuple of the rewrite rules applied)."""
+    if not sql_text:
+        return sql_text, ()
+    applied = set()
+    toks = _structural(_lexical(tokenize(sql_text), applied), applied)
+    return _text(toks), tuple(sorted(applied))
+
+
+def translate_many(sql_texts):
+    """Batch form of translate(); repeated statements hit the memo."""
+    return [translate(s) for s in sql_texts]
+
+
+# (SQLite, expected Postgres) pairs; `python sql_translate.py` runs them
+REWRITE_CHECKS = [
+    ("SELECT IIF(`Free Meal` > 0, 1, 0) FROM frpm LIMIT 5, 10",
+     'SELECT (CASE WHEN "free meal" > 0 THEN 1 ELSE 0 END) FROM frpm LIMIT 10 OFFSET 5'),
+    ('SELECT name FROM t WHERE city = "Paris"', "SELECT name FROM t WHERE city = 'Paris'"),
+    ('SELECT * FROM a T1 JOIN b T2 ON T1.id = "T2"."id"', 'SELECT * FROM a T1 JOIN b T2 ON T1.id = "t2"."id"'),
+    ('SELECT * FROM a T1 WHERE T1.b = "T1".c', 'SELECT * FROM a T1 WHERE T1.b = "t1".c'),
+    ("SELECT zip || '-' || city FROM t", "SELECT CAST(zip AS TEXT) || '-' || CAST(city AS TEXT) FROM t"),
+    ("SELECT -1 || name FROM t", "SELECT CAST(-1 AS TEXT) || CAST(name AS TEXT) FROM t"),
+    ("SELECT a - 1 || name FROM t", "SELECT a - 1 || CAST(name AS TEXT) FROM t"),
+    ("SELECT name || b * 2 FROM t", "SELECT CAST(name AS TEXT) || b * 2 FROM t"),
+    ("SELECT * FROM t WHERE -code LIKE '1%'", "SELECT * FROM t WHERE CAST(-code AS TEXT) LIKE '1%'"),
+]
+
+
+def check():
+    """Failed REWRITE_CHECKS as [(sql, expected, got)]."""
+    return [(src, want, got) for src, want in REWRITE_CHECKS for got in [translate(src)[0]] if got != want]
+
+
+if __name__ == "__main__":
+    failed = check()
+    for src, want, got in failed:
+        print(f"❌ {src}\n   want {want}\n   got  {got}")
+    print(f"{'❌' if failed else '✅'} {len(REWRITE_CHECKS) - len(failed)}/{len(REWRITE_CHECKS)} rewrite checks")
+    raise SystemExit(1 if failed else 0)
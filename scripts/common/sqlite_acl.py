@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Postgres-free labelling on the original SQLite files.
+
+The per-role grants in user_permissions*.csv are enforced with
+sqlite3.Connection.set_authorizer while a query is compiled (EXPLAIN <sql>,
+nothing is executed). The decision mirrors the Postgres GRANT semantics the
+labellers observe through SET ROLE:
+
+  • every column a query reads must be granted to the role
+    (a table-level grant is listed with all its columns in the CSV)
+  • COUNT(*)-style reads that touch no column need a grant on at least one
+    column of the table, as in Postgres
+  • anything that is not a read (writes, PRAGMA, ATTACH ...) is denied
+
+A denied read returns SQLSTATE 42501 ("permission denied for table t"), like
+Postgres. Compile errors are mapped to the nearest Postgres SQLSTATE so that
+parity reports can group disagreements by code.
+
+Known differences from the Postgres labels: the SQL is checked in the SQLite
+dialect (no normalisation needed, so some queries Postgres rejects are
+permitted here), and nothing runs, so runtime errors and statement timeouts
+never produce a DENY.
+"""
+
+import os, csv, sqlite3
+
+from common.sqlite_reader import read_only_uri
+
+PRIVILEGE_SQLSTATE = "42501"
+
+# sqlite error text → nearest Postgres SQLSTATE
+SQLITE_ERROR_CODES = (
+    ("no such table", "42P01"),
+    ("no such column", "42703"),
+    ("ambiguous column", "42702"),
+    ("no such function", "42883"),
+    ("syntax error", "42601"),
+    ("incomplete input", "42601"),
+    ("misuse of aggregate", "42803"),
+)
+
+ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_FUNCTION,
+    getattr(sqlite3, "SQLITE_RECURSIVE", 33),
+}
+
+
+def load_role_grants(perms_csv):
+    """
+    Return {role: {table: frozenset(columns)}} from a user_permissions*.csv
+    file. Role, table and column names are lower-cased, as in the migrated
+    Postgres schema.
+    """
+    grants = {}
+    with open(perms_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            role = row["user"].strip().lower()
+            tbl = row["object"].strip().lower()
+            cols = {c.strip().lower() for c in (row["accessible_columns"] or "").split(",") if c.strip()}
+            per_role = grants.setdefault(role, {})
+            per_role[tbl] = frozenset(per_role.get(tbl, frozenset()) | cols)
+    return grants
+
+
+def read_pairs(path, dataset):
+    """
+    Read a BIRD questions_sqls.csv or Spider spider_nl_sql_pairs.csv.
+    Return [(key, db_id, sql, row)]; key matches the Postgres labeller's output:
+    (split, qid, db_id lower-cased) for BIRD, (row number,) for Spider.
+    """
+    pairs = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if dataset == "bird":
+                db_id = (row.get("db_id") or "").strip()
+                sql_text = (row.get("gold_sql") or "").strip()
+                key = ((row.get("split") or "").strip(), (row.get("qid") or "").strip(), db_id.lower())
+            else:
+                db_id = row["db_id"]
+                sql_text = row["sql"]
+                key = (str(i),)
+            if db_id and sql_text:
+                pairs.append((key, db_id, sql_text, row))
+    return pairs
+
+
+def find_sqlite_files(root):
+    """
+    Return {db_id (lower-cased): path} for every SQLite file under `root`.
+    Handles both <db>/<db>.sqlite (BIRD, Spider) and <db>/database.sqlite.
+    """
+    found = {}
+    for r, _, files in os.walk(root):
+        for f in sorted(files):
+            if not f.lower().endswith((".db", ".sqlite", ".sqlite3")):
+                continue
+            stem = os.path.splitext(f)[0]
+            db_id = os.path.basename(r) if stem.lower() == "database" else stem
+            found.setdefault(db_id.lower(), os.path.join(r, f))
+    return found
+
+
+def sqlstate_for(exc):
+    text = str(exc).lower()
+    for needle, code in SQLITE_ERROR_CODES:
+        if needle in text:
+            return code
+    return "SQLITE"
+
+
+class RoleAuthorizer:
+    """set_authorizer callback checking column reads against one role's grants."""
+
+    def __init__(self):
+        self.grants = {}
+        self.denied = None   # first table refused during the current compile
+
+    def reset(self, grants):
+        self.grants = grants
+        self.denied = None
+
+    def __call__(self, action, arg1, arg2, dbname, source):
+        if action == sqlite3.SQLITE_READ:
+            tbl = (arg1 or "").lower()
+            cols = self.grants.get(tbl)
+            # arg2 == "" → a read of the table with no column (COUNT(*))
+            if cols and (arg2 == "" or (arg2 or "").lower() in cols):
+                return sqlite3.SQLITE_OK
+            if self.denied is None:
+                self.denied = tbl
+            return sqlite3.SQLITE_DENY
+        if action in ALLOWED_ACTIONS:
+            return sqlite3.SQLITE_OK
+        if self.denied is None:
+            self.denied = ""
+        return sqlite3.SQLITE_DENY
+
+
+class SQLiteLabeller:
+    """One read-only connection to a source DB, checked under any role's grants."""
+
+    def __init__(self, sqlite_path, role_grants, shared=False):
+        """shared=True: usable from several threads (the caller serialises label() calls)."""
+        self.role_grants = role_grants
+        # no statement cache: a cached statement is not re-authorized for the next role
+        self.conn = sqlite3.connect(read_only_uri(sqlite_path), uri=True, cached_statements=0,
+                                    check_same_thread=not shared)
+        self.auth = RoleAuthorizer()
+        self.conn.set_authorizer(self.auth)
+
+    def label(self, role, sql_text):
+        """Return (permitted, sqlstate, message) for running `sql_text` as `role`."""
+        self.auth.reset(self.role_grants.get(role.lower(), {}))
+        try:
+            self.conn.execute("EXPLAIN " + (sql_text or "").strip().rstrip(";")).fetchall()
+            return True, "", ""
+        except sqlite3.Error as e:
+            if self.auth.denied is not None:
+                if self.auth.denied:
+                    return False, PRIVILEGE_SQLSTATE, f"permission denied for table {self.auth.denied}"
+                return False, PRIVILEGE_SQLSTATE, "permission denied"
+            return False, sqlstate_for(e), str(e).replace("\n", " ")[:400]
+
+    def close(self):
+        self.conn.close()
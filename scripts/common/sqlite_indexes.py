@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rebuild the source databases' keys and indexes in Postgres after a bulk load.
+
+The loaders create bare tables. This module reads the SQLite metadata
+
+    PRAGMA index_list / index_info    declared indexes, UNIQUE and PRIMARY KEY
+    PRAGMA table_info                 INTEGER PRIMARY KEY (rowid alias, no index)
+    PRAGMA foreign_key_list           foreign keys
+
+and recreates it on the loaded tables (lower-cased names, as the loaders
+create them):
+
+  - every primary key / UNIQUE index becomes a unique index; if the loaded
+    data has duplicates it falls back to a plain index
+  - every other index is recreated as is (partial and expression indexes are
+    skipped)
+  - every foreign key gets an index on its referencing columns, unless an
+    index already starts with them; with foreign_keys=True the constraint
+    itself is added as NOT VALID (existing rows are not checked)
+
+Tables are processed in parallel (one autocommit session per worker and
+Postgres database), each followed by ANALYZE. Foreign-key constraints lock
+both tables, so they run afterwards, serially. Statements that fail (e.g. a
+foreign key naming a table that does not exist) are counted and skipped.
+"""
+
+import re, sqlite3, hashlib, threading, time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from common.layout import SessionCache, qualify, target
+from common.sqlite_reader import read_only_uri
+
+Plan = namedtuple("Plan", "tables indexes foreign_keys")
+IndexDef = namedtuple("IndexDef", "table columns unique origin")
+ForeignKey = namedtuple("ForeignKey", "table columns ref_table ref_columns")
+
+PG_NAME_MAX = 63
+
+
+def q_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def pg_name(*parts):
+    """Deterministic identifier, hashed down to Postgres' 63-byte limit."""
+    name = re.sub(r"\W+", "_", "_".join(parts).lower()).strip("_")
+    if len(name.encode("utf-8")) <= PG_NAME_MAX:
+        return name
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=4).hexdigest()
+    return name.encode("utf-8")[:PG_NAME_MAX - 9].decode("utf-8", "ignore") + "_" + digest
+
+
+def _text(v):
+    return v.decode("utf-8", "replace") if isinstance(v, bytes) else v
+
+
+def read_plan(sqlite_path):
+    """Return the Plan (tables, [IndexDef], [ForeignKey]) of one SQLite file, names lower-cased."""
+    conn = sqlite3.connect(read_only_uri(sqlite_path), uri=True)
+    conn.text_factory = bytes
+    indexes, fks, pks = {}, [], {}
+    try:
+        tables = [_text(r[0]) for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'")]
+        for table in tables:
+            t = table.lower()
+            info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+            names = {r[0]: _text(r[1]).lower() for r in info}
+            pk = tuple(names[r[0]] for r in sorted((r for r in info if r[5]), key=lambda r: r[5]))
+            pks[t] = pk
+            has_pk_index = False
+            for _, iname, unique, origin, partial in conn.execute(f'PRAGMA index_list("{table}")'):
+                origin = _text(origin)
+                if partial:
+                    continue
+                cols = conn.execute(f'PRAGMA index_info("{_text(iname)}")').fetchall()
+                if not cols or any(r[1] is None or r[1] < 0 for r in cols):
+                    continue   # expression / rowid index
+                key = (t, tuple(names[r[1]] for r in sorted(cols)))
+                has_pk_index |= origin == "pk"
+                prev = indexes.get(key)
+                if prev is None or (unique and not prev.unique):
+                    indexes[key] = IndexDef(t, key[1], bool(unique), origin)
+            if pk and not has_pk_index:
+                indexes[(t, pk)] = IndexDef(t, pk, True, "pk")
+
+            by_id = {}
+            for row in conn.execute(f'PRAGMA foreign_key_list("{table}")'):
+                fid, seq, ref, col_from, col_to = row[0], row[1], _text(row[2]), _text(row[3]), _text(row[4])
+                by_id.setdefault(fid, []).append((seq, ref.lower(), col_from.lower(), (col_to or "").lower()))
+            for parts in by_id.values():
+                parts.sort()
+                fks.append(ForeignKey(t, tuple(p[2] for p in parts), parts[0][1], tuple(p[3] for p in parts)))
+    finally:
+        conn.close()
+
+    resolved = []
+    for fk in fks:
+        ref_cols = fk.ref_columns
+        if not all(ref_cols):   # REFERENCES parent (no columns) → the parent's primary key
+            ref_cols = pks.get(fk.ref_table, ())
+        if len(ref_cols) == len(fk.columns):
+            resolved.append(fk._replace(ref_columns=tuple(ref_cols)))
+
+    # join columns of every foreign key get an index unless one already leads with them
+    for fk in resolved:
+        if not any(d.table == fk.table and d.columns[:len(fk.columns)] == fk.columns for d in indexes.values()):
+            indexes[(fk.table, fk.columns)] = IndexDef(fk.table, fk.columns, False, "fk")
+    return Plan([t.lower() for t in tables], list(indexes.values()), resolved)
+
+
+class IndexRebuild:
+    """
+    connect(pg_db) → psycopg2 connection. Counters land in `metrics`
+    (common.metrics.Metrics) when given.
+    """
+
+    def __init__(self, connect, workers=4, foreign_keys=False, analyze=True, metrics=None):
+        self.connect = connect
+        self.workers = max(1, workers)
+        self.foreign_keys = foreign_keys
+        self.analyze = analyze
+        self.metrics = metrics
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def _count(self, what, n=1, **labels):
+        with self.lock:
+            self.counts[what] = self.counts.get(what, 0) + n
+        if self.metrics is not None:
+            self.metrics.inc(what, n, **labels)
+
+    def _observe(self, what, seconds, **labels):
+        if self.metrics is not None:
+            self.metrics.observe(what, seconds, **labels)
+
+    def _cursor(self, pg_db):
+        cache = getattr(self.local, "sessions", None)
+        if cache is None:
+            cache = self.local.sessions = SessionCache(self.connect)
+            with self.lock:
+                self.sessions.append(cache)
+        return cache.get(pg_db).cursor()
+
+    def _run(self, cur, stmt):
+        """Execute one statement; returns the SQLSTATE on failure, "" on success."""
+        try:
+            cur.execute(stmt)
+            return ""
+        except Exception as e:
+            return getattr(e, "pgcode", None) or "error"
+
+    def _table(self, db, table, defs):
+        pg_db, schema = target(db)
+        ref = qualify(schema, table)
+        with self._cursor(pg_db) as cur:
+            for d in defs:
+                cols = ", ".join(q_ident(c) for c in d.columns)
+                t0 = time.perf_counter()
+                state = ""
+                if d.unique:
+                    name = pg_name(table, *d.columns, "key")
+                    state = self._run(cur, f"CREATE UNIQUE INDEX IF NOT EXISTS {q_ident(name)} ON {ref} ({cols})")
+                    if state == "23505":   # duplicates in the loaded data → plain index
+                        self._count("unique_fallbacks", db=db)
+                if not d.unique or state == "23505":
+                    name = pg_name(table, *d.columns, "idx")
+                    state = self._run(cur, f"CREATE INDEX IF NOT EXISTS {q_ident(name)} ON {ref} ({cols})")
+                if state:
+                    self._count("index_failures", db=db, sqlstate=state)
+                else:
+                    self._count("indexes_built", db=db, origin=d.origin)
+                self._observe("index_build", time.perf_counter() - t0, db=db)
+            if self.analyze:
+                t0 = time.perf_counter()
+                if self._run(cur, f"ANALYZE {ref}"):
+                    self._count("analyze_failures", db=db)
+                self._observe("analyze", time.perf_counter() - t0, db=db)
+
+    def _foreign_key(self, db, fk):
+        pg_db, schema = target(db)
+        name = pg_name(fk.table, *fk.columns, "fkey")
+        stmt = (f"ALTER TABLE {qualify(schema, fk.table)} ADD CONSTRAINT {q_ident(name)} "
+                f"FOREIGN KEY ({', '.join(q_ident(c) for c in fk.columns)}) "
+                f"REFERENCES {qualify(schema, fk.ref_table)} ({', '.join(q_ident(c) for c in fk.ref_columns)}) "
+                f"NOT VALID")
+        with self._cursor(pg_db) as cur:
+            state = self._run(cur, stmt)
+        if state in ("", "42710"):   # 42710: already there from an earlier run
+            self._count("foreign_keys_added", db=db)
+        else:
+            self._count("foreign_key_failures", db=db, sqlstate=state)
+
+    def run(self, sqlite_files):
+        """sqlite_files: {db_id: path}. Returns a {counter: n} summary."""
+        t0 = time.perf_counter()
+        plans = {db: read_plan(path) for db, path in sorted(sqlite_files.items())}
+        self._observe("plan", time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        tasks = {}
+        for db, plan in plans.items():
+            for t in plan.tables:
+                tasks[(db, t)] = []
+            for d in plan.indexes:
+                tasks.setdefault((db, d.table), []).append(d)
+        # biggest tables first, so the slowest ones don't start last
+        order = sorted(tasks, key=lambda k: -len(tasks[k]))
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as ex:
+                futs = {ex.submit(self._table, db, table, tasks[(db, table)]): (db, table)
+                        for db, table in order}
+                for f in as_completed(futs):
+                    try:
+                        f.result()
+                    except Exception as e:
+                        self._count("table_failures", db=futs[f][0])
+                        print(f"❌ {futs[f][0]}.{futs[f][1]}: {e}")
+            self._observe("indexes", time.perf_counter() - t0)
+
+            if self.foreign_keys:
+                t0 = time.perf_counter()
+                for db, plan in plans.items():
+                    for fk in plan.foreign_keys:
+                        self._foreign_key(db, fk)
+                self._observe("foreign_keys", time.perf_counter() - t0)
+        finally:
+            for cache in self.sessions:
+                cache.close()
+        self.counts["tables"] = len(tasks)
+        return dict(self.counts)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batched, column-oriented reads from the SQLite source files.
+
+    conn = open_source(path)
+    for batch in iter_batches(conn, "frpm"):
+        for name, values in zip(names, batch.columns):
+            ...                      # clean / convert one column at a time
+        rows = batch.rows()          # back to row tuples for the insert
+
+Sources are opened read-only and immutable (no locking, no change checks;
+the corpora are never written while loading) with memory-mapped I/O
+($SQLITE_MMAP_SIZE, default 1 GiB). Rows are pulled with fetchmany() in
+chunks of $READ_BATCH_ROWS (default 20000) and transposed into per-column
+lists. A cleaning step can then pick its conversion once per column instead
+of once per value, and only a chunk is in memory at a time (no fetchall()).
+
+Text comes back as bytes (text_factory=bytes), as the loaders expect;
+Batch.nbytes counts those bytes.
+"""
+
+import os, sqlite3
+from urllib.parse import quote
+
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 1 << 30))
+READ_BATCH_ROWS = int(os.getenv("READ_BATCH_ROWS", 20000))
+
+
+def read_only_uri(path, immutable=False):
+    """file: URI opening `path` read-only; the path is quoted, so '?', '#' and '%' are safe."""
+    return f"file:{quote(os.path.abspath(path))}?mode=ro" + ("&immutable=1" if immutable else "")
+
+
+def open_source(path, mmap_size=SQLITE_MMAP_SIZE):
+    conn = sqlite3.connect(read_only_uri(path, immutable=True), uri=True)
+    conn.text_factory = bytes
+    conn.execute(f"PRAGMA mmap_size={int(mmap_size)};")
+    return conn
+
+
+class Batch:
+    """Up to READ_BATCH_ROWS rows of one table, as one list per column."""
+
+    __slots__ = ("columns", "n")
+
+    def __init__(self, columns, n):
+        self.columns = columns
+        self.n = n
+
+    @classmethod
+    def from_rows(cls, rows, ncols):
+        if not rows:
+            return cls([[] for _ in range(ncols)], 0)
+        return cls([list(c) for c in zip(*rows)], len(rows))
+
+    @property
+    def nbytes(self):
+        return sum(len(v) for col in self.columns for v in col if isinstance(v, bytes))
+
+    def drop_first(self):
+        self.columns = [c[1:] for c in self.columns]
+        self.n = max(0, self.n - 1)
+
+    def rows(self):
+        return zip(*self.columns)
+
+
+def iter_batches(conn, table, batch_rows=READ_BATCH_ROWS, limit=None):
+    """Yield Batch objects for SELECT * FROM table (optionally LIMIT n)."""
+    cur = conn.cursor()
+    cur.arraysize = max(1, batch_rows)
+    cur.execute(f'SELECT * FROM "{table}"' + (f" LIMIT {int(limit)}" if limit else ""))
+    ncols = len(cur.description or ())
+    try:
+        while True:
+            rows = cur.fetchmany()
+            if not rows:
+                return
+            yield Batch.from_rows(rows, ncols)
+    finally:
+        cur.close()
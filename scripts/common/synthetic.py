@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic SQLite corpora.
+
+Two levels:
+  • make_fixture_corpus(): tiny fixed-shape databases for the benchmarks
+    (integer ids, text, real, a loosely-typed DATE column, a few SELECTs).
+  • generate_corpus(): N databases shaped by a CorpusSpec (table counts,
+    column widths/types, row counts, dirty values) plus question/SQL files in
+    the BIRD or Spider input layout, for scale testing the whole pipeline.
+"""
+
+import os, json, random, sqlite3
+
+
+def make_fixture_db(path, n_tables=4, n_rows=1000, seed=0):
+    rnd = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    tables = []
+    for t in range(n_tables):
+        name = f"t{t}"
+        conn.execute(
+            f'CREATE TABLE "{name}" (id INTEGER, name TEXT, score REAL, created DATE, note VARCHAR(40))'
+        )
+        rows = []
+        for i in range(n_rows):
+            created = rnd.choice(["2020-01-15", "0000-00-00", 20190302, "NULL", "1999"])
+            rows.append((i, f"name_{rnd.randint(0, 999)}", rnd.random() * 100, created, f"n{i % 17}"))
+        conn.executemany(f'INSERT INTO "{name}" VALUES (?, ?, ?, ?, ?)', rows)
+        tables.append(name)
+    conn.commit()
+    conn.close()
+    return tables
+
+
+def fixture_queries(tables):
+    qs = []
+    for t in tables:
+        qs.append(f'SELECT id, name FROM "{t}" WHERE id < 10')
+        qs.append(f'SELECT COUNT(*) FROM "{t}"')
+        qs.append(f'SELECT note, AVG(score) FROM "{t}" GROUP BY note')
+    if len(tables) > 1:
+        qs.append(f'SELECT a.name, b.note FROM "{tables[0]}" a JOIN "{tables[1]}" b ON a.id = b.id')
+    return qs
+
+
+def make_fixture_corpus(root, prefix, n_dbs=2, n_tables=4, n_rows=1000, seed=0):
+    """
+    Create root/<prefix>_<i>/<prefix>_<i>.sqlite (the folder layout both loaders
+    accept). Returns [(db_id, sqlite_path, [table names])].
+    """
+    out = []
+    for i in range(n_dbs):
+        db_id = f"{prefix}_{i}"
+        d = os.path.join(root, db_id)
+        os.makedirs(d, exist_ok=True)
+        path = os.path.join(d, f"{db_id}.sqlite")
+        tables = make_fixture_db(path, n_tables=n_tables, n_rows=n_rows, seed=seed + i)
+        out.append((db_id, path, tables))
+    return out
+
+
+# ── Scale corpora (BIRD / Spider input layouts) ──────────────────────────────
+# Declared SQLite types and their relative frequency in generated columns.
+# "" is a column with no declared type (common in BIRD).
+DEFAULT_TYPE_WEIGHTS = {
+    "INTEGER": 5, "TEXT": 5, "REAL": 2, "DATE": 2, "DATETIME": 1,
+    "VARCHAR(40)": 1, "NUMERIC": 1, "BLOB": 0.2, "": 1,
+}
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+         "india", "juliet", "kilo", "lima", "mike", "oscar", "papa", "romeo"]
+NAME_STEMS = ["name", "status", "zip", "category", "amount", "code", "city", "type",
+              "count", "event", "phone", "rate", "score", "title", "level", "region"]
+
+
+class CorpusSpec:
+    """
+    Shape of a generated corpus. Ranges are inclusive (lo, hi) tuples.
+
+    awkward_rate: share of DATE/DATETIME/TEXT values replaced by the dirty values
+                  the loaders special-case ('0000-00-00', 20190302, 'NULL', '', '1999').
+    header_rate:  share of tables whose first row repeats the column names.
+    spaced_rate:  share of column names with spaces/mixed case (BIRD-style, needs backticks).
+    """
+
+    def __init__(self, n_dbs=10, tables=(3, 8), cols=(3, 12), rows=(100, 2000),
+                 text_width=(4, 24), questions_per_db=20, awkward_rate=0.02,
+                 header_rate=0.1, spaced_rate=0.15, type_weights=None, seed=0):
+        self.n_dbs = n_dbs
+        self.tables = tables
+        self.cols = cols
+        self.rows = rows
+        self.text_width = text_width
+        self.questions_per_db = questions_per_db
+        self.awkward_rate = awkward_rate
+        self.header_rate = header_rate
+        self.spaced_rate = spaced_rate
+        self.type_weights = dict(type_weights or DEFAULT_TYPE_WEIGHTS)
+        self.seed = seed
+
+    def rng(self, db_id):
+        # independent stream per database → parallel generation is deterministic
+        return random.Random(f"{self.seed}:{db_id}")
+
+
+def _column_name(rnd, taken, spaced_rate):
+    while True:
+        stem = rnd.choice(NAME_STEMS)
+        if rnd.random() < spaced_rate:
+            name = f"{stem.title()} {rnd.choice(WORDS).title()}"
+        else:
+            name = f"{stem}_{rnd.randint(0, 99)}"
+        if name.lower() not in taken:
+            taken.add(name.lower())
+            return name
+
+
+def _value(rnd, decl, spec):
+    awkward = rnd.random() < spec.awkward_rate
+    if decl in ("DATE", "DATETIME"):
+        if awkward:
+            return rnd.choice(["0000-00-00", "0000/00/00", 20190302, "NULL", "", "1999"])
+        y, m, d = rnd.randint(1990, 2024), rnd.randint(1, 12), rnd.randint(1, 28)
+        if decl == "DATE":
+            return f"{y:04d}-{m:02d}-{d:02d}"
+        return f"{y:04d}-{m:02d}-{d:02d} {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:00"
+    if decl == "INTEGER":
+        return rnd.randint(-1000, 10**6)
+    if decl in ("REAL", "NUMERIC"):
+        return round(rnd.uniform(-1000, 1000), rnd.choice([0, 2, 4]))
+    if decl == "BLOB":
+        return bytes(rnd.getrandbits(8) for _ in range(rnd.randint(1, 16)))
+    if awkward:
+        return rnd.choice(["NULL", "null", "", "0000-00-00"])
+    if decl == "":
+        return rnd.choice([rnd.randint(0, 100), rnd.choice(WORDS), rnd.random()])
+    width = rnd.randint(*spec.text_width)
+    return " ".join(rnd.choice(WORDS) for _ in range(max(1, width // 6)))[:width]
+
+
+def generate_sqlite_db(path, db_id, spec):
+    """
+    Write one SQLite file following `spec`. Returns the schema as
+    {table: [(column, declared_type), ...]}; each table's first column is an
+    INTEGER key named "<table>_id" so joins have something to bite on.
+    """
+    rnd = spec.rng(db_id)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    types = list(spec.type_weights)
+    weights = [spec.type_weights[t] for t in types]
+
+    schema = {}
+    n_tables = rnd.randint(*spec.tables)
+    for t in range(n_tables):
+        table = f"{rnd.choice(WORDS)}_{t}"
+        taken = {f"{table}_id"}
+        cols = [(f"{table}_id", "INTEGER")]
+        if t > 0:  # foreign-key-ish reference to the previous table
+            prev = list(schema)[-1]
+            cols.append((f"{prev}_id", "INTEGER"))
+            taken.add(f"{prev}_id")
+        width = rnd.randint(*spec.cols)
+        while len(cols) < width:
+            cols.append((_column_name(rnd, taken, spec.spaced_rate), rnd.choices(types, weights)[0]))
+        schema[table] = cols
+
+        col_sql = ", ".join(f'"{c}" {d}'.rstrip() for c, d in cols)
+        conn.execute(f'CREATE TABLE "{table}" ({col_sql})')
+
+        n_rows = rnd.randint(*spec.rows)
+
+        def rows():
+            if rnd.random() < spec.header_rate:
+                yield tuple(c for c, _ in cols)   # header-like first row
+            for i in range(n_rows):
+                row = [i, rnd.randint(0, n_rows)] if t > 0 else [i]
+                row += [_value(rnd, d, spec) for _, d in cols[len(row):]]
+                yield tuple(row)
+
+        ph = ", ".join("?" * len(cols))
+        conn.executemany(f'INSERT INTO "{table}" VALUES ({ph})', rows())
+    conn.commit()
+    conn.close()
+    return schema
+
+
+def _ident(col, style):
+    if style == "bird" and (" " in col or col != col.lower()):
+        return f"`{col}`"
+    return f'"{col}"' if " " in col else col
+
+
+def generate_questions(db_id, schema, spec, style):
+    """
+    Return [(question, sql, evidence)] covering single-table projections,
+    aggregates, and joins along the <table>_id references.
+    """
+    rnd = random.Random(f"{spec.seed}:{db_id}:questions")
+    tables = list(schema)
+    out = []
+    for k in range(spec.questions_per_db):
+        t = rnd.choice(tables)
+        cols = [c for c, _ in schema[t]]
+        kind = k % 4
+        if kind == 0:
+            pick = rnd.sample(cols, min(len(cols), rnd.randint(1, 3)))
+            sql = f"SELECT {', '.join(_ident(c, style) for c in pick)} FROM {t} WHERE {_ident(cols[0], style)} < {rnd.randint(5, 500)}"
+            q = f"List the {', '.join(pick)} of {t} records with a small id."
+        elif kind == 1:
+            sql = f"SELECT COUNT(*) FROM {t}"
+            q = f"How many {t} records are there?"
+        elif kind == 2:
+            c = rnd.choice(cols)
+            sql = f"SELECT {_ident(c, style)}, COUNT(*) FROM {t} GROUP BY {_ident(c, style)} ORDER BY COUNT(*) DESC LIMIT 5"
+            q = f"What are the most common values of {c} in {t}?"
+        elif len(tables) < 2:
+            sql = f"SELECT MAX({_ident(cols[0], style)}) FROM {t}"
+            q = f"What is the largest id in {t}?"
+        else:
+            idx = max(1, tables.index(t))
+            t, prev = tables[idx], tables[idx - 1]
+            c1, c2 = schema[t][-1][0], schema[prev][-1][0]
+            sql = (f"SELECT T1.{_ident(c1, style)}, T2.{_ident(c2, style)} FROM {t} AS T1 "
+                   f"INNER JOIN {prev} AS T2 ON T1.{prev}_id = T2.{prev}_id LIMIT 10")
+            q = f"Show {c1} of {t} with the {c2} of its {prev}."
+        evidence = f"{t} refers to the {t} table" if style == "bird" and rnd.random() < 0.5 else ""
+        out.append((q, sql, evidence))
+    return out
+
+
+def _generate_one(args):
+    db_dir, db_id, spec, style = args
+    os.makedirs(os.path.join(db_dir, db_id), exist_ok=True)
+    schema = generate_sqlite_db(os.path.join(db_dir, db_id, f"{db_id}.sqlite"), db_id, spec)
+    return db_id, generate_questions(db_id, schema, spec, style)
+
+
+def generate_corpus(root, spec, style, workers=1, dev_fraction=0.2):
+    """
+    style="bird":   root/databases/<db>/<db>.sqlite, train.json, train_gold.sql,
+                    dev.json, dev.sql, dev_tied_append.json
+    style="spider": root/database/<db>/<db>.sqlite, train_spider.json, dev.json
+    Returns (n_databases, n_questions).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    db_dir = os.path.join(root, "databases" if style == "bird" else "database")
+    os.makedirs(db_dir, exist_ok=True)
+    jobs = [(db_dir, f"{style}_syn_{i:05d}", spec, style) for i in range(spec.n_dbs)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_generate_one, jobs, chunksize=4))
+    else:
+        results = [_generate_one(j) for j in jobs]
+
+    n_dev = int(len(results) * dev_fraction)
+    splits = {"dev": results[:n_dev], "train": results[n_dev:]}
+    n_q = 0
+    for split, dbs in splits.items():
+        items, qid = [], 0
+        for db_id, qs in dbs:
+            for question, sql, evidence in qs:
+                if style == "bird":
+                    items.append({"question_id": qid, "db_id": db_id, "question": question,
+                                  "evidence": evidence, "SQL": sql})
+                else:
+                    items.append({"db_id": db_id, "question": question, "query": sql})
+                qid += 1
+        n_q += len(items)
+        if style == "bird":
+            with open(os.path.join(root, f"{split}.json"), "w", encoding="utf-8") as f:
+                json.dump(items, f)
+            gold = "train_gold.sql" if split == "train" else "dev.sql"
+            with open(os.path.join(root, gold), "w", encoding="utf-8") as f:
+                for it in items:
+                    f.write(f"-- db: {it['db_id']} qid: {it['question_id']}\n{it['SQL']};\n")
+            if split == "dev":
+                tied = [{"question": it["question"], "db_id": it["db_id"], "evidence": it["evidence"]}
+                        for it in items]
+                with open(os.path.join(root, "dev_tied_append.json"), "w", encoding="utf-8") as f:
+                    json.dump(tied, f)
+        else:
+            name = "train_spider.json" if split == "train" else "dev.json"
+            with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+                json.dump(items, f)
+    return len(results), n_q
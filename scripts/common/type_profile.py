@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Column type inference for the SQLite → Postgres loaders.
+
+The declared SQLite type says little about the data (TEXT columns full of
+integers, untyped date columns, INTEGER everywhere). The profiler reads each
+column's values through the loader's own cleaning function and picks the
+narrowest type every value fits:
+
+    integers          SMALLINT / INTEGER / BIGINT by range (NUMERIC beyond)
+    reals             DOUBLE PRECISION (NUMERIC when mixed with decimal strings
+                      or integers beyond 2^53)
+    decimal strings   NUMERIC
+    'true' / 'false'  BOOLEAN
+    YYYY-MM-DD        DATE (TIMESTAMP when some values carry a time)
+    anything else     TEXT; integer strings with a leading zero stay TEXT
+
+Columns with no values, BLOBs, and integer-coded dates in DATE/TIME columns
+keep the loader's declared-type mapping.
+
+TYPE_PROFILE=scan (default) reads every row, TYPE_PROFILE=sample only the
+first $TYPE_PROFILE_SAMPLE rows, TYPE_PROFILE=off restores the declared-type
+mapping. A value that does not fit its column during the load (possible after
+sampling) raises DoesNotFit; the loader widens that column with widen() and
+reloads the table.
+
+Retyping changes how Postgres parses a query (`date_col LIKE '2012%'`,
+`int_col = 'abc'`, `SUBSTR(int_col, 1, 2)`), so it can turn a query that reached
+the privilege check into a 22007/42883/22P02 error and flip its label. With
+TYPE_PROFILE_KEEP=read (default), columns that any gold SQL reads keep the
+declared-type mapping. The reads come from the dependency index in $QUERY_DEPS
+(tools/build_dependency_index.py, default query_deps.sqlite). A database the
+index does not resolve (missing index, database absent, or queries that do
+not compile in SQLite) keeps the mapping for every column. Only columns that
+no query reads are retyped, so the ground-truth labels are the same as with
+TYPE_PROFILE=off. TYPE_PROFILE_KEEP=none retypes every column; labels may
+change, and the label cache keys on the resulting column types.
+
+Results are cached per column in $TYPE_CACHE (default type_profile.sqlite),
+keyed on the SQLite file's size and mtime, so re-running a load does not
+re-scan unchanged databases. The cache doubles as the report:
+
+    sqlite3 type_profile.sqlite "SELECT db, tbl, col, declared, pg_type FROM column_types"
+"""
+
+import os, re, json, math, sqlite3, datetime
+from decimal import Decimal
+
+from common.sqlite_reader import open_source, iter_batches
+
+TYPE_PROFILE = os.getenv("TYPE_PROFILE", "scan")
+TYPE_PROFILE_SAMPLE = int(os.getenv("TYPE_PROFILE_SAMPLE", 10000))
+TYPE_CACHE = os.getenv("TYPE_CACHE", "type_profile.sqlite")
+TYPE_PROFILE_KEEP = os.getenv("TYPE_PROFILE_KEEP", "read")
+QUERY_DEPS = os.getenv("QUERY_DEPS", "query_deps.sqlite")
+
+INT_RE = re.compile(r"[+-]?\d+")
+DEC_RE = re.compile(r"[+-]?(?:\d+\.\d*|\.\d+|\d+(?=[eE]))(?:[eE][+-]?\d+)?")
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+TS_RE = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?")
+LEADING_ZERO = re.compile(r"[+-]?0\d")
+
+INT_TYPES = (("SMALLINT", 2 ** 15), ("INTEGER", 2 ** 31), ("BIGINT", 2 ** 63))
+FLOAT_EXACT = 2 ** 53
+
+
+_DEPS = {}
+
+
+def columns_read(db, deps_path=QUERY_DEPS):
+    """{(table, column)} the gold SQL of `db` reads, or None when the index cannot tell."""
+    if deps_path not in _DEPS:
+        from common.deps_index import DependencyIndex
+        try:
+            _DEPS[deps_path] = DependencyIndex.load(deps_path) if os.path.isfile(deps_path) else None
+        except (sqlite3.Error, ValueError) as e:
+            print(f"⚠️  {deps_path}: {e}")
+            _DEPS[deps_path] = None
+    idx = _DEPS[deps_path]
+    if idx is None:
+        return None
+    queries = idx.queries(db)
+    if not queries or any(idx.error(*q) for q in queries):
+        return None
+    return idx.referenced_columns(db)
+
+
+class DoesNotFit(ValueError):
+    """A value that the column's inferred type cannot hold."""
+
+    def __init__(self, index, value, pg_type):
+        super().__init__(f"{value!r} does not fit {pg_type}")
+        self.index, self.value, self.pg_type = index, value, pg_type
+
+
+def classify(val):
+    """(kind, parsed value) of one cleaned value; kind None for NULL."""
+    if val is None:
+        return None, None
+    if isinstance(val, bool):
+        return "bool", val
+    if isinstance(val, int):
+        return "int", val
+    if isinstance(val, float):
+        return "float", val
+    if isinstance(val, (bytes, bytearray, memoryview)):
+        return "blob", val
+    if isinstance(val, (datetime.datetime,)):
+        return "ts", val
+    if isinstance(val, datetime.date):
+        return "date", val
+    s = str(val).strip()
+    if not s:
+        return None, None
+    if INT_RE.fullmatch(s):
+        return ("text", s) if LEADING_ZERO.match(s) else ("int", int(s))
+    if DEC_RE.fullmatch(s):
+        return ("text", s) if LEADING_ZERO.match(s) else ("dec", Decimal(s))
+    low = s.lower()
+    if low in ("true", "false"):
+        return "bool", low == "true"
+    try:
+        if DATE_RE.fullmatch(s):
+            return "date", datetime.date.fromisoformat(s)
+        if TS_RE.fullmatch(s):
+            return "ts", datetime.datetime.fromisoformat(s)
+    except ValueError:
+        pass
+    return "text", s
+
+
+class ColumnProfile:
+    """Running statistics of one column; pg_type() turns them into a type."""
+
+    def __init__(self, stats=None):
+        stats = stats or {}
+        self.kinds = dict(stats.get("kinds") or {})
+        self.lo, self.hi = stats.get("min"), stats.get("max")
+
+    def observe(self, val):
+        kind, parsed = classify(val)
+        if kind is None:
+            return
+        self.kinds[kind] = self.kinds.get(kind, 0) + 1
+        if kind == "int":
+            self.lo = parsed if self.lo is None else min(self.lo, parsed)
+            self.hi = parsed if self.hi is None else max(self.hi, parsed)
+
+    def observe_many(self, values):
+        """observe() for a whole column batch; plain ints/floats skip classify()."""
+        ints = [v for v in values if type(v) is int]
+        floats = sum(1 for v in values if type(v) is float)
+        if ints:
+            self.kinds["int"] = self.kinds.get("int", 0) + len(ints)
+            lo, hi = min(ints), max(ints)
+            self.lo = lo if self.lo is None else min(self.lo, lo)
+            self.hi = hi if self.hi is None else max(self.hi, hi)
+        if floats:
+            self.kinds["float"] = self.kinds.get("float", 0) + floats
+        for v in values:
+            if v is not None and type(v) is not int and type(v) is not float:
+                self.observe(v)
+
+    def stats(self):
+        return {"kinds": self.kinds, "min": self.lo, "max": self.hi}
+
+    def _int_type(self):
+        for name, bound in INT_TYPES:
+            if -bound <= self.lo and self.hi < bound:
+                return name
+        return "NUMERIC"
+
+    def pg_type(self, declared_type):
+        """
+        declared_type: the loader's mapping of the declared SQLite type.
+        None when the data says nothing better (the loader keeps its mapping).
+        """
+        kinds = set(self.kinds)
+        if not kinds or "blob" in kinds:
+            return None
+        if "int" in kinds and declared_type in ("TIMESTAMP", "DATE") and kinds <= {"int", "date", "ts"}:
+            return None   # YYYYMMDD integers: the loader converts them
+        if "text" in kinds:
+            return "TEXT"
+        if kinds == {"bool"}:
+            return "BOOLEAN"
+        if kinds == {"int"}:
+            return self._int_type()
+        if kinds <= {"int", "float"}:
+            wide = "int" in kinds and (self.lo < -FLOAT_EXACT or self.hi > FLOAT_EXACT)
+            return "NUMERIC" if wide else "DOUBLE PRECISION"
+        if kinds <= {"int", "float", "dec"}:
+            return "NUMERIC"
+        if kinds == {"date"}:
+            return "DATE"
+        if kinds <= {"date", "ts"}:
+            return "TIMESTAMP"
+        return "TEXT"
+
+
+def fit(pg_type, val):
+    """Convert a cleaned value for a column of pg_type; raise ValueError if it cannot."""
+    if pg_type == "TEXT":
+        return val
+    kind, parsed = classify(val)
+    if kind is None:
+        return None
+    if pg_type in ("SMALLINT", "INTEGER", "BIGINT"):
+        bound = dict(INT_TYPES)[pg_type]
+        if kind == "float" and parsed.is_integer():
+            kind, parsed = "int", int(parsed)
+        if kind == "int" and -bound <= parsed < bound:
+            return parsed
+    elif pg_type == "DOUBLE PRECISION":
+        if kind in ("int", "float") and (kind == "float" or abs(parsed) <= FLOAT_EXACT):
+            return float(parsed)
+    elif pg_type == "NUMERIC":
+        if kind in ("int", "dec"):
+            return parsed
+        if kind == "float" and math.isfinite(parsed):
+            return Decimal(repr(parsed))
+    elif pg_type == "BOOLEAN":
+        if kind == "bool":
+            return parsed
+    elif pg_type == "DATE":
+        if kind == "date":
+            return parsed
+    elif pg_type == "TIMESTAMP":
+        if kind in ("date", "ts"):
+            return parsed
+    raise ValueError(f"{val!r} does not fit {pg_type}")
+
+
+def fit_column(pg_type, values):
+    """fit() over a column batch; whole-column fast paths for the common cases."""
+    if pg_type == "TEXT":
+        return values
+    present = [v for v in values if v is not None]
+    if pg_type in ("SMALLINT", "INTEGER", "BIGINT") and all(type(v) is int for v in present):
+        bound = dict(INT_TYPES)[pg_type]
+        if not present or (-bound <= min(present) and max(present) < bound):
+            return values
+    elif pg_type == "DOUBLE PRECISION" and all(type(v) is float for v in present):
+        return values
+    elif pg_type in ("DATE", "TIMESTAMP") and all(type(v) is str for v in present):
+        date_only = all(DATE_RE.fullmatch(v) for v in present)
+        if date_only or (pg_type == "TIMESTAMP" and all(TS_RE.fullmatch(v) for v in present)):
+            parse = datetime.date.fromisoformat if date_only else datetime.datetime.fromisoformat
+            try:
+                return [None if v is None else parse(v) for v in values]
+            except ValueError:
+                pass   # e.g. 2021-02-30: fit() below names the value
+    return [fit(pg_type, v) for v in values]
+
+
+class TableTypes:
+    """Column types of one table: .types, .profiled, fit(), widen()."""
+
+    def __init__(self, profiler, table, columns, declared, profiles, source, keep=None):
+        self.profiler, self.table, self.columns = profiler, table, columns
+        self.declared = declared
+        self.profiles = profiles
+        self.source = source   # "scan" | "sample" | "cache" | "off" | "keep"
+        self.kept = keep or [False] * len(columns)   # True → read by gold SQL, declared mapping
+        inferred = [p.pg_type(d) if p is not None and not k else None
+                    for p, d, k in zip(profiles, declared, self.kept)]
+        self.types = [t or d for t, d in zip(inferred, declared)]
+        self.profiled = [t is not None for t in inferred]   # False → loader's declared-type handling
+
+    def fit(self, idx, val):
+        """Value converted for column idx; DoesNotFit if the inferred type is too narrow."""
+        try:
+            return fit(self.types[idx], val)
+        except ValueError:
+            raise DoesNotFit(idx, val, self.types[idx]) from None
+
+    def fit_column(self, idx, values):
+        """fit() for a whole column batch; DoesNotFit names the first value that fails."""
+        try:
+            return fit_column(self.types[idx], values)
+        except ValueError:
+            for v in values:
+                self.fit(idx, v)
+            raise
+
+    def widen(self, idx, val):
+        """Fold a value that did not fit into column idx's profile; returns the new type."""
+        old = self.types[idx]
+        self.profiles[idx].observe(val)
+        new = self.profiles[idx].pg_type(self.declared[idx])
+        if new is None or new == old:   # e.g. a float in an int column, or a declared type that still rejects it
+            new = "TEXT"
+            self.profiles[idx].kinds["text"] = self.profiles[idx].kinds.get("text", 0) + 1
+        self.types[idx] = new
+        self.profiler.store(self.table, self.columns[idx], self.declared[idx], new, self.profiles[idx])
+        return new
+
+    def changed(self):
+        """[(column, declared mapping, inferred type)] where profiling changed the type."""
+        return [(c, d, t) for c, d, t in zip(self.columns, self.declared, self.types) if d != t]
+
+
+class TypeProfiler:
+    """
+    Per-SQLite-file profiler. clean(column, val) is the loader's value cleaning
+    (applied before classification); skip_first(values) tells whether the
+    first row is a stray header.
+    """
+
+    def __init__(self, sqlite_path, db, clean, skip_first=None,
+                 mode=TYPE_PROFILE, sample=TYPE_PROFILE_SAMPLE, cache_path=TYPE_CACHE,
+                 keep=TYPE_PROFILE_KEEP, deps_path=QUERY_DEPS):
+        self.path = os.path.realpath(sqlite_path)
+        self.db = db
+        self.keep = keep if keep in ("read", "none") else "read"
+        self.read = columns_read(db, deps_path) if self.keep == "read" and mode != "off" else set()
+        self.clean = clean
+        self.skip_first = skip_first
+        self.mode = mode if mode in ("scan", "sample", "off") else "scan"
+        self.limit = sample if self.mode == "sample" else None
+        st = os.stat(self.path)
+        self.stamp = f"{st.st_size}:{st.st_mtime_ns}"
+        self.key = self.mode if self.limit is None else f"sample:{self.limit}"
+        self.cache = None
+        if self.mode != "off" and cache_path:
+            self.cache = sqlite3.connect(cache_path, timeout=60)
+            self.cache.execute("PRAGMA journal_mode=WAL;")
+            self.cache.execute("""
+                CREATE TABLE IF NOT EXISTS column_types (
+                    file     TEXT NOT NULL,
+                    stamp    TEXT NOT NULL,
+                    profile  TEXT NOT NULL,
+                    db       TEXT NOT NULL,
+                    tbl      TEXT NOT NULL,
+                    col      TEXT NOT NULL,
+                    declared TEXT NOT NULL,
+                    pg_type  TEXT NOT NULL,
+                    stats    TEXT NOT NULL,
+                    PRIMARY KEY (file, profile, tbl, col)
+                )""")
+            self.cache.commit()
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def _cached(self, table, columns):
+        if self.cache is None:
+            return None
+        rows = self.cache.execute(
+            "SELECT col, stats FROM column_types WHERE file=? AND profile=? AND tbl=? AND stamp=?",
+            (self.path, self.key, table, self.stamp)).fetchall()
+        got = {col: json.loads(stats) for col, stats in rows}
+        if not all(c in got for c in columns):
+            return None
+        return [ColumnProfile(got[c]) for c in columns]
+
+    def store(self, table, col, declared, pg_type, profile):
+        if self.cache is None:
+            return
+        self.cache.execute(
+            "INSERT OR REPLACE INTO column_types VALUES (?,?,?,?,?,?,?,?,?)",
+            (self.path, self.stamp, self.key, self.db, table, col, declared, pg_type,
+             json.dumps(profile.stats())))
+        self.cache.commit()
+
+    def _scan(self, table, columns):
+        profiles = [ColumnProfile() for _ in columns]
+        conn = open_source(self.path)
+        try:
+            first = True
+            for batch in iter_batches(conn, table, limit=self.limit):
+                cols = [[self.clean(c, v) for v in values] for c, values in zip(columns, batch.columns)]
+                if first:
+                    first = False
+                    if batch.n and self.skip_first is not None and self.skip_first([c[0] for c in cols]):
+                        cols = [c[1:] for c in cols]
+                for p, values in zip(profiles, cols):
+                    p.observe_many(values)
+        finally:
+            conn.close()
+        return profiles
+
+    def table(self, table, columns, declared):
+        """declared: the loader's declared-type mapping per column."""
+        if self.mode == "off":
+            return TableTypes(self, table, columns, declared, [None] * len(columns), "off")
+        if self.read is None:   # reads unknown: nothing may change type
+            return TableTypes(self, table, columns, declared, [None] * len(columns), "keep",
+                              [True] * len(columns))
+        keep = [(table.lower(), c.lower()) in self.read for c in columns]
+        profiles, source = self._cached(table, columns), "cache"
+        if profiles is None:
+            profiles, source = self._scan(table, columns), self.mode
+        out = TableTypes(self, table, columns, declared, profiles, source, keep)
+        if source != "cache" and self.cache is not None:
+            self.cache.executemany(
+                "INSERT OR REPLACE INTO column_types VALUES (?,?,?,?,?,?,?,?,?)",
+                [(self.path, self.stamp, self.key, self.db, table, c, d, t, json.dumps(p.stats()))
+                 for c, d, t, p in zip(columns, declared, out.types, profiles)])
+            self.cache.commit()
+        return out
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leased work queue in one SQLite file, for labelling from several hosts.
+
+The queue directory (a shared mount, or local for several processes) holds
+
+    queue.sqlite     meta, the input items, and the chunks with their leases
+    shards/          one JSONL file per finished chunk
+
+    q = WorkQueue.create(qdir, items, chunk_size=200, group=lambda it: it["db_id"], meta={...})
+    q = WorkQueue(qdir)
+    chunk = q.claim("hostA-1", lease=300)       # None when nothing is left
+    q.renew(chunk, lease=300)                   # False: the lease was lost
+    q.complete(chunk, rows)                     # writes the shard, marks it done
+    for row in q.merged_rows(): ...             # chunk order = input order
+
+Chunks are runs of consecutive items with the same group key (the database),
+so a worker keeps one warm session per chunk. A chunk whose lease runs out
+(worker died, host lost) is claimed again by the next worker. A worker that
+lost its lease can still finish, but its complete() is refused and its shard
+is deleted, so every chunk has exactly one shard. merged_rows() reads the
+shards in chunk order. The output therefore does not depend on which worker
+did what, or when.
+
+Claims take SQLite's write lock (BEGIN IMMEDIATE) for one short UPDATE. The
+journal is the rollback journal, not WAL: WAL does not work over network
+file systems. Lease times come from the workers' clocks, so hosts need
+roughly synchronised clocks (NTP), with leases much longer than any skew.
+"""
+
+import os, json, time, sqlite3
+from collections import namedtuple
+
+QUEUE_DB = "queue.sqlite"
+SHARD_DIR = "shards"
+
+Chunk = namedtuple("Chunk", "id group first last attempt owner")
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+class WorkQueue:
+    def __init__(self, qdir, timeout=60.0):
+        self.qdir = qdir
+        path = os.path.join(qdir, QUEUE_DB)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"no work queue at {path}")
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=DELETE;")
+
+    # ── setup ────────────────────────────────────────────────────────────────
+    @classmethod
+    def create(cls, qdir, items, chunk_size, group, meta=None):
+        """items: JSON-serialisable dicts, in output order. Refuses to overwrite a queue."""
+        os.makedirs(os.path.join(qdir, SHARD_DIR), exist_ok=True)
+        path = os.path.join(qdir, QUEUE_DB)
+        if os.path.exists(path):
+            raise FileExistsError(f"{path} already exists")
+        if os.path.exists(path + ".tmp"):   # left by an interrupted create
+            os.remove(path + ".tmp")
+        conn = sqlite3.connect(path + ".tmp")
+        conn.executescript("""
+            CREATE TABLE meta  (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE items (seq INTEGER PRIMARY KEY, payload TEXT NOT NULL);
+            CREATE TABLE chunks (
+                id          INTEGER PRIMARY KEY,
+                grp         TEXT NOT NULL,
+                first       INTEGER NOT NULL,      -- item seq range [first, last]
+                last        INTEGER NOT NULL,
+                state       TEXT NOT NULL DEFAULT 'todo',   -- todo | leased | done
+                owner       TEXT,
+                lease_until REAL,
+                attempt     INTEGER NOT NULL DEFAULT 0,
+                shard       TEXT,
+                n_rows      INTEGER,
+                seconds     REAL
+            );
+            CREATE INDEX chunks_state ON chunks (state, lease_until);
+        """)
+        chunks, cur_group, first, seq = [], None, 0, -1
+        for seq, item in enumerate(items):
+            g = group(item)
+            conn.execute("INSERT INTO items VALUES (?, ?)", (seq, json.dumps(item, ensure_ascii=False)))
+            if seq > first and (g != cur_group or seq - first >= chunk_size):
+                chunks.append((cur_group, first, seq - 1))
+                first = seq
+            cur_group = g
+        if seq >= 0:
+            chunks.append((cur_group, first, seq))
+        conn.executemany("INSERT INTO chunks (grp, first, last) VALUES (?, ?, ?)", chunks)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                         [(k, json.dumps(v)) for k, v in {**(meta or {}), "created": time.time(),
+                                                          "items": seq + 1, "chunk_size": chunk_size}.items()])
+        conn.commit()
+        conn.close()
+        os.replace(path + ".tmp", path)
+        return cls(qdir)
+
+    def meta(self):
+        return {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM meta")}
+
+    def items(self, chunk):
+        return [json.loads(p) for (p,) in self.conn.execute(
+            "SELECT payload FROM items WHERE seq BETWEEN ? AND ? ORDER BY seq", (chunk.first, chunk.last))]
+
+    # ── leases ───────────────────────────────────────────────────────────────
+    def claim(self, worker, lease):
+        """Lease the first chunk that is to do or whose lease ran out; None if none."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("""
+                SELECT id, grp, first, last, attempt FROM chunks
+                 WHERE state = 'todo' OR (state = 'leased' AND lease_until < ?)
+                 ORDER BY id LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            cid, grp, first, last, attempt = row
+            self.conn.execute("UPDATE chunks SET state = 'leased', owner = ?, lease_until = ?, attempt = ? "
+                              "WHERE id = ?", (worker, now + lease, attempt + 1, cid))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return Chunk(cid, grp, first, last, attempt + 1, worker)
+
+    def renew(self, chunk, lease):
+        cur = self.conn.execute(
+            "UPDATE chunks SET lease_until = ? WHERE id = ? AND state = 'leased' AND owner = ? AND attempt = ?",
+            (time.time() + lease, chunk.id, chunk.owner, chunk.attempt))
+        return cur.rowcount == 1
+
+    def release(self, chunk):
+        """Give a chunk back (e.g. the worker is stopping) without waiting for its lease to expire."""
+        self.conn.execute(
+            "UPDATE chunks SET state = 'todo', owner = NULL, lease_until = NULL "
+            "WHERE id = ? AND state = 'leased' AND owner = ? AND attempt = ?",
+            (chunk.id, chunk.owner, chunk.attempt))
+
+    def complete(self, chunk, rows, seconds=None):
+        """Write the chunk's shard and mark it done. LeaseLost if another worker owns it now."""
+        name = f"chunk-{chunk.id:07d}.a{chunk.attempt}.jsonl"
+        path = os.path.join(self.qdir, SHARD_DIR, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        cur = self.conn.execute(
+            "UPDATE chunks SET state = 'done', shard = ?, n_rows = ?, seconds = ?, lease_until = NULL "
+            "WHERE id = ? AND state = 'leased' AND owner = ? AND attempt = ?",
+            (name, len(rows), seconds, chunk.id, chunk.owner, chunk.attempt))
+        if cur.rowcount != 1:
+            os.remove(path)
+            raise LeaseLost(f"chunk {chunk.id}: lease lost before completion")
+
+    def reset(self, states=("leased",)):
+        """Put chunks in `states` back to 'todo' (e.g. after every worker was killed)."""
+        marks = ",".join("?" * len(states))
+        return self.conn.execute(f"UPDATE chunks SET state = 'todo', owner = NULL, lease_until = NULL "
+                                 f"WHERE state IN ({marks})", tuple(states)).rowcount
+
+    # ── progress / merge ─────────────────────────────────────────────────────
+    def status(self):
+        """{state: (chunks, items)} plus per-owner finished counts under 'owners'."""
+        now = time.time()
+        out = {}
+        for state, n, items in self.conn.execute("""
+                SELECT CASE WHEN state = 'leased' AND lease_until < ? THEN 'expired' ELSE state END,
+                       COUNT(*), SUM(last - first + 1)
+                  FROM chunks GROUP BY 1""", (now,)):
+            out[state] = (n, items or 0)
+        out["owners"] = dict(self.conn.execute(
+            "SELECT owner, COUNT(*) FROM chunks WHERE state = 'done' GROUP BY owner ORDER BY owner"))
+        return out
+
+    def pending(self):
+        return self.conn.execute("SELECT COUNT(*) FROM chunks WHERE state <> 'done'").fetchone()[0]
+
+    def merged_rows(self, allow_partial=False):
+        """Every shard row, in chunk order."""
+        if self.pending() and not allow_partial:
+            raise RuntimeError(f"{self.pending()} chunk(s) not done yet")
+        shards = self.conn.execute("SELECT shard FROM chunks WHERE state = 'done' ORDER BY id").fetchall()
+        for (name,) in shards:
+            with open(os.path.join(self.qdir, SHARD_DIR, name), encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def close(self):
+        self.conn.close()
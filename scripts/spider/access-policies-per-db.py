@@ -1,6 +1,13 @@
+import os
+import sys
 import pandas as pd
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+
+METRICS = Metrics("spider_policies")
+
 # Load user_permissions.csv (generated from your grant script)
 perms = pd.read_csv("user_permissions.csv")
 
@@ -35,3 +42,6 @@ df_out = pd.DataFrame(rows)
 # Step 3: Save to CSV
 df_out.to_csv("db_access_policies.csv", index=False)
 print("✅ Saved: db_access_policies.csv")
+METRICS.inc("grant_rows", len(perms))
+METRICS.inc("policies_written", len(rows))
+METRICS.report()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
-Run every Spider query as each of the four per-database roles and
-record the outcome.
+Run every Spider query as each per-database role (four by default, see
+common/roles.py) and record the outcome.
 
 Input : spider_nl_sql_pairs.csv   (question, sql, db_id)
 Output: spider_nl_sql_pairs_with_results.csv
@@ -16,6 +16,14 @@ import time
 import psycopg2
 from psycopg2 import ProgrammingError, OperationalError, errors
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.layout import consolidated, target
+from common.roles import RoleSpec
+from common.sql_translate import translate
+
+METRICS = Metrics("spider_groundtruth")
+
 # ── PostgreSQL super-user credentials ──────────────────────────────────────────
 PG_USER     = os.getenv("PG_USER", "username")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
@@ -29,12 +37,13 @@ OUTPUT_CSV      = os.path.join(DATA_DIR, "dataset-groundtruth.csv")
 # ── how many rows to store when a query succeeds (None ⇒ ALL / can be huge!) ──
 ROW_LIMIT_TO_STORE = 5
 
-ROLE_SUFFIXES = ["User_1", "User_2", "User_3", "User_4"]
+ROLE_SUFFIXES = RoleSpec.load(min_count=0).names   # $ROLES_FILE, as in users_permissions.py
 
 
 # ───────────────────────────────────────────────────────────────────────────────
 def connect_as_admin(db_name: str):
     """Return a psycopg2 connection *as super-user* to the given db."""
+    METRICS.inc("connection_opens", db=db_name)
     return psycopg2.connect(
         dbname=db_name,
         user=PG_USER,
@@ -53,20 +62,27 @@ def stringify_result(cur):
         return "OK-NO-ROWS"
 
 
-def run_query_with_role(conn, sql: str, role_name: str) -> str:
+def run_query_with_role(conn, sql: str, role_name: str, db_id: str = None) -> str:
     """
     Execute a single SQL statement while SET ROLE -ed to `role_name`.
 
     Returns a string that either contains rows (on success) or the error text.
     """
     cur = conn.cursor()
+    db_name = db_id or conn.info.dbname
+    t0 = None
     try:
         cur.execute(f'SET ROLE "{role_name}";')
+        t0 = time.perf_counter()
         cur.execute(sql)
         result_str = stringify_result(cur)
+        METRICS.query(time.perf_counter() - t0, sql, db=db_name, role=role_name)
         cur.execute("RESET ROLE;")
         return result_str
     except Exception as e:  # capture & reset role before propagating
+        if t0 is not None:
+            code = getattr(e, "pgcode", None) or type(e).__name__
+            METRICS.query(time.perf_counter() - t0, sql, code=code, db=db_name, role=role_name)
         try:
             cur.execute("RESET ROLE;")
         except Exception:
@@ -76,6 +92,44 @@ def run_query_with_role(conn, sql: str, role_name: str) -> str:
         cur.close()
 
 
+def open_db_session(db_id: str, conn=None):
+    """
+    Admin session on db_id's database. In the schema layout an open `conn` is
+    kept and only its search_path switches; otherwise it is closed first.
+    """
+    if not consolidated() or conn is None or conn.closed:
+        if conn:
+            conn.close()
+        conn = connect_as_admin(target(db_id)[0] if consolidated() else db_id)
+        conn.autocommit = True
+    if consolidated():
+        with conn.cursor() as cur:
+            cur.execute("SET search_path TO %s;", (target(db_id)[1],))
+    return conn
+
+
+def label_row(conn, r: dict) -> dict:
+    """Fill r["<suffix>_result"] for every role; conn is open on r["db_id"]."""
+    # SQLite dialect → Postgres once per pair (common/sql_translate.py)
+    sql_pg, rewrites = translate(r["sql"])
+    for rule in rewrites:
+        METRICS.inc("sql_rewrites", rule=rule)
+
+    # run SQL for each role
+    for suffix in ROLE_SUFFIXES:
+        role_name = f"{r['db_id']}_{suffix}"
+        r[f"{suffix}_result"] = run_query_with_role(conn, sql_pg, role_name, r["db_id"])
+    return r
+
+
+def connect_error_row(r: dict, e) -> dict:
+    # if DB missing, mark every role's result as error
+    err_txt = f"ERROR: cannot connect: {e}"
+    for suffix in ROLE_SUFFIXES:
+        r[f"{suffix}_result"] = err_txt
+    return r
+
+
 # ───────────────────────────────────────────────────────────────────────────────
 def main():
     if not os.path.isfile(INPUT_CSV):
@@ -102,37 +156,25 @@ def main():
     try:
         for r in rows:
             db_id   = r["db_id"]
-            sql     = r["sql"]
 
             # open a new admin connection only when db changes
+            # (schema layout: keep the one corpus connection, switch search_path)
             if current_db != db_id:
-                if conn:
-                    conn.close()
                 try:
-                    conn = connect_as_admin(db_id)
-                    conn.autocommit = True
+                    conn = open_db_session(db_id, conn)
                 except OperationalError as e:
-                    # if DB missing, mark all four results as error and continue
-                    err_txt = f"ERROR: cannot connect: {e}"
-                    for suffix in ROLE_SUFFIXES:
-                        r[f"{suffix}_result"] = err_txt
-                    writer.writerow(r)
+                    writer.writerow(connect_error_row(r, e))
                     current_db = None
                     processed += 1
                     continue
                 current_db = db_id
 
-            # run SQL for each of the four roles
-            for suffix in ROLE_SUFFIXES:
-                role_name = f"{db_id}_{suffix}"
-                outcome   = run_query_with_role(conn, sql, role_name)
-                r[f"{suffix}_result"] = outcome
-
-            writer.writerow(r)
+            writer.writerow(label_row(conn, r))
             processed += 1
 
             if processed % 500 == 0:
-                print(f"   …{processed:,}/{total:,} done")
+                rate = processed / max(1e-9, time.time() - METRICS.started)
+                print(f"   …{processed:,}/{total:,} done ({rate:,.1f} questions/s)")
 
     finally:
         if conn:
@@ -140,6 +182,7 @@ def main():
         f_out.close()
 
     print(f"✅ Finished. Results saved to {OUTPUT_CSV}.")
+    METRICS.report()
 
 
 # ───────────────────────────────────────────────────────────────────────────────
@@ -1,6 +1,12 @@
 import json
 import csv
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+
+METRICS = Metrics("spider_extract")
 
 # Set your data directory path
 DATA_DIR = os.getenv("DATA_DIR", os.path.expanduser("~/path/to/spider/data"))
@@ -30,3 +36,5 @@ with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
         writer.writerow([question, sql, db_id])
 
 print(f"✅ Extracted {len(all_data)} NL-SQL pairs to: {OUTPUT_FILE}")
+METRICS.inc("records_written", len(all_data))
+METRICS.report()
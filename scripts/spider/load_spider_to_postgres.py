@@ -1,15 +1,30 @@
 import os
-import sqlite3
+import sys
+import time
 import psycopg2
 from psycopg2 import sql
 import datetime
 import subprocess
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.layout import PG_CORPUS_DB, consolidated, target
+from common.load_profile import FinishPass, WalMeter, create_table_sql, finish_pass
+from common.sqlite_indexes import IndexRebuild
+from common.sqlite_reader import open_source, iter_batches
+from common.type_profile import TYPE_CACHE, TypeProfiler, DoesNotFit
+
+METRICS = Metrics("spider_load")
+
 # PostgreSQL connection settings
 PG_USER = os.getenv("PG_USER", "username")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
 PG_HOST = os.getenv("PG_HOST", "localhost")
 PG_PORT = int(os.getenv("PG_PORT", 5432))
+PG_ADMIN_DB = os.getenv("PG_ADMIN_DB", "postgres")  # WAL position for the run report
+
+LOAD_INDEXES = os.getenv("LOAD_INDEXES", "0") == "1"  # rebuild SQLite keys/indexes after the load
+INDEX_WORKERS = 4
 
 # Path to Spider database folder (anonymized for submission)
 SPIDER_DB_PATH = os.getenv(
@@ -37,6 +52,45 @@ def map_sqlite_type_to_postgres(sqlite_type, col_name=None):
         return "TIMESTAMP"
     return "TEXT"
 
+def clean_value(col_name, val):
+    """Decode bytes and map the null markers; shared by the profiler and the load."""
+    if isinstance(val, bytes):
+        try:
+            val = val.decode('utf-8', errors='replace')
+        except:
+            val = ''
+    if isinstance(val, str):
+        if val.strip() == "0000-00-00":
+            val = None
+        elif val.strip().upper() == 'NULL':
+            val = None
+        elif val.strip().upper() == 'T' and 'precipitation' in col_name:
+            val = 0.0
+    return val
+
+def clean_column(col_name, values):
+    """clean_value() over one column of a batch; numbers and NULLs pass through."""
+    return [clean_value(col_name, v) if isinstance(v, (bytes, str)) else v for v in values]
+
+def legacy_date(val):
+    if not isinstance(val, int):
+        return val
+    try:
+        return datetime.date(val // 10000, (val % 10000) // 100, val % 100)
+    except Exception:
+        return None
+
+def convert_column(types, idx, values):
+    """Convert one cleaned column to its Postgres type, choosing the conversion once."""
+    pg_type = types.types[idx]
+    if types.profiled[idx]:
+        return types.fit_column(idx, values)
+    if pg_type not in ('TEXT', 'VARCHAR'):
+        values = [None if v == '' else v for v in values]
+    if pg_type in ('TIMESTAMP', 'DATE'):
+        values = [legacy_date(v) for v in values]
+    return values
+
 def create_postgres_database(db_name):
     try:
         subprocess.run([
@@ -52,31 +106,41 @@ def create_postgres_database(db_name):
 
 def migrate_sqlite_to_postgres(sqlite_path, db_name):
     print(f"→ Migrating: {db_name}")
+    t_db = time.perf_counter()
 
-    sqlite_conn = sqlite3.connect(sqlite_path)
-    sqlite_conn.text_factory = bytes
+    sqlite_conn = open_source(sqlite_path)
     sqlite_cursor = sqlite_conn.cursor()
 
+    pg_database, schema = target(db_name)
     pg_conn = psycopg2.connect(
-        dbname=db_name,
+        dbname=pg_database,
         user=PG_USER,
         password=PG_PASSWORD,
         host=PG_HOST,
         port=PG_PORT
     )
+    METRICS.inc("connection_opens", db=db_name)
     pg_cursor = pg_conn.cursor()
 
+    if consolidated():
+        # one schema per Spider DB; unqualified names below resolve into it
+        pg_cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(schema)))
+        pg_cursor.execute(sql.SQL("SET search_path TO {}").format(sql.Identifier(schema)))
+
     sqlite_cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
     tables = [row[0].decode('utf-8', errors='replace') if isinstance(row[0], bytes) else row[0]
               for row in sqlite_cursor.fetchall()]
 
+    profiler = TypeProfiler(sqlite_path, db_name, clean_value)
+    n_columns = n_retyped = n_kept = 0
     for table in tables:
         table = table.lower()
+        t_table = time.perf_counter()
         sqlite_cursor.execute(f'PRAGMA table_info("{table}")')
         columns_info = sqlite_cursor.fetchall()
 
         columns = []
-        col_defs_list = []
+        declared = []
 
         for col in columns_info:
             col_name = col[1]
@@ -87,85 +151,111 @@ def migrate_sqlite_to_postgres(sqlite_path, db_name):
                 col_type = col_type.decode('utf-8', errors='replace')
 
             col_name = col_name.lower()
-            pg_type = map_sqlite_type_to_postgres(col_type, col_name)
             columns.append(col_name)
-            col_defs_list.append(f'"{col_name}" {pg_type}')  # ← quoted here
+            declared.append(map_sqlite_type_to_postgres(col_type, col_name))
 
-        col_defs = ", ".join(col_defs_list)
+        t_profile = time.perf_counter()
+        types = profiler.table(table, columns, declared)
+        METRICS.observe("type_profile", time.perf_counter() - t_profile, db=db_name)
+        n_columns += len(columns)
+        n_kept += sum(types.kept)
+        n_retyped += len(types.changed())
+        for t in types.types:
+            METRICS.inc("column_types", db=db_name, type=t, source=types.source)
 
-        pg_cursor.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(
-            sql.Identifier(table)
-        ))
-        pg_cursor.execute(sql.SQL("CREATE TABLE {} ({})").format(
-            sql.Identifier(table), sql.SQL(col_defs)
-        ))
-
-        sqlite_cursor.execute(f'SELECT * FROM "{table}"')
-        rows = sqlite_cursor.fetchall()
-
-        if rows:
+        pg_cursor.execute("SAVEPOINT table_load")
+        while True:
+            n_bytes = 0
+            col_defs = ", ".join(f'"{c}" {t}' for c, t in zip(columns, types.types))  # ← quoted here
+            pg_cursor.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(
+                sql.Identifier(table)
+            ))
+            pg_cursor.execute(sql.SQL(create_table_sql(False) + " {} ({})").format(
+                sql.Identifier(table), sql.SQL(col_defs)
+            ))
             placeholders = ", ".join(["%s"] * len(columns))
             insert_query = sql.SQL("INSERT INTO {} VALUES (" + placeholders + ")").format(
                 sql.Identifier(table)
             )
+            n_rows = 0
+            try:
+                for batch in iter_batches(sqlite_conn, table):
+                    n_bytes += batch.nbytes
+                    cols = [convert_column(types, idx, clean_column(columns[idx], values))
+                            for idx, values in enumerate(batch.columns)]
+                    pg_cursor.executemany(insert_query, list(zip(*cols)))
+                    n_rows += batch.n
+                break
+            except DoesNotFit as e:
+                # value outside the profile (sampling): widen the column and reload the table
+                pg_cursor.execute("ROLLBACK TO SAVEPOINT table_load")
+                new = types.widen(e.index, e.value)
+                METRICS.inc("type_fallbacks", db=db_name, table=table, column=columns[e.index])
+                print(f"↩️  {db_name}.{table}.{columns[e.index]}: {e.value!r} does not fit {e.pg_type}, reloading as {new}")
+        pg_cursor.execute("RELEASE SAVEPOINT table_load")
 
-            for row in rows:
-                clean_row = []
-                for idx, val in enumerate(row):
-                    if isinstance(val, bytes):
-                        try:
-                            val = val.decode('utf-8', errors='replace')
-                        except:
-                            val = ''
-
-                    if isinstance(val, str):
-                        if val.strip() == "0000-00-00":
-                            val = None
-                        elif val.strip().upper() == 'NULL':
-                            val = None
-                        elif val.strip().upper() == 'T' and 'precipitation' in col_defs_list[idx].lower():
-                            val = 0.0
-
-                    target_pg_type = col_defs_list[idx].split()[-1].upper()
-                    if val == '' and target_pg_type not in ['TEXT', 'VARCHAR']:
-                        val = None
-
-                    if target_pg_type in ['TIMESTAMP', 'DATE'] and isinstance(val, int):
-                        try:
-                            year = val // 10000
-                            month = (val % 10000) // 100
-                            day = val % 100
-                            val = datetime.date(year, month, day)
-                        except Exception:
-                            val = None
-
-                    clean_row.append(val)
-
-                pg_cursor.execute(insert_query, clean_row)
+        METRICS.observe("table_load", time.perf_counter() - t_table, db=db_name, table=table)
+        METRICS.inc("rows_loaded", n_rows, db=db_name, table=table)
+        METRICS.inc("bytes_read", n_bytes, db=db_name, table=table)
 
+    profiler.close()
+    if profiler.mode != "off":
+        print(f"🔎 {db_name}: {n_retyped}/{n_columns} column type(s) inferred from data ({TYPE_CACHE}), "
+              f"{n_kept} kept as declared (TYPE_PROFILE_KEEP)")
     pg_conn.commit()
     sqlite_conn.close()
     pg_conn.close()
+    METRICS.observe("db_load", time.perf_counter() - t_db, db=db_name)
     print(f"✅ Done: {db_name}\n")
 
 def main():
     os.environ["PGPASSWORD"] = PG_PASSWORD
 
-    for db_folder in os.listdir(SPIDER_DB_PATH):
-        db_dir = os.path.join(SPIDER_DB_PATH, db_folder)
+    if consolidated():
+        create_postgres_database(PG_CORPUS_DB)
+        print(f"🗃️  Schema layout: every Spider database becomes a schema of {PG_CORPUS_DB}")
+
+    def connect(pg_db):
+        METRICS.inc("connection_opens", db=pg_db)
+        return psycopg2.connect(dbname=pg_db, user=PG_USER, password=PG_PASSWORD, host=PG_HOST, port=PG_PORT)
+
+    wal = WalMeter(connect, PG_ADMIN_DB, METRICS)
+    loaded = {}
+    with wal.phase("load"):
+        for db_folder in os.listdir(SPIDER_DB_PATH):
+            db_dir = os.path.join(SPIDER_DB_PATH, db_folder)
+
+            db_file = os.path.join(db_dir, "database.sqlite")
+            if not os.path.isfile(db_file):
+                db_file = os.path.join(db_dir, f"{db_folder}.sqlite")
+            if not os.path.isfile(db_file):
+                print(f"⚠️  Skipping {db_folder} — no .sqlite file found.")
+                continue
+
+            db_name = db_folder.lower()
+            if not consolidated():
+                create_postgres_database(db_name)
+            migrate_sqlite_to_postgres(db_file, db_name)
+            loaded[db_name] = db_file
+
+    if loaded and finish_pass():
+        # the index rebuild analyses each table itself
+        with wal.phase("finish"):
+            FinishPass(connect, workers=INDEX_WORKERS, analyze=not LOAD_INDEXES, metrics=METRICS).run(loaded)
 
-        db_file = os.path.join(db_dir, "database.sqlite")
-        if not os.path.isfile(db_file):
-            db_file = os.path.join(db_dir, f"{db_folder}.sqlite")
-        if not os.path.isfile(db_file):
-            print(f"⚠️  Skipping {db_folder} — no .sqlite file found.")
-            continue
+    if LOAD_INDEXES:
+        with wal.phase("rebuild_indexes"):
+            counts = IndexRebuild(connect, workers=INDEX_WORKERS, metrics=METRICS).run(loaded)
+        print(f"🗂️  indexes: {counts.get('indexes_built', 0)} built on {counts.get('tables', 0)} table(s), "
+              f"{counts.get('index_failures', 0)} failed")
 
-        db_name = db_folder.lower()
-        create_postgres_database(db_name)
-        migrate_sqlite_to_postgres(db_file, db_name)
+    wal.close()
 
-    print("🎉 All Spider databases migrated into individual PostgreSQL databases (lowercase + quoted)!")
+    if consolidated():
+        print(f"🎉 All Spider databases migrated into schemas of {PG_CORPUS_DB} (lowercase + quoted)!")
+    else:
+        print("🎉 All Spider databases migrated into individual PostgreSQL databases (lowercase + quoted)!")
+    METRICS.report()
 
 if __name__ == "__main__":
     main()
@@ -1,49 +1,198 @@
-import pandas as pd
-import json
-import random
-from pathlib import Path
-from collections import defaultdict
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Assign Spider (question, SQL) pairs to simulated users.
+
+Each row of the users CSV (username, database, read_access) gets --per_user
+questions from its database, drawn with numpy in one seeded pass:
+
+  with_replacement     independent uniform draws (the original behaviour for K=1)
+  without_replacement  K distinct questions per user (all of them, shuffled,
+                       if the database has fewer than K)
+  stratified           questions grouped by the tables they touch; each user
+                       cycles through the groups in a random order, so K
+                       questions cover as many different table sets as possible
+
+Users whose database has no questions are skipped. Output rows keep the input
+user order and are written in chunks.
+"""
+
+import os
+import re
+import sys
+import argparse
+
 import numpy as np
+import pandas as pd
 
-# Reload files after kernel reset
-users_df = pd.read_csv("user_with_read.csv")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.json_stream import iter_json_array
+from common.metrics import Metrics
 
-# Load Spider dev.json
-# Load Spider training data (anonymized for submission)
-train_path = os.getenv(
+METRICS = Metrics("spider_assign")
+
+TRAIN_SPIDER_PATH = os.getenv(
     "TRAIN_SPIDER_PATH",
     os.path.expanduser("~/path/to/spider/train_spider.json")
 )
-with open(train_path, "r") as f:
-    spider_dev = json.load(f)
-
-# Group Spider entries by db_id
-entries_by_schema = defaultdict(list)
-for item in spider_dev:
-    db_id = item["db_id"]
-    entries_by_schema[db_id].append((item["question"], item["query"]))
-
-# Assign one (question, SQL) pair per user
-assigned = []
-for _, row in users_df.iterrows():
-    username = row["username"]
-    schema = row["database"]
-    read_access = row["read_access"]
-
-    schema_entries = entries_by_schema.get(schema, [])
-    if not schema_entries:
-        continue  
-
-    question, query = random.choice(schema_entries)
-    assigned.append({
-        "username": username,
-        "schema": schema,
-        "read_access": read_access,
-        "question": question,
-        "sql_query": query
-    })
-
-# Convert to DataFrame and show
-assigned_df = pd.DataFrame(assigned)
-assigned_df_path = "assigned_user_queries.csv"
-assigned_df.to_csv(assigned_df_path, index=False)
+MODES = ("with_replacement", "without_replacement", "stratified")
+OUT_COLUMNS = ["username", "schema", "read_access", "question", "sql_query"]
+
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+[`"\[]?([A-Za-z_][\w]*)', re.IGNORECASE)
+BLOCK_CELLS = 4_000_000   # max users × questions per random-key block
+
+
+def touched_tables(sql):
+    return ",".join(sorted({t.lower() for t in TABLE_REF.findall(sql or "")}))
+
+
+class QuestionPool:
+    """
+    Spider entries grouped by schema (and, within a schema, by touched tables)
+    as flat arrays: schema s owns rows start[s] : start[s] + count[s].
+    """
+
+    def __init__(self, db_ids, questions, queries):
+        strata = [touched_tables(q) for q in queries]
+        frame = pd.DataFrame({"db_id": db_ids, "stratum": strata, "question": questions, "query": queries})
+        frame = frame.sort_values(["db_id", "stratum"], kind="stable").reset_index(drop=True)
+        self.question = frame["question"].to_numpy(dtype=object)
+        self.query = frame["query"].to_numpy(dtype=object)
+
+        codes, self.schemas = pd.factorize(frame["db_id"], sort=True)
+        self.count = np.bincount(codes, minlength=len(self.schemas)).astype(np.int64)
+        self.start = np.concatenate([[0], np.cumsum(self.count)[:-1]]).astype(np.int64)
+
+        # strata: contiguous runs of (schema, touched tables)
+        key = frame["db_id"] + "\x00" + frame["stratum"]
+        bounds = np.flatnonzero(np.r_[True, key.to_numpy()[1:] != key.to_numpy()[:-1]])
+        self.s_start = bounds.astype(np.int64)
+        self.s_count = np.diff(np.r_[bounds, len(frame)]).astype(np.int64)
+        s_schema = codes[bounds]
+        self.n_strata = np.bincount(s_schema, minlength=len(self.schemas)).astype(np.int64)
+        self.first_stratum = np.concatenate([[0], np.cumsum(self.n_strata)[:-1]]).astype(np.int64)
+
+    @classmethod
+    def load(cls, path):
+        db_ids, questions, queries = [], [], []
+        for item in iter_json_array(path):
+            db_ids.append(item["db_id"])
+            questions.append(item["question"])
+            queries.append(item["query"])
+        return cls(db_ids, questions, queries)
+
+    def codes_for(self, databases):
+        """Schema code per database name (-1 when the schema has no questions)."""
+        return pd.Index(self.schemas).get_indexer(pd.Series(databases, dtype=object))
+
+
+def _by_schema(codes, users):
+    """Yield (schema code, user indices) groups."""
+    order = users[np.argsort(codes[users], kind="stable")]
+    sc = codes[order]
+    cuts = np.flatnonzero(np.r_[True, sc[1:] != sc[:-1], True])
+    for a, b in zip(cuts[:-1], cuts[1:]):
+        yield int(sc[a]), order[a:b]
+
+
+def _blocks(users, width):
+    step = max(1, BLOCK_CELLS // max(1, width))
+    for i in range(0, len(users), step):
+        yield users[i:i + step]
+
+
+def assign(pool, codes, k, mode, rng):
+    """
+    codes: schema code per user. Returns (user index, pool row) arrays sorted
+    by user, each user's picks in draw order.
+    """
+    users = np.flatnonzero(codes >= 0)
+    if k <= 0 or len(users) == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+
+    if mode == "with_replacement":
+        c = codes[users]
+        rows = pool.start[c][:, None] + (rng.random((len(users), k)) * pool.count[c][:, None]).astype(np.int64)
+        return np.repeat(users, k), rows.ravel()
+
+    out_u, out_r = [], []
+    for s, group in _by_schema(codes, users):
+        if mode == "without_replacement":
+            n = int(pool.count[s])
+            kk = min(k, n)
+            for block in _blocks(group, n):
+                keys = rng.random((len(block), n))
+                pick = np.argsort(keys, axis=1)[:, :kk] if kk == n else np.argpartition(keys, kk - 1, axis=1)[:, :kk]
+                out_u.append(np.repeat(block, kk))
+                out_r.append((pool.start[s] + pick).ravel())
+        else:
+            m = int(pool.n_strata[s])
+            for block in _blocks(group, m):
+                order = np.argsort(rng.random((len(block), m)), axis=1)
+                strata = pool.first_stratum[s] + order[:, np.arange(k) % m]
+                rows = pool.s_start[strata] + (rng.random((len(block), k)) * pool.s_count[strata]).astype(np.int64)
+                out_u.append(np.repeat(block, k))
+                out_r.append(rows.ravel())
+    u, r = np.concatenate(out_u), np.concatenate(out_r)
+    order = np.argsort(u, kind="stable")
+    return u[order], r[order]
+
+
+def write_assignments(path, users_df, pool, user_idx, rows, chunk_rows):
+    tmp = path + ".tmp"
+    usernames = users_df["username"].to_numpy(dtype=object)
+    databases = users_df["database"].to_numpy(dtype=object)
+    access = users_df["read_access"].to_numpy(dtype=object)
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        pd.DataFrame(columns=OUT_COLUMNS).to_csv(f, index=False)
+        for i in range(0, len(rows), chunk_rows):
+            u, r = user_idx[i:i + chunk_rows], rows[i:i + chunk_rows]
+            pd.DataFrame({
+                "username": usernames[u],
+                "schema": databases[u],
+                "read_access": access[u],
+                "question": pool.question[r],
+                "sql_query": pool.query[r],
+            }).to_csv(f, index=False, header=False)
+    os.replace(tmp, path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Assign Spider questions to simulated users")
+    ap.add_argument("--users", default="user_with_read.csv", help="CSV with username, database, read_access")
+    ap.add_argument("--train", default=TRAIN_SPIDER_PATH, help="Spider train_spider.json")
+    ap.add_argument("--out", default="assigned_user_queries.csv")
+    ap.add_argument("--per_user", type=int, default=1, help="Questions per user (K)")
+    ap.add_argument("--mode", choices=MODES, default="with_replacement")
+    ap.add_argument("--seed", type=int, default=None, help="RNG seed (default: nondeterministic)")
+    ap.add_argument("--chunk_rows", type=int, default=100_000, help="Rows per output write")
+    args = ap.parse_args()
+
+    with METRICS.timer("load"):
+        pool = QuestionPool.load(args.train)
+        users_df = pd.read_csv(args.users, usecols=["username", "database", "read_access"])
+    codes = pool.codes_for(users_df["database"])
+
+    rng = np.random.default_rng(args.seed)
+    with METRICS.timer("assign"):
+        user_idx, rows = assign(pool, codes, args.per_user, args.mode, rng)
+    with METRICS.timer("write"):
+        write_assignments(args.out, users_df, pool, user_idx, rows, max(1, args.chunk_rows))
+
+    skipped = int((codes < 0).sum())
+    short = int(((codes >= 0) & (pool.count[np.maximum(codes, 0)] < args.per_user)).sum()) \
+        if args.mode == "without_replacement" else 0
+    METRICS.inc("users", len(users_df))
+    METRICS.inc("users_skipped", skipped)
+    METRICS.inc("rows_written", len(rows))
+    print(f"✅ {len(rows)} assignments for {len(users_df) - skipped} users "
+          f"({args.mode}, K={args.per_user}) → {args.out}")
+    if skipped:
+        print(f"   {skipped} users skipped (no questions for their database)")
+    if short:
+        print(f"   {short} users got fewer than K questions (database too small)")
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
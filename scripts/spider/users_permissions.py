@@ -5,10 +5,19 @@ Create four per-database roles and grant:
   • User_2  – ~50 % tables, all columns
   • User_3  – all tables, ~50 % columns in each
   • User_4  – ~50 % tables, ~50 % columns in those tables
+Set ROLES_FILE to a JSON role spec for any other number of roles / rules
+(see common/roles.py).
 Writes a CSV “user_permissions.csv” listing every object/column set granted.
 """
 
-import psycopg2, csv, traceback, random
+import psycopg2, csv, random, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.layout import PG_CORPUS_DB, SessionCache, consolidated, list_schemas, qualify, target
+from common.roles import RoleSpec, apply_grants, permission_rows
+
+METRICS = Metrics("spider_permissions")
 
 # ── Connection parameters ────────────────────────────────────────────────────
 PG_ADMIN_DB = os.getenv("PG_ADMIN_DB", "postgres")
@@ -17,102 +26,64 @@ PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
 PG_HOST     = os.getenv("PG_HOST", "localhost")
 PG_PORT     = int(os.getenv("PG_PORT", 5432))
 
-USER_LABELS = ["User_1", "User_2", "User_3", "User_4"]
+ROLES       = RoleSpec.load(min_count=0)   # $ROLES_FILE, default: the four roles above
 CSV_OUTPUT  = "user_permissions.csv"
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 def connect(dbname):
+    METRICS.inc("connection_opens", db=dbname)
     return psycopg2.connect(
         dbname=dbname, user=PG_USER, password=PG_PASSWORD,
         host=PG_HOST, port=PG_PORT
     )
 
 def get_databases():
+    if consolidated():  # schema layout: one schema per Spider DB
+        with connect(PG_CORPUS_DB) as c, c.cursor() as cur:
+            return list_schemas(cur)
     with connect(PG_ADMIN_DB) as c, c.cursor() as cur:
         cur.execute("SELECT datname FROM pg_database WHERE datistemplate = false;")
         return sorted(r[0] for r in cur.fetchall())
 
-def q(col):
-    """quote if needed"""
-    return f'"{col}"' if (not col.isidentifier() or "%" in col) else col
-
 # ── Main logic ───────────────────────────────────────────────────────────────
 def setup_permissions():
     rows = []
 
+    sessions = SessionCache(connect)
     for db in get_databases():
         print(f"\n🔍 Database: {db}")
-        with connect(db) as conn, conn.cursor() as cur:
-            conn.autocommit = True
+        pg_database, pg_schema = target(db)
+        if not consolidated():
+            sessions.close()              # previous DB's connection
+        conn = sessions.get(pg_database)  # one shared session in the schema layout
+        with conn.cursor() as cur, METRICS.timer("db_provision", db=db):
+            cur = METRICS.wrap_cursor(cur, db=db)
 
             # ── gather schema info
             cur.execute("""
                 SELECT table_name, column_name
                   FROM information_schema.columns
-                 WHERE table_schema='public'
+                 WHERE table_schema=%s
               ORDER BY table_name, ordinal_position;
-            """)
+            """, (pg_schema,))
             schema = {}
             for tbl, col in cur.fetchall():
                 schema.setdefault(tbl, []).append(col)
 
-            tables       = list(schema.keys())
-            random.shuffle(tables)                    # random split each run
-            half_tables  = tables[: len(tables)//2 ]
-
-            # ── per-role grants
-            for label in USER_LABELS:
-                role = f'{db}_{label}'
-                print(f"  • (re)creating role {role}")
-
-                try:
-                    cur.execute(f'DROP ROLE IF EXISTS "{role}";')
-                    cur.execute(f'CREATE ROLE "{role}" LOGIN PASSWORD %s;', ('pass123',))
-                    cur.execute(f'GRANT USAGE ON SCHEMA public TO "{role}";')
-                    cur.execute(f'REVOKE ALL PRIVILEGES ON ALL TABLES IN SCHEMA public FROM "{role}";')
-                except Exception as e:
-                    print("    ❌ role create error →", e)
-                    traceback.print_exc()
-                    continue
-
-                # ---- User_1 : everything --------------------------------------------------
-                if label == "User_1":
-                    cur.execute(f'GRANT SELECT ON ALL TABLES IN SCHEMA public TO "{role}";')
-                    for tbl, cols in schema.items():
-                        rows.append((db, role, tbl, ",".join(cols)))
-
-                # ---- User_2 : half the tables, all their cols ----------------------------
-                elif label == "User_2":
-                    for tbl in half_tables:
-                        cur.execute(f'GRANT SELECT ON "{tbl}" TO "{role}";')
-                        rows.append((db, role, tbl, ",".join(schema[tbl])))
-
-                # ---- User_3 : all tables, half the columns each --------------------------
-                elif label == "User_3":
-                    for tbl, cols in schema.items():
-                        allowed = cols[: len(cols)//2 ]
-                        if not allowed: continue
-                        col_list = ", ".join(q(c) for c in allowed)
-                        cur.execute(f'GRANT SELECT ({col_list}) ON "{tbl}" TO "{role}";')
-                        rows.append((db, role, tbl, ",".join(allowed)))
-
-                # ---- User_4 : half the tables, half the columns --------------------------
-                else:  # User_4
-                    for tbl in half_tables:
-                        cols = schema[tbl]
-                        allowed = cols[: len(cols)//2 ]
-                        if not allowed: continue
-                        col_list = ", ".join(q(c) for c in allowed)
-                        cur.execute(f'GRANT SELECT ({col_list}) ON "{tbl}" TO "{role}";')
-                        rows.append((db, role, tbl, ",".join(allowed)))
-
-    # ── tidy CSV output grouped by DB then User_1-4 order
-    def sort_key(r):
-        db, role, *_ = r
-        idx = next(i for i, lbl in enumerate(USER_LABELS) if role.endswith(lbl))
-        return (db, idx)
-
-    rows.sort(key=sort_key)
+            # ── roles and grants as one batch (one round trip per database)
+            assigned = ROLES.assign(schema, random)   # random split each run
+            print(f"  • (re)creating {len(assigned)} roles: {db}_{ROLES.names[0]} … {db}_{ROLES.names[-1]}")
+            applied, errors = apply_grants(cur, db, pg_schema, assigned, schema, qualify)
+            for role, err in errors:
+                print(f"    ❌ {role or 'grant batch'} →", err)
+                METRICS.inc("grant_failures", db=db)
+            rows.extend(permission_rows(db, applied))
+
+    sessions.close()
+
+    # ── tidy CSV output grouped by DB then role declaration order
+    rank = {name: i for i, name in enumerate(ROLES.names)}
+    rows.sort(key=lambda r: (r[0], rank[r[1][len(r[0]) + 1:]]))
 
     with open(CSV_OUTPUT, "w", newline="") as f:
         w = csv.writer(f)
@@ -120,6 +91,8 @@ def setup_permissions():
         w.writerows(rows)
 
     print(f"\n✅ Finished. Grants written to {CSV_OUTPUT}")
+    METRICS.inc("grant_rows", len(rows))
+    METRICS.report()
 
 # ── Run ──────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
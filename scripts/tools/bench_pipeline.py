@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark every pipeline stage against synthetic SQLite fixtures and a
+throwaway local Postgres cluster.
+
+Covered:
+  • bird/load_bird_to_postgres.py        migrate_one_sqlite            rows/s
+  • spider/load_spider_to_postgres.py    migrate_sqlite_to_postgres    rows/s
+  • bird/user_permissions_bird.py        setup_permissions             grants/s
+  • spider/users_permissions.py          setup_permissions             grants/s
+  • bird/dataset-groundtruth-bird.py     try_exec                      pairs/s
+  • spider/dataset-groundtruth.py        run_query_with_role           pairs/s
+  • bird/access-policies-per-db-bird.py  main                          dbs/s
+  • spider/access-policies-per-db.py     (module script)               grants/s
+  • bird/build_access_control_dataset_bitd.py  main                    pairs/s
+
+Each benchmark runs in its own child process so peak RSS is per stage.
+Results can be saved as a baseline and compared on later runs:
+
+    python bench_pipeline.py --save_baseline bench_baseline.json
+    python bench_pipeline.py --baseline bench_baseline.json --fail_on_regression
+
+Runs offline. Postgres-backed stages are skipped when initdb/pg_ctl are not
+installed; the file-only stages (Spider policy generator, BIRD builder) still run.
+"""
+
+import os, sys, csv, json, time, random, runpy, shutil, argparse, resource, tempfile, subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from common.local_pg import LocalPostgres, postgres_available
+from common.roles import RoleSpec, permission_rows
+from common.script_loader import load_script
+from common.synthetic import make_fixture_corpus, fixture_queries
+
+RESULT_MARK = "BENCH_RESULT "
+ROLES = RoleSpec.load()   # $ROLES_FILE, the same role set the pipeline uses
+ROLE_SUFFIXES = ROLES.names
+
+
+# ── Benchmarks (run inside the child process, cwd = bench workdir) ───────────
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _count_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return sum(1 for _ in csv.DictReader(f))
+
+
+def bench_bird_migrate(state):
+    mod = load_script("bird/load_bird_to_postgres.py")
+    dbs = state["bird"]
+    secs = _timed(lambda: [mod.migrate_one_sqlite(path) for _, path, _ in dbs])
+    return secs, state["rows_per_db"] * len(dbs), "rows"
+
+
+def bench_spider_migrate(state):
+    mod = load_script("spider/load_spider_to_postgres.py")
+    dbs = state["spider"]
+
+    def run():
+        for db_id, path, _ in dbs:
+            mod.create_postgres_database(db_id)
+            mod.migrate_sqlite_to_postgres(path, db_id)
+    return _timed(run), state["rows_per_db"] * len(dbs), "rows"
+
+
+def bench_bird_permissions(state):
+    mod = load_script("bird/user_permissions_bird.py")
+    secs = _timed(mod.setup_permissions)
+    return secs, _count_rows(mod.CSV_OUTPUT), "grants"
+
+
+def bench_spider_permissions(state):
+    mod = load_script("spider/users_permissions.py")
+    secs = _timed(mod.setup_permissions)
+    return secs, _count_rows(mod.CSV_OUTPUT), "grants"
+
+
+def bench_bird_try_exec(state):
+    mod = load_script("bird/dataset-groundtruth-bird.py")
+    pairs = 0
+
+    def run():
+        nonlocal pairs
+        for db_id, _, tables in state["bird"]:
+            for q in fixture_queries(tables):
+                wrapped = mod.wrap_select_limit1(mod.normalize_sql_for_postgres(q))
+                for suf in ROLE_SUFFIXES:
+                    mod.try_exec(db_id, f"{db_id}_{suf}", wrapped)
+                    pairs += 1
+    return _timed(run), pairs, "pairs"
+
+
+def bench_spider_run_query(state):
+    mod = load_script("spider/dataset-groundtruth.py")
+    pairs = 0
+
+    def run():
+        nonlocal pairs
+        for db_id, _, tables in state["spider"]:
+            conn = mod.connect_as_admin(db_id)
+            conn.autocommit = True
+            for q in fixture_queries(tables):
+                for suf in ROLE_SUFFIXES:
+                    mod.run_query_with_role(conn, q, f"{db_id}_{suf}")
+                    pairs += 1
+            conn.close()
+    return _timed(run), pairs, "pairs"
+
+
+def bench_bird_policies(state):
+    mod = load_script("bird/access-policies-per-db-bird.py")
+    if not os.path.isfile(mod.INPUT_CSV):
+        write_synthetic_permissions(mod.INPUT_CSV, state)
+    with open(mod.INPUT_CSV, newline="", encoding="utf-8") as f:
+        n_dbs = len({r["database"] for r in csv.DictReader(f)})
+    return _timed(mod.main), n_dbs, "dbs"
+
+
+def bench_spider_policies(state):
+    if not os.path.isfile("user_permissions.csv"):
+        write_synthetic_permissions("user_permissions.csv", state)
+    path = os.path.join(HERE, "..", "spider", "access-policies-per-db.py")
+    secs = _timed(lambda: runpy.run_path(path, run_name="__main__"))
+    return secs, _count_rows("user_permissions.csv"), "grants"
+
+
+def bench_bird_builder(state):
+    mod = load_script("bird/build_access_control_dataset_bitd.py")
+    n = write_synthetic_groundtruth("bench_ground_truth.csv", "bench_policies_full.csv", state)
+    argv = sys.argv
+    sys.argv = ["build", "--groundtruth", "bench_ground_truth.csv",
+                "--policies_full", "bench_policies_full.csv", "--out_jsonl", "bench_dataset.jsonl"]
+    try:
+        secs = _timed(mod.main)
+    finally:
+        sys.argv = argv
+    return secs, n, "pairs"
+
+
+# name → (function, needs_postgres); order matters (later stages use earlier state)
+BENCHES = [
+    ("bird_migrate_one_sqlite", bench_bird_migrate, True),
+    ("bird_setup_permissions", bench_bird_permissions, True),
+    ("bird_try_exec", bench_bird_try_exec, True),
+    ("bird_policy_generator", bench_bird_policies, True),
+    ("bird_dataset_builder", bench_bird_builder, False),
+    ("spider_migrate_sqlite_to_postgres", bench_spider_migrate, True),
+    ("spider_setup_permissions", bench_spider_permissions, True),
+    ("spider_run_query_with_role", bench_spider_run_query, True),
+    ("spider_policy_generator", bench_spider_policies, False),
+]
+
+
+# ── Synthetic CSV inputs for the file-only stages ────────────────────────────
+def write_synthetic_permissions(path, state):
+    cols = ["id", "name", "score", "created", "note"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["database", "user", "object", "accessible_columns"])
+        rnd = random.Random(1337)
+        for db_id, _, tables in state["bird"] + state["spider"]:
+            schema = {t: list(cols) for t in tables}
+            w.writerows(permission_rows(db_id, ROLES.assign(schema, rnd, tables=sorted(schema))))
+
+
+def write_synthetic_groundtruth(gt_path, pol_path, state, repeat=50):
+    fields = ["split", "db_id", "qid", "dbname", "role", "permit", "sqlstate", "error",
+              "question", "sql_original", "sql_wrapped", "evidence"]
+    n = 0
+    with open(gt_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        for rep in range(repeat):
+            for db_id, _, tables in state["bird"]:
+                for qi, q in enumerate(fixture_queries(tables)):
+                    for k, suf in enumerate(ROLE_SUFFIXES):
+                        permit = (qi + k) % 2
+                        w.writerow({
+                            "split": "train", "db_id": db_id, "qid": f"{rep}_{qi}", "dbname": db_id,
+                            "role": f"{db_id}_{suf}", "permit": permit,
+                            "sqlstate": "" if permit else "42501",
+                            "error": "" if permit else "permission denied for table t0",
+                            "question": f"synthetic question {qi}", "sql_original": q,
+                            "sql_wrapped": f"WITH __q AS (\n{q}\n) SELECT * FROM __q LIMIT 1;",
+                            "evidence": "",
+                        })
+                        n += 1
+    with open(pol_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["db_id", "access_policy_sql", "db_schema_ddl"])
+        w.writeheader()
+        for db_id, _, tables in state["bird"]:
+            ddl = "\n".join(f'CREATE TABLE "{t}" ("id" bigint, "name" text);' for t in tables)
+            w.writerow({"db_id": db_id, "access_policy_sql": "GRANT ..." * 200, "db_schema_ddl": ddl * 20})
+    return n
+
+
+# ── Child entry point ────────────────────────────────────────────────────────
+def run_child(name, state_path):
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    fn = next(fn for n, fn, _ in BENCHES if n == name)
+    secs, units, unit = fn(state)
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(RESULT_MARK + json.dumps({
+        "bench": name, "seconds": round(secs, 4), "units": units, "unit": unit,
+        "rate": round(units / secs, 2) if secs > 0 else None,
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+    }))
+
+
+# ── Parent: set up fixtures + cluster, run children, compare ─────────────────
+def run_bench(name, workdir, state_path, env, verbose):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--_child", name, "--_state", state_path],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    if verbose:
+        sys.stdout.write(proc.stdout)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_MARK):
+            return json.loads(line[len(RESULT_MARK):])
+    tail = (proc.stderr or proc.stdout).strip().splitlines()[-5:]
+    return {"bench": name, "error": " | ".join(tail) or f"exit {proc.returncode}"}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'bench':36} {'rate':>12} {'unit':>7} {'secs':>8} {'peakMB':>8} {'vs base':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['bench']:36} {'ERROR':>12}  {r['error'][:80]}")
+            continue
+        if r.get("skipped"):
+            print(f"{r['bench']:36} {'skipped':>12}  ({r['skipped']})")
+            continue
+        base = (baseline or {}).get(r["bench"])
+        delta = ""
+        if base and base.get("rate") and r.get("rate"):
+            ratio = r["rate"] / base["rate"]
+            delta = f"{(ratio - 1) * 100:+.1f}%"
+            if ratio < 1 - tolerance:
+                regressions.append(r["bench"])
+                delta += " ❌"
+        print(f"{r['bench']:36} {r['rate'] or 0:12,.1f} {r['unit'] + '/s':>7} "
+              f"{r['seconds']:8.2f} {r['peak_rss_mb']:8.1f} {delta:>9}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic fixtures.")
+    ap.add_argument("--dbs", type=int, default=2, help="Fixture databases per dataset.")
+    ap.add_argument("--tables", type=int, default=4)
+    ap.add_argument("--rows", type=int, default=5000, help="Rows per table.")
+    ap.add_argument("--only", nargs="*", default=None, help="Subset of benchmark names.")
+    ap.add_argument("--baseline", default=None, help="Compare against this baseline JSON.")
+    ap.add_argument("--save_baseline", default=None, help="Write results as a new baseline JSON.")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="Allowed throughput drop (fraction).")
+    ap.add_argument("--fail_on_regression", action="store_true")
+    ap.add_argument("--out", default=None, help="Also write raw results to this JSON file.")
+    ap.add_argument("--verbose", action="store_true", help="Show the scripts' own output.")
+    ap.add_argument("--keep", action="store_true", help="Keep the fixture/work directory.")
+    ap.add_argument("--_child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--_state", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args._child:
+        run_child(args._child, args._state)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="acl-bench-")
+    state = {
+        "bird": make_fixture_corpus(os.path.join(workdir, "bird"), "bench_bird",
+                                    args.dbs, args.tables, args.rows, seed=1),
+        "spider": make_fixture_corpus(os.path.join(workdir, "spider"), "bench_spider",
+                                      args.dbs, args.tables, args.rows, seed=2),
+        "rows_per_db": args.tables * args.rows,
+    }
+    state_path = os.path.join(workdir, "state.json")
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    print(f"📦 Fixtures: {args.dbs}×2 databases, {args.tables} tables × {args.rows} rows → {workdir}")
+
+    pg = None
+    env = dict(os.environ)
+    if postgres_available():
+        try:
+            pg = LocalPostgres().start()
+            env.update(pg.env())
+            print(f"🐘 Local Postgres on port {pg.port} ({pg.root})")
+        except Exception as e:
+            print(f"⚠️  Could not start local Postgres: {e}")
+    else:
+        print("⚠️  initdb/pg_ctl not found → Postgres-backed benchmarks are skipped")
+
+    results = []
+    try:
+        for name, _, needs_pg in BENCHES:
+            if args.only and name not in args.only:
+                continue
+            if needs_pg and pg is None:
+                results.append({"bench": name, "skipped": "no local Postgres"})
+                continue
+            print(f"⏱️  {name} …")
+            results.append(run_bench(name, workdir, state_path, env, args.verbose))
+    finally:
+        if pg is not None:
+            pg.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.baseline and os.path.isfile(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    regressions = compare(results, baseline, args.tolerance)
+
+    ok = {r["bench"]: r for r in results if "rate" in r}
+    meta = {"dbs": args.dbs, "tables": args.tables, "rows": args.rows, "created": time.time()}
+    for path in filter(None, [args.save_baseline, args.out]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": ok}, f, indent=1)
+        print(f"💾 Wrote {path}")
+
+    if regressions:
+        print(f"\n❌ Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Build the query → table/column dependency index (common/deps_index.py) for a
+BIRD or Spider corpus, from the pairs CSV and the SQLite source files.
+
+    python build_dependency_index.py --dataset bird --db_root ~/data/bird \\
+        --pairs questions_sqls.csv --out query_deps.sqlite
+
+Prints how many queries resolved, how many failed to compile in SQLite, and
+how many schema columns no query reads.
+"""
+
+import os, sys, sqlite3, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.deps_index import DependencyIndex, table_columns
+from common.metrics import Metrics
+from common.sqlite_acl import find_sqlite_files, read_pairs
+from common.sqlite_reader import read_only_uri
+
+METRICS = Metrics("dependency_index")
+
+DEFAULT_PAIRS = {"bird": "questions_sqls.csv", "spider": "spider_nl_sql_pairs.csv"}
+DEFAULT_ROOT = {"bird": os.getenv("BIRD_DB_ROOT", ""), "spider": os.getenv("SPIDER_DB_PATH", "")}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Index which tables/columns every gold SQL reads.")
+    ap.add_argument("--dataset", choices=["bird", "spider"], default="bird")
+    ap.add_argument("--pairs", default=None)
+    ap.add_argument("--db_root", default=None, help="Folder holding the SQLite files (searched recursively)")
+    ap.add_argument("--out", default="query_deps.sqlite")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    pairs_path = args.pairs or DEFAULT_PAIRS[args.dataset]
+    db_root = os.path.expanduser(args.db_root or DEFAULT_ROOT[args.dataset])
+    if not os.path.isfile(pairs_path):
+        raise SystemExit(f"❌ Missing {pairs_path}")
+    if not db_root or not os.path.isdir(db_root):
+        raise SystemExit("❌ --db_root must point at the SQLite databases folder")
+
+    with METRICS.timer("load_inputs"):
+        pairs = read_pairs(pairs_path, args.dataset)
+        files = find_sqlite_files(db_root)
+    # query id: BIRD qid, Spider row number (see read_pairs)
+    queries = [(db_id, key[1] if args.dataset == "bird" else key[0], sql_text)
+               for key, db_id, sql_text, _ in pairs]
+
+    with METRICS.timer("build"):
+        idx = DependencyIndex.build(queries, files, workers=args.workers)
+    with METRICS.timer("save"):
+        idx.save(args.out)
+
+    unused = 0
+    with METRICS.timer("unused_columns"):
+        for db in {q[0] for q in idx.query_objs}:
+            if db not in files:
+                continue
+            conn = sqlite3.connect(read_only_uri(files[db]), uri=True)
+            try:
+                unused += len(idx.unused_columns(db, table_columns(conn)))
+            finally:
+                conn.close()
+
+    METRICS.inc("queries_indexed", len(idx.query_objs))
+    METRICS.inc("queries_failed", len(idx.errors))
+    METRICS.inc("objects", len(idx.objects))
+    if len(idx.query_objs) < len(queries):
+        print(f"⚠️  {len(queries) - len(idx.query_objs):,} duplicate (db_id, qid) key(s); last one kept")
+    print(f"✅ Wrote {args.out} ({os.path.getsize(args.out) / 1024:,.1f} KiB)")
+    print(f"ℹ️ {len(idx.query_objs):,} queries, {len(idx.errors):,} not compilable in SQLite, "
+          f"{len(idx.objects):,} objects, {unused:,} schema column(s) never read")
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compile user_permissions*.csv into the bitmap privilege model
+(common/privileges.py) and write it as a compact .npz next to the dataset.
+
+    python compile_privileges.py --perms user_permissions_bird.csv
+    → user_permissions_bird.npz
+
+Prints the model size and, per corpus, how many roles share identical grants
+(e.g. User_1 and User_2 on a one-table database).
+"""
+
+import os, sys, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.privileges import PrivilegeModel
+
+METRICS = Metrics("compile_privileges")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compile permission CSVs into per-role column bitmaps.")
+    ap.add_argument("--perms", default="user_permissions_bird.csv")
+    ap.add_argument("--out", default=None, help="Defaults to the CSV path with a .npz suffix")
+    args = ap.parse_args()
+
+    if not os.path.isfile(args.perms):
+        raise SystemExit(f"❌ Missing {args.perms}")
+    out = args.out or os.path.splitext(args.perms)[0] + ".npz"
+
+    with METRICS.timer("compile"):
+        model = PrivilegeModel.from_permissions_csv(args.perms)
+    with METRICS.timer("save"):
+        model.save(out)
+
+    n_cols = sum(len(db.columns) for db in model)
+    n_roles = len(model.role_db)
+    duplicated = sum(len(g) - 1 for db in model for g in db.equivalence_classes())
+    METRICS.inc("databases", len(model.dbs))
+    METRICS.inc("roles", n_roles)
+    METRICS.inc("columns", n_cols)
+    print(f"✅ Wrote {out} ({os.path.getsize(out) / 1024:,.1f} KiB)")
+    print(f"ℹ️ {len(model.dbs):,} databases, {n_roles:,} roles, {n_cols:,} columns; "
+          f"{duplicated:,} role(s) duplicate another role's grants")
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
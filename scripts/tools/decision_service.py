@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local policy-decision service: "would this SQL be permitted for this role on
+this database?", answered from warm state over HTTP or a Unix socket.
+
+    python decision_service.py --backend sqlite --dataset bird \\
+        --db_root ~/data/bird --perms user_permissions_bird.csv --port 8765
+    python decision_service.py --backend postgres --dataset bird \\
+        --perms user_permissions_bird.csv --socket /tmp/acl_decisions.sock
+
+Backends:
+  sqlite    static check on the SQLite source files (common/sqlite_acl.py):
+            one read-only connection per database, grants from --perms
+  postgres  executes under SET ROLE like dataset-groundtruth-bird.py, on a
+            pool of warm autocommit sessions per Postgres database
+            (PG_* env vars, PG_LAYOUT)
+
+API (JSON, HTTP/1.1 keep-alive):
+  POST /decide   {"requests": [{"db_id": "...", "role": "User_2", "sql": "..."}, ...]}
+                 → {"results": [{"permit": true, "sqlstate": "", "error": "", "cached": false}, ...],
+                    "seconds": 0.0012}
+                 "role" is a suffix (User_2) or the full role name; a single
+                 request object without "requests" is accepted too.
+  POST /reload   re-read --perms and clear the decision cache (after a grant change)
+  GET  /healthz  backend, open databases, cache size
+  GET  /metrics  Prometheus text: decision/batch latency, decisions, cache hits
+
+Statements that are not a plain SELECT are answered like the labeller does
+(permit=false, sqlstate SKIP) and never executed. Decisions are memoised per
+(database, role, grant fingerprint, SQL) in an LRU (--cache_size); timeouts
+and connection failures are not cached.
+
+    curl -s localhost:8765/decide -d '{"requests": [{"db_id": "california_schools",
+        "role": "User_3", "sql": "SELECT COUNT(*) FROM frpm"}]}'
+"""
+
+import os, sys, json, time, queue, signal, argparse, threading, socketserver
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2
+from psycopg2 import sql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.label_cache import grant_fingerprints, is_cacheable
+from common.layout import consolidated, target
+from common.metrics import Metrics
+from common.script_loader import load_script
+from common.sql_translate import translate
+from common.sqlite_acl import SQLiteLabeller, find_sqlite_files, load_role_grants
+
+METRICS = Metrics("decision_service")
+
+# the BIRD labeller's SELECT-only rule, Postgres normalisation and LIMIT 1 wrapper
+GT = load_script("bird/dataset-groundtruth-bird.py")
+
+PG_USER = os.getenv("PG_USER", "username")
+PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
+PG_HOST = os.getenv("PG_HOST", "localhost")
+DEFAULT_PORTS = {"bird": 5433, "spider": 5432}
+
+SESSION_SETUP = ("SET statement_timeout = '15s'; SET lock_timeout = '5s'; "
+                 "SET idle_in_transaction_session_timeout = '10s';")
+
+
+def role_name(dataset, db_id, role):
+    """Suffix → <db>_<suffix>, with the db casing the permission scripts use."""
+    prefix = (db_id.lower() if dataset == "bird" else db_id) + "_"
+    return role if role.lower().startswith(prefix.lower()) else prefix + role
+
+
+class DecisionCache:
+    """Thread-safe LRU of (permit, sqlstate, error) decisions."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            hit = self.items.get(key)
+            if hit is not None:
+                self.items.move_to_end(key)
+            return hit
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+
+# ── Backends: decide(db_id, [(role, sql)]) → [(permit, sqlstate, error)] ─────
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, db_root, perms):
+        self.files = find_sqlite_files(db_root)
+        self.perms = perms
+        self.grants = {}
+        self.labellers = {}   # db (lower) → (lock, SQLiteLabeller)
+        self.lock = threading.Lock()
+
+    def reload(self):
+        grants = load_role_grants(self.perms)
+        with self.lock:
+            self.grants = grants
+            for lk, labeller in self.labellers.values():
+                with lk:
+                    labeller.role_grants = grants
+
+    def _labeller(self, db):
+        with self.lock:
+            entry = self.labellers.get(db)
+            if entry is None and db in self.files:
+                entry = self.labellers[db] = (threading.Lock(), SQLiteLabeller(self.files[db], self.grants, shared=True))
+                METRICS.inc("sessions_opened", backend=self.name, db=db)
+            return entry
+
+    def decide(self, db_id, items):
+        entry = self._labeller(db_id.lower())
+        if entry is None:
+            return [(False, "3D000", f'no SQLite file for database "{db_id}"')] * len(items)
+        lk, labeller = entry
+        out = []
+        with lk:
+            for role, sql_text in items:
+                t0 = time.perf_counter()
+                out.append(labeller.label(role, sql_text))
+                METRICS.observe("decision_latency", time.perf_counter() - t0, backend=self.name)
+        return out
+
+    def open_databases(self):
+        return len(self.labellers)
+
+    def close(self):
+        with self.lock:
+            for _, labeller in self.labellers.values():
+                labeller.close()
+            self.labellers.clear()
+
+
+class PostgresBackend:
+    name = "postgres"
+
+    def __init__(self, dataset, port):
+        self.dataset = dataset
+        self.port = port
+        self.pools = {}   # Postgres database → LifoQueue of idle sessions
+        self.lock = threading.Lock()
+
+    def reload(self):
+        pass   # grants live in Postgres
+
+    def connect(self, pg_db):
+        METRICS.inc("connection_opens", db=pg_db)
+        conn = psycopg2.connect(dbname=pg_db, user=PG_USER, password=PG_PASSWORD, host=PG_HOST, port=self.port)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(SESSION_SETUP)
+        return conn
+
+    def _pool(self, pg_db):
+        with self.lock:
+            return self.pools.setdefault(pg_db, queue.LifoQueue())
+
+    def _session(self, pg_db, schema):
+        try:
+            conn = self._pool(pg_db).get_nowait()
+        except queue.Empty:
+            conn = self.connect(pg_db)
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("SET search_path TO {}").format(sql.Identifier(schema)))
+        return conn
+
+    def prepare(self, sql_text):
+        if self.dataset == "bird":
+            return GT.wrap_select_limit1(GT.normalize_sql_for_postgres(sql_text))
+        return translate(sql_text)[0]
+
+    def decide(self, db_id, items):
+        pg_db, schema = target(db_id)
+        if self.dataset == "spider" and not consolidated():
+            pg_db = db_id   # Spider databases keep their db_id casing
+        out, conn = [], None
+        for role, sql_text in items:
+            t0 = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = self._session(pg_db, schema)
+                with conn.cursor() as cur:
+                    try:
+                        cur.execute(sql.SQL("SET ROLE {}").format(sql.Identifier(role)))
+                        cur.execute(self.prepare(sql_text))
+                        res = (True, "", "")
+                    except psycopg2.Error as e:
+                        if conn.closed:
+                            raise
+                        res = (False, e.pgcode or "", str(e).replace("\n", " ")[:400])
+                    cur.execute("RESET ROLE;")
+            except Exception as e:
+                # lost session: answer this item with the error, reconnect for the next one
+                res = (False, getattr(e, "pgcode", "") or "08006", str(e).replace("\n", " ")[:400])
+                METRICS.inc("session_failures", db=db_id)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+            METRICS.observe("decision_latency", time.perf_counter() - t0, backend=self.name)
+            if res[1]:
+                METRICS.sqlstate(res[1], backend=self.name)
+            out.append(res)
+        if conn is not None:
+            self._pool(pg_db).put(conn)
+        return out
+
+    def open_databases(self):
+        return len(self.pools)
+
+    def close(self):
+        with self.lock:
+            for pool in self.pools.values():
+                while not pool.empty():
+                    pool.get_nowait().close()
+            self.pools.clear()
+
+
+# ── Service ──────────────────────────────────────────────────────────────────
+class DecisionService:
+    def __init__(self, backend, dataset, perms, cache_size, workers):
+        self.backend = backend
+        self.dataset = dataset
+        self.perms = perms
+        self.cache = DecisionCache(cache_size)
+        self.fps = {}
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.reload()
+
+    def reload(self):
+        if self.perms:
+            self.fps = {r.lower(): fp for r, fp in grant_fingerprints(self.perms).items()}
+        self.backend.reload()
+        self.cache.clear()
+        METRICS.inc("reloads")
+
+    def _run_db(self, db_id, entries):
+        with METRICS.timer("db_batch", backend=self.backend.name):
+            return self.backend.decide(db_id, [(role, sql_text) for _, role, sql_text, _ in entries])
+
+    def decide(self, requests):
+        results = [None] * len(requests)
+        by_db = {}
+        for i, r in enumerate(requests):
+            db_id = str(r.get("db_id") or "").strip()
+            role = str(r.get("role") or "").strip()
+            sql_text = str(r.get("sql") or "").strip()
+            if not db_id or not role or not sql_text:
+                results[i] = (False, "22023", "db_id, role and sql are required", False)
+                continue
+            if GT.is_mutating(sql_text) or not GT.is_select(sql_text):
+                results[i] = (False, "SKIP", "mutating_or_nonselect_sql", False)
+                continue
+            role = role_name(self.dataset, db_id, role)
+            key = (db_id.lower(), role.lower(), self.fps.get(role.lower(), ""), sql_text)
+            hit = self.cache.get(key)
+            if hit is not None:
+                results[i] = hit + (True,)
+                METRICS.inc("cache_hits")
+                continue
+            by_db.setdefault(db_id, []).append((i, role, sql_text, key))
+
+        futs = {self.pool.submit(self._run_db, db_id, entries): entries for db_id, entries in by_db.items()}
+        for f, entries in futs.items():
+            for (i, _, _, key), res in zip(entries, f.result()):
+                if is_cacheable(res[0], res[1]):
+                    self.cache.put(key, res)
+                results[i] = res + (False,)
+
+        for permitted, code, _, cached in results:
+            METRICS.inc("decisions", decision="PERMIT" if permitted else "DENY", cached=cached)
+        return [{"permit": p, "sqlstate": c, "error": "" if p else m, "cached": h} for p, c, m, h in results]
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.backend.close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive: a client reuses one connection
+    service = None
+
+    def _send(self, status, body, ctype="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            s = self.service
+            self._send(200, {"backend": s.backend.name, "dataset": s.dataset,
+                             "open_databases": s.backend.open_databases(), "cached_decisions": len(s.cache)})
+        elif self.path == "/metrics":
+            self._send(200, METRICS.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/reload":
+            self.service.reload()
+            self._send(200, {"reloaded": True})
+            return
+        if self.path != "/decide":
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+        t0 = time.perf_counter()
+        try:
+            payload = json.loads(body or b"{}")
+            requests = payload["requests"] if isinstance(payload, dict) and "requests" in payload else [payload]
+            if not all(isinstance(r, dict) for r in requests):
+                raise ValueError("each request must be an object")
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": f"bad request: {e}"})
+            return
+        results = self.service.decide(requests)
+        secs = time.perf_counter() - t0
+        METRICS.observe("batch_latency", secs, backend=self.service.backend.name)
+        METRICS.inc("batches")
+        self._send(200, {"results": results, "seconds": round(secs, 6)})
+
+    def log_message(self, *args):
+        pass   # thousands of requests per minute; /metrics has the numbers
+
+
+class TCPHandler(Handler):
+    disable_nagle_algorithm = True   # headers and body go out as separate writes
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve access-control decisions from warm state.")
+    ap.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    ap.add_argument("--dataset", choices=["bird", "spider"], default="bird")
+    ap.add_argument("--db_root", default=None, help="SQLite databases folder (sqlite backend)")
+    ap.add_argument("--perms", default=None, help="user_permissions*.csv (grants / cache fingerprints)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--socket", default=None, help="Serve on this Unix socket instead of TCP")
+    ap.add_argument("--cache_size", type=int, default=200000, help="Memoised decisions (0 disables)")
+    ap.add_argument("--workers", type=int, default=8, help="Databases of one batch decided in parallel")
+    args = ap.parse_args()
+
+    perms = args.perms or ("user_permissions_bird.csv" if args.dataset == "bird" else "user_permissions.csv")
+    if args.backend == "sqlite":
+        db_root = os.path.expanduser(args.db_root or os.getenv(
+            "BIRD_DB_ROOT" if args.dataset == "bird" else "SPIDER_DB_PATH", ""))
+        if not db_root or not os.path.isdir(db_root):
+            raise SystemExit("❌ --db_root must point at the SQLite databases folder")
+        if not os.path.isfile(perms):
+            raise SystemExit(f"❌ Missing {perms}")
+        backend = SQLiteBackend(db_root, perms)
+    else:
+        backend = PostgresBackend(args.dataset, int(os.getenv("PG_PORT", DEFAULT_PORTS[args.dataset])))
+        if not os.path.isfile(perms):
+            print(f"⚠️  {perms} not found → decisions are cached without grant fingerprints")
+            perms = None
+
+    service = DecisionService(backend, args.dataset, perms, args.cache_size, args.workers)
+    Handler.service = service
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, Handler)
+        where = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), TCPHandler)
+        server.daemon_threads = True
+        where = f"http://{args.host}:{args.port}"
+    signal.signal(signal.SIGTERM, _stop)   # shut down cleanly (and write metrics) on kill
+    print(f"🛡️  {backend.name} decisions for {args.dataset} on {where} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
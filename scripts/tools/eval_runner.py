@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Evaluate a model on a BIRD-AC style JSONL dataset (build_access_control_dataset_bitd.py
+output): for every record, ask whether `user` may run `sql` given `schema_ddl`
+and `policy_sql`, and score the PERMIT/DENY answer against `decision`.
+
+    python eval_runner.py --dataset bird_ac.jsonl --backend stub                 # local smoke test
+    python eval_runner.py --dataset bird_ac.jsonl --backend openai \\
+        --base_url http://gpu-box:8000/v1 --model my-model --concurrency 32 --out results.jsonl
+    python eval_runner.py --dataset bird_ac.jsonl --backend my_backend.py:MyBackend
+
+Prefix grouping. The prompt is a shared prefix (instructions, schema_ddl,
+policy_sql, user) and a per-record suffix (question, evidence, SQL). The
+first pass over the file only records byte offsets per (db_id, user). The
+second pass sends the groups one after another, in (db_id, user) order, so
+requests with the same prefix run back-to-back and the server's prefix/KV
+cache is reused. --prime holds back the rest of a group until its first request
+has finished. Use it for servers that only share a prefix after it has been
+computed once; it costs one round trip per group. --no_group keeps file
+order (baseline).
+
+Concurrency. --concurrency workers pull from a bounded queue (asyncio +
+aiohttp). Timeouts, 429 and 5xx are retried with backoff (--retries).
+
+Checkpointing. Each result is appended to --out as one JSON line, keyed on
+(split, db_id, user, qid, sql). A re-run skips keys already answered, so a
+killed run resumes where it stopped. Failed requests are recorded with
+"error" and retried on the next run. The summary (accuracy, confusion,
+cached-token share) covers the whole --out file.
+
+Backends:
+  openai   any OpenAI-compatible /chat/completions server (vLLM, SGLang,
+           llama.cpp, TGI, ...); --api_key or $EVAL_API_KEY
+  stub     tools/eval_stub_server.py started in-process (no model needed)
+  FILE:CLS a class with async open() / complete(prefix, suffix) / close();
+           complete returns a Completion
+"""
+
+import os, re, sys, json, time, random, asyncio, hashlib, argparse, importlib.util
+from collections import namedtuple
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.script_loader import load_script
+
+METRICS = Metrics("eval_runner")
+
+Completion = namedtuple("Completion", "text prompt_tokens cached_tokens")
+
+INSTRUCTIONS = (
+    "You are a database access-control checker. Given a PostgreSQL schema, the "
+    "GRANT statements that define each user's privileges, a user, and a SQL query, "
+    "decide whether that user is allowed to run the query. Answer with exactly one "
+    "word: PERMIT or DENY."
+)
+DECISION_RE = re.compile(r"\b(PERMIT|DENY)\b", re.IGNORECASE)
+
+
+class RetryableError(RuntimeError):
+    pass
+
+
+# ── Prompts ──────────────────────────────────────────────────────────────────
+def group_key(rec):
+    return (rec.get("db_id") or "", rec.get("user") or "")
+
+
+def record_key(rec):
+    parts = [rec.get(k) or "" for k in ("split", "db_id", "user", "qid", "sql")]
+    return hashlib.sha1("\x00".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def build_prompt(rec):
+    """(prefix, suffix): the prefix is identical for every record of a (db_id, user) group."""
+    prefix = (f"{INSTRUCTIONS}\n\n### Schema\n{rec.get('schema_ddl') or ''}\n\n"
+              f"### Access policy\n{rec.get('policy_sql') or ''}\n\n### User\n{rec.get('user') or ''}\n")
+    suffix = f"### Question\n{rec.get('question') or ''}\n"
+    if rec.get("evidence"):
+        suffix += f"\n### Evidence\n{rec['evidence']}\n"
+    suffix += f"\n### SQL\n{rec.get('sql') or ''}\n\nPERMIT or DENY?"
+    return prefix, suffix
+
+
+def parse_decision(text):
+    m = DECISION_RE.search(text or "")
+    return m.group(1).upper() if m else "UNPARSED"
+
+
+# ── Backends ─────────────────────────────────────────────────────────────────
+class OpenAIChatBackend:
+    """POST {base_url}/chat/completions with [system: prefix, user: suffix]."""
+
+    def __init__(self, args):
+        self.base_url = (args.base_url or "").rstrip("/")
+        self.model = args.model
+        self.api_key = args.api_key or os.getenv("EVAL_API_KEY", "")
+        self.max_tokens = args.max_tokens
+        self.timeout = aiohttp.ClientTimeout(total=args.timeout)
+        self.concurrency = args.concurrency
+        self.session = None
+
+    async def open(self):
+        if not self.base_url:
+            raise SystemExit("❌ --base_url is required for the openai backend")
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        self.session = aiohttp.ClientSession(
+            headers=headers, timeout=self.timeout,
+            connector=aiohttp.TCPConnector(limit=self.concurrency))   # one keep-alive connection per worker
+
+    async def complete(self, prefix, suffix):
+        body = {"model": self.model, "temperature": 0, "max_tokens": self.max_tokens,
+                "messages": [{"role": "system", "content": prefix}, {"role": "user", "content": suffix}]}
+        try:
+            async with self.session.post(f"{self.base_url}/chat/completions", json=body) as resp:
+                if resp.status == 429 or resp.status >= 500:
+                    raise RetryableError(f"HTTP {resp.status}")
+                if resp.status != 200:
+                    raise RuntimeError(f"HTTP {resp.status}: {(await resp.text())[:300]}")
+                data = await resp.json()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            raise RetryableError(f"{type(e).__name__}: {e}") from e
+        usage = data.get("usage") or {}
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        return Completion(data["choices"][0]["message"].get("content") or "",
+                          usage.get("prompt_tokens") or 0, cached)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class StubBackend(OpenAIChatBackend):
+    """OpenAIChatBackend against tools/eval_stub_server.py, started in this event loop."""
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.stub = load_script("tools/eval_stub_server.py")
+        self.server = self.stub.StubModel(args.stub_latency_ms, args.stub_ms_per_1k_tokens, args.stub_cache_tokens)
+        self.runner = None
+
+    async def open(self):
+        self.runner, self.base_url = await self.stub.start(self.server)
+        await super().open()
+
+    async def close(self):
+        await super().close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            print(f"🤖 stub: {json.dumps(self.server.stats)}")
+
+
+BACKENDS = {"openai": OpenAIChatBackend, "stub": StubBackend}
+
+
+def load_backend(spec, args):
+    if spec in BACKENDS:
+        return BACKENDS[spec](args)
+    path, _, cls = spec.rpartition(":")
+    if not path or not os.path.isfile(path):
+        raise SystemExit(f"❌ --backend must be one of {', '.join(BACKENDS)} or FILE.py:Class, got {spec!r}")
+    mod_spec = importlib.util.spec_from_file_location("eval_backend_plugin", path)
+    mod = importlib.util.module_from_spec(mod_spec)
+    mod_spec.loader.exec_module(mod)
+    return getattr(mod, cls)(args)
+
+
+# ── Checkpoint ───────────────────────────────────────────────────────────────
+def read_results(path):
+    """{key: result} of the answered records in a results file (later lines win)."""
+    done = {}
+    if not os.path.isfile(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue   # torn last line of a killed run
+            if "error" in r:
+                done.pop(r["key"], None)
+            else:
+                done[r["key"]] = r
+    return done
+
+
+class Checkpoint:
+    def __init__(self, path, fsync_every=100):
+        self.f = open(path, "a", encoding="utf-8")
+        self.fsync_every = fsync_every
+        self.n = 0
+
+    def write(self, result):
+        self.f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.n += 1
+        if self.n % self.fsync_every == 0:
+            os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+
+
+# ── Planning: offsets per group, nothing else kept in memory ────────────────
+def plan(dataset, done, grouped, limit=0):
+    """[(group, [byte offsets])] of the records still to answer, in send order."""
+    groups, order, n = {}, [], 0
+    with open(dataset, "rb") as f:
+        offset = 0
+        for line in f:
+            start, offset = offset, offset + len(line)
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if record_key(rec) in done:
+                continue
+            g = group_key(rec) if grouped else ("", "")
+            if g not in groups:
+                groups[g] = []
+                order.append(g)
+            groups[g].append(start)
+            n += 1
+            if limit and n >= limit:
+                break
+    if grouped:
+        order.sort()
+    return [(g, groups[g]) for g in order]
+
+
+# ── Run ──────────────────────────────────────────────────────────────────────
+async def ask(backend, rec, retries):
+    prefix, suffix = build_prompt(rec)
+    for attempt in range(retries + 1):
+        t0 = time.perf_counter()
+        try:
+            c = await backend.complete(prefix, suffix)
+            return c, time.perf_counter() - t0, attempt + 1
+        except RetryableError as e:
+            METRICS.inc("retries", reason=str(e)[:40])
+            if attempt == retries:
+                raise
+            await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+
+
+def result_row(rec, key):
+    return {"key": key, "split": rec.get("split", ""), "db_id": rec.get("db_id", ""),
+            "user": rec.get("user", ""), "qid": rec.get("qid", ""), "expected": rec.get("decision", "")}
+
+
+async def run(args, backend, todo, checkpoint):
+    queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    stats = {"ok": 0, "error": 0}
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            rec, primed = item
+            key = record_key(rec)
+            try:
+                c, seconds, attempts = await ask(backend, rec, args.retries)
+                pred = parse_decision(c.text)
+                row = {**result_row(rec, key), "predicted": pred, "correct": pred == rec.get("decision"),
+                       "answer": c.text[:200], "seconds": round(seconds, 4), "attempts": attempts,
+                       "prompt_tokens": c.prompt_tokens, "cached_tokens": c.cached_tokens}
+                METRICS.observe("request", seconds, backend=args.backend)
+                METRICS.inc("prompt_tokens", c.prompt_tokens)
+                METRICS.inc("cached_tokens", c.cached_tokens)
+                METRICS.inc("answers", predicted=pred)
+                stats["ok"] += 1
+            except Exception as e:
+                row = {**result_row(rec, key), "error": f"{type(e).__name__}: {e}"[:400]}
+                METRICS.inc("request_failures")
+                stats["error"] += 1
+            checkpoint.write(row)
+            if primed is not None:
+                primed.set()
+            done = stats["ok"] + stats["error"]
+            if done % args.progress_every == 0:
+                print(f"   …{done:,} answered ({done / max(1e-9, time.time() - METRICS.started):,.1f}/s)")
+
+    workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+    with open(args.dataset, "rb") as f:
+        for group, offsets in todo:
+            for i, off in enumerate(offsets):
+                f.seek(off)
+                rec = json.loads(f.readline())
+                if i == 0 and args.prime and not args.no_group and len(offsets) > 1:
+                    # first request of the group warms the prefix cache before the rest is sent
+                    primed = asyncio.Event()
+                    await queue.put((rec, primed))
+                    await primed.wait()
+                else:
+                    await queue.put((rec, None))
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    return stats
+
+
+def summarize(results):
+    n = len(results)
+    if not n:
+        return {"answered": 0}
+    correct = sum(1 for r in results.values() if r["correct"])
+    confusion = {}
+    for r in results.values():
+        k = f"{r['expected'] or '?'}→{r['predicted']}"
+        confusion[k] = confusion.get(k, 0) + 1
+    prompt = sum(r.get("prompt_tokens") or 0 for r in results.values())
+    cached = sum(r.get("cached_tokens") or 0 for r in results.values())
+    return {"answered": n, "accuracy": round(correct / n, 4), "confusion": dict(sorted(confusion.items())),
+            "prompt_tokens": prompt, "cached_share": round(cached / prompt, 4) if prompt else None}
+
+
+async def main_async(args):
+    done = read_results(args.out)
+    todo = plan(args.dataset, done, grouped=not args.no_group, limit=args.limit)
+    n = sum(len(o) for _, o in todo)
+    print(f"🧪 {n:,} record(s) to ask in {len(todo):,} group(s); {len(done):,} already in {args.out}")
+    if not n:
+        return
+    backend = load_backend(args.backend, args)
+    await backend.open()
+    checkpoint = Checkpoint(args.out)
+    try:
+        with METRICS.timer("run"):
+            stats = await run(args, backend, todo, checkpoint)
+    finally:
+        checkpoint.close()
+        await backend.close()
+    print(f"   {stats['ok']:,} answered, {stats['error']:,} failed (retried on the next run)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prefix-grouped, concurrent, resumable model evaluation.")
+    ap.add_argument("--dataset", required=True, help="JSONL from build_access_control_dataset_bitd.py")
+    ap.add_argument("--out", default="eval_results.jsonl", help="Checkpoint / results JSONL (appended)")
+    ap.add_argument("--backend", default="stub", help="openai | stub | FILE.py:Class")
+    ap.add_argument("--base_url", default=os.getenv("EVAL_BASE_URL", ""), help="e.g. http://localhost:8000/v1")
+    ap.add_argument("--model", default=os.getenv("EVAL_MODEL", "default"))
+    ap.add_argument("--api_key", default=None)
+    ap.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    ap.add_argument("--max_tokens", type=int, default=8)
+    ap.add_argument("--timeout", type=float, default=120.0, help="Seconds per request")
+    ap.add_argument("--retries", type=int, default=3)
+    ap.add_argument("--no_group", action="store_true", help="Send in file order (no prefix grouping)")
+    ap.add_argument("--prime", action="store_true",
+                    help="Send the first request of each group alone, then the rest")
+    ap.add_argument("--limit", type=int, default=0, help="Ask at most N records this run")
+    ap.add_argument("--progress_every", type=int, default=500)
+    ap.add_argument("--stub_latency_ms", type=float, default=20.0)
+    ap.add_argument("--stub_ms_per_1k_tokens", type=float, default=40.0)
+    ap.add_argument("--stub_cache_tokens", type=int, default=16384)
+    args = ap.parse_args()
+    if not os.path.isfile(args.dataset):
+        raise SystemExit(f"❌ Missing {args.dataset}")
+    args.concurrency = max(1, args.concurrency)
+
+    asyncio.run(main_async(args))
+    summary = summarize(read_results(args.out))
+    print(f"✅ {json.dumps(summary, ensure_ascii=False)}")
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stub model server for eval_runner.py: an OpenAI-compatible
+/v1/chat/completions endpoint with a simulated prefix cache. No model, no GPU,
+no network beyond localhost.
+
+    python eval_stub_server.py --port 8799 --latency_ms 20 --ms_per_1k_tokens 40
+    python eval_runner.py --dataset bird_ac.jsonl --backend openai --base_url http://127.0.0.1:8799/v1
+
+(eval_runner.py --backend stub starts it in-process on a free port.)
+
+Every request pays --latency_ms plus --ms_per_1k_tokens for each prompt token
+that is not in the cache. The cache keeps the most recently used prefixes
+(every message except the last) up to --cache_tokens in total. Like a server
+KV cache, it holds only a few long schema/policy contexts at a time. Responses report
+usage.prompt_tokens_details.cached_tokens like vLLM/OpenAI do. Tokens are
+estimated as characters / 4.
+
+The answer is "PERMIT" or "DENY", chosen from a hash of the prompt, so runs
+are reproducible. GET /stats returns request and cache counters.
+"""
+
+import asyncio, hashlib, argparse
+from collections import OrderedDict
+
+from aiohttp import web
+
+
+def tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StubModel:
+    def __init__(self, latency_ms=20.0, ms_per_1k_tokens=40.0, cache_tokens=16384):
+        self.latency = latency_ms / 1000
+        self.per_token = ms_per_1k_tokens / 1e6
+        self.cache_tokens = cache_tokens
+        self.cache = OrderedDict()   # prefix hash → tokens
+        self.cached = 0
+        self.stats = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "prefix_hits": 0}
+
+    def _lookup(self, prefix, n):
+        key = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return True
+        self.cache[key] = n
+        self.cached += n
+        while self.cached > self.cache_tokens and len(self.cache) > 1:
+            self.cached -= self.cache.popitem(last=False)[1]
+        return False
+
+    def answer(self, prompt):
+        return "PERMIT" if hashlib.sha1(prompt.encode("utf-8")).digest()[0] & 1 else "DENY"
+
+    async def complete(self, messages):
+        prefix = "".join(m.get("content") or "" for m in messages[:-1])
+        last = messages[-1].get("content") or ""
+        total = tokens(prefix) + tokens(last)
+        cached = tokens(prefix) if prefix and self._lookup(prefix, tokens(prefix)) else 0
+        self.stats["requests"] += 1
+        self.stats["prompt_tokens"] += total
+        self.stats["cached_tokens"] += cached
+        self.stats["prefix_hits"] += bool(cached)
+        await asyncio.sleep(self.latency + (total - cached) * self.per_token)
+        text = self.answer(prefix + last)
+        return {
+            "object": "chat.completion",
+            "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": total, "completion_tokens": 1, "total_tokens": total + 1,
+                      "prompt_tokens_details": {"cached_tokens": cached}},
+        }
+
+
+def make_app(model):
+    async def chat(request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        if not messages:
+            return web.json_response({"error": {"message": "messages is required"}}, status=400)
+        return web.json_response(await model.complete(messages))
+
+    async def stats(request):
+        return web.json_response(model.stats)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+async def start(model, host="127.0.0.1", port=0):
+    """Run the stub inside the caller's event loop → (runner, base_url)."""
+    runner = web.AppRunner(make_app(model), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}/v1"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="OpenAI-compatible stub model server with a prefix cache.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8799)
+    ap.add_argument("--latency_ms", type=float, default=20.0)
+    ap.add_argument("--ms_per_1k_tokens", type=float, default=40.0, help="Cost of uncached prompt tokens")
+    ap.add_argument("--cache_tokens", type=int, default=16384, help="Prefix cache capacity")
+    args = ap.parse_args()
+    model = StubModel(args.latency_ms, args.ms_per_1k_tokens, args.cache_tokens)
+    print(f"🤖 stub model on http://{args.host}:{args.port}/v1")
+    web.run_app(make_app(model), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generate a synthetic BIRD- and/or Spider-shaped corpus for scale testing.
+
+Output layout (directly consumable by the existing scripts):
+  <out>/bird/databases/<db>/<db>.sqlite     → BIRD_DB_ROOT for load_bird_to_postgres.py
+  <out>/bird/{train,dev}.json, train_gold.sql, dev.sql, dev_tied_append.json
+                                            → --bird_dir for extract-questions-SQLs-bird.py
+  <out>/spider/database/<db>/<db>.sqlite    → SPIDER_DB_PATH for load_spider_to_postgres.py
+  <out>/spider/train_spider.json, dev.json  → DATA_DIR for extract-questions-SQLs.py
+
+--scale multiplies the real corpus sizes (80 BIRD / 160 Spider databases), e.g.
+    python generate_synthetic_corpus.py --out /data/syn --scale 10 --workers 8
+Dirty values the loaders special-case ('0000-00-00', 'NULL' strings,
+integer-encoded dates, header-like first rows) are mixed in at --awkward_rate /
+--header_rate.
+"""
+
+import os, sys, json, time, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.synthetic import CorpusSpec, generate_corpus
+
+BIRD_DBS = 80
+SPIDER_DBS = 160
+
+
+def int_range(text):
+    """'3-8' → (3, 8); '5' → (5, 5)."""
+    lo, _, hi = text.partition("-")
+    return int(lo), int(hi or lo)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate synthetic SQLite corpora + question files.")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--dataset", choices=["bird", "spider", "both"], default="both")
+    ap.add_argument("--scale", type=float, default=1.0,
+                    help="Multiple of the real corpus size (80 BIRD / 160 Spider DBs).")
+    ap.add_argument("--dbs", type=int, default=None, help="Exact DB count (overrides --scale).")
+    ap.add_argument("--tables", type=int_range, default=(3, 8), help="Tables per DB, e.g. 3-8")
+    ap.add_argument("--cols", type=int_range, default=(3, 12), help="Columns per table, e.g. 3-12")
+    ap.add_argument("--rows", type=int_range, default=(100, 2000), help="Rows per table, e.g. 100-2000")
+    ap.add_argument("--text_width", type=int_range, default=(4, 24), help="Text value length range")
+    ap.add_argument("--questions_per_db", type=int, default=20)
+    ap.add_argument("--awkward_rate", type=float, default=0.02)
+    ap.add_argument("--header_rate", type=float, default=0.1)
+    ap.add_argument("--spaced_rate", type=float, default=0.15)
+    ap.add_argument("--types", default=None,
+                    help='JSON of declared type → weight, e.g. \'{"INTEGER": 3, "TEXT": 1}\'')
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    datasets = ["bird", "spider"] if args.dataset == "both" else [args.dataset]
+    type_weights = json.loads(args.types) if args.types else None
+
+    for style in datasets:
+        base = BIRD_DBS if style == "bird" else SPIDER_DBS
+        spec = CorpusSpec(
+            n_dbs=args.dbs or max(1, int(round(base * args.scale))),
+            tables=args.tables, cols=args.cols, rows=args.rows, text_width=args.text_width,
+            questions_per_db=args.questions_per_db, awkward_rate=args.awkward_rate,
+            header_rate=args.header_rate, spaced_rate=args.spaced_rate,
+            type_weights=type_weights, seed=args.seed,
+        )
+        root = os.path.join(args.out, style)
+        print(f"🧪 Generating {spec.n_dbs} {style} database(s) → {root}")
+        t0 = time.time()
+        n_dbs, n_q = generate_corpus(root, spec, style, workers=args.workers)
+        size = sum(
+            os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(root) for f in fs
+        )
+        print(f"✅ {style}: {n_dbs} DBs, {n_q} questions, {size / 2**20:,.1f} MiB "
+              f"in {time.time() - t0:,.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ground-truth labelling spread over several hosts (or Postgres replicas) via a
+leased work queue on a shared directory (common/work_queue.py).
+
+    # once: split the pairs into chunks
+    python label_queue.py init --dataset bird --queue /mnt/shared/gtq --pairs questions_sqls.csv
+
+    # on every host with a replica of the migrated databases (any number of workers each)
+    PG_HOST=localhost PG_PORT=5433 python label_queue.py work --queue /mnt/shared/gtq
+    python label_queue.py work --queue /mnt/shared/gtq --pg_port 5434 --worker replica2
+
+    python label_queue.py status --queue /mnt/shared/gtq
+    python label_queue.py merge --queue /mnt/shared/gtq --out ground_truth.csv --jsonl ground_truth.jsonl
+
+Workers label exactly like dataset-groundtruth-bird.py / dataset-groundtruth.py
+(same functions, same per-host label cache). Each chunk is a run of
+consecutive pairs of one database. A worker renews its lease in the
+background while it labels, and writes one shard per chunk. Chunks of a
+worker that died are picked up again once their lease runs out (--lease).
+`reset` hands back every leased chunk straight away.
+
+merge writes the rows in input order, whatever worker produced them. For the
+same replicas the output is the same as a single-process run. Throughput
+grows with the number of workers until the replicas are saturated: each
+claim is one short write to the queue file.
+"""
+
+import os, sys, csv, json, time, socket, hashlib, argparse, threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.script_loader import load_script
+from common.work_queue import LeaseLost, WorkQueue
+
+METRICS = Metrics("label_queue")
+
+SCRIPTS = {"bird": "bird/dataset-groundtruth-bird.py", "spider": "spider/dataset-groundtruth.py"}
+
+
+def sha256_file(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_atomic(path, write):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+# ── Labellers: one pair in, its output rows out ──────────────────────────────
+class BirdLabeller:
+    def __init__(self):
+        self.mod = load_script(SCRIPTS["bird"])
+        self.cache, self.grant_fps = self.mod.open_label_cache(self.mod.LABEL_CACHE, self.mod.PERMS_CSV)
+
+    def label(self, item):
+        return self.mod.label_pair(item, self.cache, self.grant_fps)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+        self.mod.SESSIONS.close()
+
+
+class SpiderLabeller:
+    def __init__(self):
+        self.mod = load_script(SCRIPTS["spider"])
+        self.conn, self.current = None, None
+
+    def label(self, item):
+        r = dict(item)
+        if self.current != r["db_id"]:
+            try:
+                self.conn = self.mod.open_db_session(r["db_id"], self.conn)
+            except self.mod.OperationalError as e:
+                self.current = None
+                return [self.mod.connect_error_row(r, e)]
+            self.current = r["db_id"]
+        return [self.mod.label_row(self.conn, r)]
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+
+
+class Renewer(threading.Thread):
+    """Renews a chunk's lease every lease/3 s on its own queue connection."""
+
+    def __init__(self, qdir, chunk, lease):
+        super().__init__(daemon=True)
+        self.qdir, self.chunk, self.lease = qdir, chunk, lease
+        self.stop = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        q = WorkQueue(self.qdir)
+        try:
+            while not self.stop.wait(self.lease / 3):
+                try:
+                    ok = q.renew(self.chunk, self.lease)
+                except Exception as e:   # queue file busy / share hiccup: retry next round
+                    METRICS.inc("renew_errors")
+                    print(f"⚠️  renew chunk {self.chunk.id}: {e}")
+                    continue
+                if not ok:
+                    self.lost.set()
+                    return
+                METRICS.inc("lease_renewals")
+        finally:
+            q.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.join()
+
+
+# ── Commands ─────────────────────────────────────────────────────────────────
+def cmd_init(args):
+    if args.dataset == "bird":
+        mod = load_script(SCRIPTS["bird"])
+        pairs = args.pairs or mod.PAIRS_CSV
+        fields = mod.OUT_FIELDS
+    else:
+        mod = load_script(SCRIPTS["spider"])
+        pairs = args.pairs or mod.INPUT_CSV
+    if not os.path.isfile(pairs):
+        raise SystemExit(f"❌ Missing {pairs}")
+    with open(pairs, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        items = list(reader)
+    if args.dataset == "spider":
+        fields = reader.fieldnames + [f"{s}_result" for s in mod.ROLE_SUFFIXES]
+
+    meta = {"dataset": args.dataset, "fields": fields, "pairs": os.path.abspath(pairs),
+            "pairs_sha256": sha256_file(pairs), "roles": list(mod.ROLE_SUFFIXES)}
+    q = WorkQueue.create(args.queue, items, args.chunk_size,
+                         group=lambda it: (it.get("db_id") or "").strip().lower(), meta=meta)
+    st = q.status()
+    q.close()
+    print(f"🧺 {len(items):,} pair(s) in {st['todo'][0]:,} chunk(s) → {args.queue}")
+
+
+def cmd_work(args):
+    # before the labeller module reads its connection settings
+    if args.pg_host:
+        os.environ["PG_HOST"] = args.pg_host
+    if args.pg_port:
+        os.environ["PG_PORT"] = str(args.pg_port)
+
+    q = WorkQueue(args.queue)
+    meta = q.meta()
+    labeller = BirdLabeller() if meta["dataset"] == "bird" else SpiderLabeller()
+    worker = args.worker or f"{socket.gethostname()}-{os.getpid()}"
+    done, chunk = 0, None
+    print(f"👷 {worker}: {meta['dataset']} queue {args.queue}, "
+          f"Postgres {os.getenv('PG_HOST', 'localhost')}:{os.getenv('PG_PORT', 'default')}")
+    try:
+        while not args.max_chunks or done < args.max_chunks:
+            chunk = q.claim(worker, args.lease)
+            if chunk is None:
+                if args.wait and q.pending():
+                    time.sleep(min(30.0, args.lease / 10))   # others still hold leases
+                    continue
+                break
+            t0 = time.perf_counter()
+            rows = []
+            with Renewer(args.queue, chunk, args.lease) as renewer:
+                for item in q.items(chunk):
+                    if renewer.lost.is_set():
+                        break
+                    rows.extend(labeller.label(item))
+            seconds = time.perf_counter() - t0
+            try:
+                if renewer.lost.is_set():
+                    raise LeaseLost(f"chunk {chunk.id}: lease lost while labelling")
+                q.complete(chunk, rows, seconds)
+            except LeaseLost as e:
+                METRICS.inc("leases_lost")
+                print(f"⚠️  {e}; another worker has it")
+                continue
+            done += 1
+            METRICS.observe("chunk_label", seconds, worker=worker)
+            METRICS.inc("chunks_done", worker=worker)
+            METRICS.inc("rows_written", len(rows), worker=worker)
+            print(f"   chunk {chunk.id} ({chunk.group}, {chunk.last - chunk.first + 1} pair(s)) "
+                  f"in {seconds:,.1f}s")
+    except KeyboardInterrupt:
+        if chunk is not None:
+            q.release(chunk)
+        raise
+    finally:
+        labeller.close()
+        METRICS.merge(labeller.mod.METRICS.drain())
+        q.close()
+    print(f"✅ {worker}: {done} chunk(s) done")
+    METRICS.report()
+
+
+def cmd_status(args):
+    q = WorkQueue(args.queue)
+    st, meta = q.status(), q.meta()
+    q.close()
+    owners = st.pop("owners")
+    total = sum(n for n, _ in st.values())
+    print(f"🧺 {meta['dataset']}: {meta['items']:,} pair(s), {total:,} chunk(s)")
+    for state in ("done", "leased", "expired", "todo"):
+        n, items = st.get(state, (0, 0))
+        print(f"   {state:<8} {n:>7,} chunk(s) {items:>9,} pair(s)")
+    for owner, n in owners.items():
+        print(f"   {owner:<30} {n:>7,} chunk(s) done")
+
+
+def cmd_reset(args):
+    q = WorkQueue(args.queue)
+    n = q.reset()
+    q.close()
+    print(f"♻️  {n} leased chunk(s) back to todo")
+
+
+def cmd_merge(args):
+    q = WorkQueue(args.queue)
+    fields = q.meta()["fields"]
+    try:
+        rows = list(q.merged_rows(allow_partial=args.partial))
+    except RuntimeError as e:
+        raise SystemExit(f"❌ {e} (wait for the workers, or --partial)")
+    finally:
+        q.close()
+
+    def write_csv(f):
+        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rows)
+    write_atomic(args.out, write_csv)
+    if args.jsonl:
+        write_atomic(args.jsonl, lambda f: f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in rows))
+    print(f"✅ {len(rows):,} row(s) → {args.out}" + (f" and {args.jsonl}" if args.jsonl else ""))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Multi-host ground-truth labelling via a leased work queue.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("init", help="Split the question/SQL pairs into chunks")
+    p.add_argument("--dataset", choices=["bird", "spider"], default="bird")
+    p.add_argument("--pairs", default=None, help="Input CSV (default: the labeller's own input)")
+    p.add_argument("--chunk_size", type=int, default=100, help="Pairs per chunk (all roles of each pair)")
+    p = sub.add_parser("work", help="Claim and label chunks until none are left")
+    p.add_argument("--worker", default=None, help="Worker name (default: host-pid)")
+    p.add_argument("--pg_host", default=None, help="Replica to label against (default: $PG_HOST)")
+    p.add_argument("--pg_port", type=int, default=None, help="Default: $PG_PORT")
+    p.add_argument("--lease", type=float, default=300.0, help="Lease seconds, renewed every lease/3")
+    p.add_argument("--max_chunks", type=int, default=0)
+    p.add_argument("--wait", action="store_true", help="Keep polling while other workers hold leases")
+    sub.add_parser("status")
+    sub.add_parser("reset", help="Hand every leased chunk back")
+    p = sub.add_parser("merge", help="Assemble the shards in input order")
+    p.add_argument("--out", required=True, help="Output CSV")
+    p.add_argument("--jsonl", default=None, help="Also write the rows as JSONL")
+    p.add_argument("--partial", action="store_true", help="Merge what is done so far")
+    for p in sub.choices.values():
+        p.add_argument("--queue", required=True, help="Queue directory (shared between hosts)")
+    args = ap.parse_args()
+    {"init": cmd_init, "work": cmd_work, "status": cmd_status,
+     "reset": cmd_reset, "merge": cmd_merge}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Label (question, SQL, role) pairs on the original SQLite files, without a
+Postgres server (see common/sqlite_acl.py for the semantics).
+
+BIRD: reads questions_sqls.csv + user_permissions_bird.csv and writes the same
+columns as dataset-groundtruth-bird.py, so the output can go straight into
+build_access_control_dataset_bitd.py --groundtruth.
+    python label_sqlite.py --dataset bird --db_root ~/data/bird/databases \\
+        --out ground_truth_sqlite.csv --compare ground_truth.csv
+
+Spider: reads spider_nl_sql_pairs.csv + user_permissions.csv and writes one
+row per (pair, role); --compare takes dataset-groundtruth.csv.
+
+--compare writes a parity report (JSON) against the Postgres labels plus a
+CSV of every disagreeing pair. "policy_agreement" only counts pairs that
+Postgres permitted or denied with 42501, i.e. leaves out dialect and runtime
+failures the SQLite backend cannot reproduce.
+
+Databases are labelled in parallel, one process per database (--workers).
+"""
+
+import os, sys, csv, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.roles import RoleSpec
+from common.sqlite_acl import PRIVILEGE_SQLSTATE, SQLiteLabeller, find_sqlite_files, load_role_grants, read_pairs
+from common.script_loader import load_script
+
+METRICS = Metrics("sqlite_labels")
+
+ROLE_SUFFIXES = RoleSpec.load().names   # $ROLES_FILE, as used by the permission scripts
+
+DEFAULTS = {
+    "bird": {"pairs": "questions_sqls.csv", "perms": "user_permissions_bird.csv",
+             "db_root": os.getenv("BIRD_DB_ROOT", ""), "out": "ground_truth_sqlite.csv"},
+    "spider": {"pairs": "spider_nl_sql_pairs.csv", "perms": "user_permissions.csv",
+               "db_root": os.getenv("SPIDER_DB_PATH", ""), "out": "spider_groundtruth_sqlite.csv"},
+}
+
+BIRD_FIELDS = ["split", "db_id", "qid", "dbname", "role", "permit", "sqlstate", "error",
+               "question", "sql_original", "sql_wrapped", "evidence"]
+SPIDER_FIELDS = ["row", "question", "sql", "db_id", "role", "permit", "sqlstate", "error"]
+
+
+def role_name(dataset, db_id, suffix):
+    # same names the Postgres labellers SET ROLE to
+    return f"{db_id.lower()}_{suffix}" if dataset == "bird" else f"{db_id}_{suffix}"
+
+
+# ── Worker ───────────────────────────────────────────────────────────────────
+def label_db(dataset, db_id, sqlite_path, grants, items):
+    """Process-pool entry point: label every (pair, role) of one database."""
+    out = []
+    with METRICS.timer("db_label", db=db_id):
+        if sqlite_path is None:
+            for idx, _ in items:
+                for suf in ROLE_SUFFIXES:
+                    out.append((idx, suf, False, "3D000", f'no SQLite file for database "{db_id}"'))
+            METRICS.inc("missing_databases", db=db_id)
+            return out, METRICS.drain()
+
+        labeller = SQLiteLabeller(sqlite_path, grants)
+        try:
+            for idx, sql_text in items:
+                for suf in ROLE_SUFFIXES:
+                    t0 = time.perf_counter()
+                    permitted, code, msg = labeller.label(role_name(dataset, db_id, suf), sql_text)
+                    METRICS.observe("decision_latency", time.perf_counter() - t0, db=db_id)
+                    METRICS.inc("pairs_labelled", db=db_id, decision="PERMIT" if permitted else "DENY")
+                    if code:
+                        METRICS.sqlstate(code, db=db_id)
+                    out.append((idx, suf, permitted, code, msg))
+        finally:
+            labeller.close()
+    return out, METRICS.drain()
+
+
+# ── Parity against the Postgres labels ───────────────────────────────────────
+def load_postgres_labels(path, dataset):
+    """Return {(key..., role suffix): (permit, sqlstate)}."""
+    labels = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if dataset == "bird":
+                role = (row.get("role") or "").strip()
+                if not role:
+                    continue  # SKIP rows (mutating / non-SELECT)
+                suf = role[len((row.get("dbname") or "").strip()) + 1:]
+                key = ((row.get("split") or "").strip(), (row.get("qid") or "").strip(),
+                       (row.get("db_id") or "").strip().lower())
+                labels[key + (suf,)] = (int(row.get("permit") or 0) == 1, (row.get("sqlstate") or "").strip())
+            else:
+                for suf in ROLE_SUFFIXES:
+                    res = row.get(f"{suf}_result") or ""
+                    if not res.startswith("ERROR:"):
+                        labels[(str(i), suf)] = (True, "")
+                    elif "permission denied" in res:
+                        labels[(str(i), suf)] = (False, PRIVILEGE_SQLSTATE)
+                    else:
+                        labels[(str(i), suf)] = (False, "ERROR")
+    return labels
+
+
+def parity_report(pg, ours, sql_by_key, key_fields, report_path):
+    confusion = {"permit_permit": 0, "permit_deny": 0, "deny_permit": 0, "deny_deny": 0}
+    by_role, by_code = {}, {}
+    policy_n = policy_agree = 0
+    disagreements = []
+    for k, (s_permit, s_code, s_msg) in ours.items():
+        if k not in pg:
+            continue
+        p_permit, p_code = pg[k]
+        confusion[("permit" if p_permit else "deny") + "_" + ("permit" if s_permit else "deny")] += 1
+        agree = p_permit == s_permit
+        r = by_role.setdefault(k[-1], {"compared": 0, "agree": 0})
+        r["compared"] += 1
+        r["agree"] += agree
+        if p_permit or p_code == PRIVILEGE_SQLSTATE:
+            policy_n += 1
+            policy_agree += agree
+        if not agree:
+            by_code[p_code or "PERMIT"] = by_code.get(p_code or "PERMIT", 0) + 1
+            disagreements.append(list(k[:-1]) + [k[-1], int(p_permit), p_code,
+                                                 int(s_permit), s_code, s_msg, sql_by_key.get(k[:-1], "")])
+
+    compared = sum(confusion.values())
+    agreed = confusion["permit_permit"] + confusion["deny_deny"]
+    report = {
+        "compared": compared,
+        "agreement": round(agreed / compared, 6) if compared else None,
+        "policy_compared": policy_n,
+        "policy_agreement": round(policy_agree / policy_n, 6) if policy_n else None,
+        "confusion_postgres_sqlite": confusion,
+        "by_role": by_role,
+        "disagreements_by_postgres_sqlstate": dict(sorted(by_code.items(), key=lambda kv: -kv[1])),
+        "only_in_postgres": sum(1 for k in pg if k not in ours),
+        "only_in_sqlite": sum(1 for k in ours if k not in pg),
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    dis_path = os.path.splitext(report_path)[0] + ".disagreements.csv"
+    with open(dis_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(key_fields + ["role", "pg_permit", "pg_sqlstate", "sqlite_permit", "sqlite_sqlstate", "sqlite_error", "sql"])
+        w.writerows(disagreements)
+    return report, dis_path
+
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+def main():
+    ap = argparse.ArgumentParser(description="Label pairs on the SQLite source files (no Postgres).")
+    ap.add_argument("--dataset", choices=["bird", "spider"], default="bird")
+    ap.add_argument("--pairs", default=None)
+    ap.add_argument("--perms", default=None)
+    ap.add_argument("--db_root", default=None, help="Folder holding <db>/<db>.sqlite")
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--compare", default=None, help="Postgres labels to check parity against")
+    ap.add_argument("--report", default="parity_report.json")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    d = DEFAULTS[args.dataset]
+    pairs_path = args.pairs or d["pairs"]
+    perms_path = args.perms or d["perms"]
+    db_root = args.db_root or d["db_root"]
+    out_path = args.out or d["out"]
+    for p in (pairs_path, perms_path):
+        if not os.path.isfile(p):
+            raise SystemExit(f"❌ Missing {p}")
+    if not db_root or not os.path.isdir(db_root):
+        raise SystemExit("❌ --db_root must point at the SQLite databases folder")
+
+    # the BIRD labeller's own SELECT-only rule decides which pairs are SKIPped
+    gt = load_script("bird/dataset-groundtruth-bird.py") if args.dataset == "bird" else None
+
+    with METRICS.timer("load_inputs"):
+        pairs = read_pairs(pairs_path, args.dataset)
+        grants = load_role_grants(perms_path)
+        files = find_sqlite_files(db_root)
+    print(f"🔍 {len(pairs):,} pairs, {len(grants):,} roles, {len(files):,} SQLite files under {db_root}")
+
+    by_db, skipped = {}, set()
+    for idx, (key, db_id, sql_text, row) in enumerate(pairs):
+        if gt is not None and (gt.is_mutating(sql_text) or not gt.is_select(sql_text)):
+            skipped.add(idx)
+            continue
+        by_db.setdefault(db_id, []).append((idx, sql_text))
+
+    results = {}   # (pair idx, suffix) → (permitted, code, msg)
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        futs = {}
+        for db_id, items in by_db.items():
+            roles = {role_name(args.dataset, db_id, s).lower() for s in ROLE_SUFFIXES}
+            sub = {r: g for r, g in grants.items() if r in roles}
+            futs[ex.submit(label_db, args.dataset, db_id, files.get(db_id.lower()), sub, items)] = db_id
+        for f in as_completed(futs):
+            out, snap = f.result()
+            METRICS.merge(snap)
+            for idx, suf, permitted, code, msg in out:
+                results[(idx, suf)] = (permitted, code, msg)
+
+    fields = BIRD_FIELDS if args.dataset == "bird" else SPIDER_FIELDS
+    ours, sql_by_key = {}, {}
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        for idx, (key, db_id, sql_text, row) in enumerate(pairs):
+            sql_by_key[key] = sql_text
+            if idx in skipped:
+                w.writerow({
+                    "split": key[0], "db_id": db_id, "qid": key[1], "dbname": key[2], "role": "",
+                    "permit": 0, "sqlstate": "SKIP", "error": "mutating_or_nonselect_sql",
+                    "question": (row.get("question") or "").strip(), "sql_original": sql_text,
+                    "sql_wrapped": "", "evidence": (row.get("evidence") or "").strip(),
+                })
+                continue
+            for suf in ROLE_SUFFIXES:
+                permitted, code, msg = results[(idx, suf)]
+                ours[key + (suf,)] = (permitted, code, msg)
+                common = {"db_id": db_id, "role": role_name(args.dataset, db_id, suf),
+                          "permit": 1 if permitted else 0, "sqlstate": code,
+                          "error": "" if permitted else msg}
+                if args.dataset == "bird":
+                    w.writerow({**common, "split": key[0], "qid": key[1], "dbname": key[2],
+                                "question": (row.get("question") or "").strip(),
+                                "sql_original": sql_text, "sql_wrapped": sql_text,
+                                "evidence": (row.get("evidence") or "").strip()})
+                else:
+                    w.writerow({**common, "row": key[0], "question": row.get("question", ""), "sql": sql_text})
+
+    permits = sum(1 for p, _, _ in ours.values() if p)
+    print(f"✅ Wrote {out_path}")
+    print(f"ℹ️ Evaluated {len(ours):,} (role, query) pairs; permitted={permits:,}, denied={len(ours) - permits:,}")
+
+    if args.compare:
+        pg = load_postgres_labels(args.compare, args.dataset)
+        key_fields = ["split", "qid", "db_id"] if args.dataset == "bird" else ["row"]
+        report, dis_path = parity_report(pg, ours, sql_by_key, key_fields, args.report)
+        print(f"⚖️  Parity vs {args.compare}: {report['compared']:,} compared, "
+              f"agreement {report['agreement']}, policy agreement {report['policy_agreement']}")
+        print(f"   report → {args.report}, disagreements → {dis_path}")
+
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
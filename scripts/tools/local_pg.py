@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run any pipeline script against a throwaway local Postgres (common/local_pg.py)
+instead of the Docker stack. No Docker, no network.
+
+    # one command: start the cluster, run, tear it down
+    python local_pg.py run -- python ../bird/load_bird_to_postgres.py
+    python local_pg.py run --set shared_buffers=2GB -- \\
+        sh -c "python ../bird/load_bird_to_postgres.py && python ../tools/verify_load.py --dataset bird"
+
+    # or keep it up across several commands
+    python local_pg.py start --state local_pg.json     # prints the export lines
+    eval "$(python local_pg.py env --state local_pg.json)"
+    python ../spider/load_spider_to_postgres.py
+    python local_pg.py stop --state local_pg.json
+
+The command gets PG_HOST (the socket directory), PG_PORT, PG_USER,
+PG_PASSWORD, PG_ADMIN_DB=postgres and PGPASSWORD. Every script reads its
+connection from these, so both the BIRD and the Spider stages can use the
+same cluster. `run` exits with the command's exit status.
+"""
+
+import os, sys, json, shlex, argparse, subprocess
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.local_pg import LocalPostgres
+
+
+def init_sql(pg, statements):
+    if not statements:
+        return
+    conn = psycopg2.connect(**pg.params("postgres"))
+    conn.autocommit = True   # CREATE DATABASE cannot run in a transaction
+    try:
+        with conn.cursor() as cur:
+            for stmt in statements:
+                cur.execute(stmt)
+    finally:
+        conn.close()
+
+
+def exports(env):
+    return "".join(f"export {k}={shlex.quote(v)}\n" for k, v in env.items())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Throwaway local Postgres for tests and benchmarks.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("run", "start"):
+        p = sub.add_parser(name)
+        p.add_argument("--dir", default=None, help="Parent directory (default: tmpfs if it has room, else temp)")
+        p.add_argument("--no_tmpfs", action="store_true")
+        p.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                       help="Extra postgresql.conf setting (repeatable)")
+        p.add_argument("--sql_init", action="append", default=[],
+                       help="Statement run on 'postgres' after start (repeatable)")
+    sub.choices["run"].add_argument("command", nargs=argparse.REMAINDER, help="-- command to run")
+    sub.choices["start"].add_argument("--state", default="local_pg.json")
+    for name in ("env", "stop"):
+        sub.add_parser(name).add_argument("--state", default="local_pg.json")
+    args = ap.parse_args()
+
+    if args.cmd in ("env", "stop"):
+        with open(args.state, encoding="utf-8") as f:
+            state = json.load(f)
+        if args.cmd == "env":
+            sys.stdout.write(exports(state["env"]))
+            return
+        LocalPostgres.attach(state["root"], state["port"]).stop()
+        os.remove(args.state)
+        print(f"🧹 stopped and removed {state['root']}")
+        return
+
+    settings = dict(s.split("=", 1) for s in args.set)
+    pg = LocalPostgres(base_dir=args.dir, settings=settings, use_tmpfs=not args.no_tmpfs,
+                       keep=args.cmd == "start")
+    try:
+        pg.start()
+        init_sql(pg, args.sql_init)
+    except Exception as e:
+        pg.stop()
+        raise SystemExit(f"❌ local Postgres: {e}")
+    print(f"🐘 Local Postgres on {pg.socket_dir} port {pg.port} "
+          f"(shared_buffers={pg.settings['shared_buffers']}, data in {pg.root})", file=sys.stderr)
+
+    if args.cmd == "start":
+        with open(args.state, "w", encoding="utf-8") as f:
+            json.dump({"root": pg.root, "port": pg.port, "env": pg.env()}, f, indent=2)
+        sys.stdout.write(exports(pg.env()))
+        return
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        pg.stop()
+        raise SystemExit("❌ nothing to run (local_pg.py run -- <command>)")
+    try:
+        rc = subprocess.run(command, env={**os.environ, **pg.env()}).returncode
+    finally:
+        pg.stop()
+    sys.exit(rc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export a migrated, provisioned corpus as a restorable bundle, and import it
+on another server: no SQLite migration, no grant scripts.
+
+    python pg_bundle.py --dataset bird export --out bird_bundle/ --parallel_dbs 4 --jobs 4
+    python pg_bundle.py --dataset bird import --bundle bird_bundle/ --parallel_dbs 4 --jobs 4
+
+Bundle layout:
+
+    manifest.json     dataset, layout, pg_dump version, per-database owner,
+                      size and sha256 of every file
+    roles.sql         CREATE/ALTER ROLE for the corpus roles only: <db>_<name>
+                      (<schema>_<name> with PG_LAYOUT=schema) for the names in
+                      $ROLES_FILE. Superusers, the connecting user and any
+                      other role are never exported.
+    <db>/             pg_dump directory format (one file per table), ACLs included
+
+Export runs pg_dump -Fd -j JOBS for PARALLEL_DBS databases at a time. Import
+checks the checksums first (--no_verify skips that), applies roles.sql
+(roles that already exist only produce an error for their CREATE ROLE), then
+creates each database and restores it with pg_restore -j JOBS, PARALLEL_DBS
+at a time. --clean drops databases that already exist on the target.
+
+A database that fails to dump is listed under "failed" in the manifest, and
+export exits 1. Import exits 1 when a database fails to restore or the
+bundle lacks one it should hold.
+
+Databases are picked like pg_snapshots.py does (every corpus database, or
+$PG_CORPUS_DB with PG_LAYOUT=schema; --dbs to narrow). The pg_dump,
+pg_restore, createdb and psql clients must be on PATH.
+"""
+
+import os, sys, json, hashlib, argparse, datetime, subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.layout import PG_CORPUS_DB, PG_LAYOUT, consolidated, list_schemas
+from common.metrics import Metrics
+from common.roles import RoleSpec, q_ident
+from common.script_loader import load_script
+
+METRICS = Metrics("pg_bundle")
+
+# corpus discovery and admin sessions
+SNAP = load_script("tools/pg_snapshots.py")
+
+PG_USER = os.getenv("PG_USER", "username")
+PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
+PG_HOST = os.getenv("PG_HOST", "localhost")
+
+MANIFEST = "manifest.json"
+ROLES_SQL = "roles.sql"
+
+
+def sha256_file(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def checksums(root, rel):
+    """{relative path: {"sha256", "bytes"}} for root/rel, or every file under it."""
+    path = os.path.join(root, rel)
+    if os.path.isfile(path):
+        return {rel: {"sha256": sha256_file(path), "bytes": os.path.getsize(path)}}
+    out = {}
+    for r, _, files in os.walk(path):
+        for f in sorted(files):
+            path = os.path.join(r, f)
+            out[os.path.relpath(path, root)] = {"sha256": sha256_file(path), "bytes": os.path.getsize(path)}
+    return out
+
+
+class Clients:
+    """pg_dump & co. with the PG_* connection settings."""
+
+    def __init__(self, port):
+        self.base = ["-h", PG_HOST, "-p", str(port), "-U", PG_USER]
+        self.env = {**os.environ, "PGPASSWORD": PG_PASSWORD}
+
+    def run(self, cmd, *args, check=True):
+        proc = subprocess.run([cmd, *self.base, *args], env=self.env, capture_output=True, text=True)
+        if check and proc.returncode != 0:
+            raise RuntimeError(f"{cmd} exited {proc.returncode}: {proc.stderr.strip()[-2000:]}")
+        return proc
+
+    def version(self):
+        return subprocess.run(["pg_dump", "--version"], capture_output=True, text=True).stdout.strip()
+
+
+def corpus_role_names(port, dbs):
+    """<db>_<name> (<schema>_<name> with PG_LAYOUT=schema) for every role in $ROLES_FILE."""
+    prefixes = list(dbs)
+    if consolidated():
+        admin = SNAP.Admin(port, PG_CORPUS_DB)
+        try:
+            with admin.cursor() as cur:
+                prefixes = list_schemas(cur)
+        finally:
+            admin.close()
+    return [f"{p}_{name}" for p in prefixes for name in RoleSpec.load().names]
+
+
+def roles_sql(admin, names, passwords=True):
+    """
+    CREATE ROLE + ALTER ROLE for the roles of `names` that exist. Superusers,
+    the connecting user and bootstrap roles are skipped even when named.
+    Returns (SQL text, number of roles).
+    """
+    with admin.cursor() as cur:
+        cur.execute(f"""
+            SELECT rolname, rolcanlogin, rolinherit, rolconnlimit, {'rolpassword' if passwords else 'NULL'}
+              FROM {'pg_authid' if passwords else 'pg_roles'}
+             WHERE rolname = ANY(%s) AND NOT rolsuper AND rolname <> current_user AND oid >= 16384
+             ORDER BY rolname;
+        """, (list(names),))
+        rows = cur.fetchall()
+    out = []
+    for name, login, inherit, connlimit, password in rows:
+        attrs = ["LOGIN" if login else "NOLOGIN", "NOSUPERUSER", "NOCREATEDB", "NOCREATEROLE",
+                 "INHERIT" if inherit else "NOINHERIT", "NOREPLICATION", "NOBYPASSRLS",
+                 f"CONNECTION LIMIT {int(connlimit)}"]
+        if password:
+            attrs.append("PASSWORD '" + password.replace("'", "''") + "'")
+        out.append(f"CREATE ROLE {q_ident(name)};\nALTER ROLE {q_ident(name)} WITH {' '.join(attrs)};\n")
+    return "".join(out), len(rows)
+
+
+def export_db(clients, out, db, jobs):
+    if os.path.exists(os.path.join(out, db)):
+        raise RuntimeError(f"{os.path.join(out, db)} already exists")
+    with METRICS.timer("dump", db=db):
+        clients.run("pg_dump", "-Fd", "-j", str(jobs), "-f", os.path.join(out, db), "-d", db)
+    with METRICS.timer("checksum", db=db):
+        return checksums(out, db)
+
+
+def import_db(clients, bundle, db, owner, jobs, clean):
+    if clean:
+        clients.run("psql", "-d", "postgres", "-Atc", f'DROP DATABASE IF EXISTS "{db}" WITH (FORCE);')
+    clients.run("createdb", *(["-O", owner] if owner else []), db)
+    with METRICS.timer("restore", db=db):
+        clients.run("pg_restore", "-j", str(jobs), "-d", db, os.path.join(bundle, db))
+
+
+def verify(bundle, manifest):
+    bad = []
+    for entry in [manifest["roles"]] + list(manifest["databases"].values()):
+        for rel, meta in entry["files"].items():
+            path = os.path.join(bundle, rel)
+            if not os.path.isfile(path) or os.path.getsize(path) != meta["bytes"] or sha256_file(path) != meta["sha256"]:
+                bad.append(rel)
+    return bad
+
+
+def run_parallel(jobs, workers, what):
+    """jobs: {db: callable}. Returns ({db: result}, [failed dbs])."""
+    results, failed = {}, []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futs = {ex.submit(fn): db for db, fn in jobs.items()}
+        for f in as_completed(futs):
+            db = futs[f]
+            try:
+                results[db] = f.result()
+                METRICS.inc(f"{what}_ok")
+                print(f"✅ {what}: {db}")
+            except Exception as e:
+                failed.append(db)
+                METRICS.inc(f"{what}_failures", db=db)
+                print(f"❌ {what} {db}: {e}")
+    return results, failed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export / import a migrated corpus as a pg_dump bundle.")
+    ap.add_argument("--dataset", choices=["bird", "spider"], default="bird")
+    ap.add_argument("--parallel_dbs", type=int, default=4, help="Databases dumped/restored at once")
+    ap.add_argument("--jobs", type=int, default=4, help="pg_dump/pg_restore -j per database (tables in parallel)")
+    ap.add_argument("--dbs", default="", help="Comma-separated Postgres databases (default: all)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("export")
+    e.add_argument("--out", required=True, help="Bundle directory (created; must not hold these databases yet)")
+    e.add_argument("--no_role_passwords", action="store_true",
+                   help="Export roles without password hashes (non-superusers cannot read pg_authid)")
+    i = sub.add_parser("import")
+    i.add_argument("--bundle", required=True)
+    i.add_argument("--clean", action="store_true", help="Drop databases that already exist on the target")
+    i.add_argument("--no_verify", action="store_true", help="Skip the checksum check")
+    args = ap.parse_args()
+
+    port = int(os.getenv("PG_PORT", SNAP.DEFAULT_PORTS[args.dataset]))
+    clients = Clients(port)
+    wanted = {x.strip() for x in args.dbs.split(",") if x.strip()}
+
+    if args.cmd == "export":
+        os.makedirs(args.out, exist_ok=True)
+        admin = SNAP.Admin(port, SNAP.DEFAULT_ADMIN[args.dataset])
+        try:
+            dbs = dict(SNAP.corpus_databases(admin, wanted))
+            if not dbs:
+                raise SystemExit("❌ No corpus databases found.")
+            with METRICS.timer("roles"):
+                names = corpus_role_names(port, dbs)
+                script, n_roles = roles_sql(admin, names, passwords=not args.no_role_passwords)
+                with open(os.path.join(args.out, ROLES_SQL), "w", encoding="utf-8") as f:
+                    f.write(script)
+        finally:
+            admin.close()
+        print(f"👥 {n_roles} of {len(names)} corpus role(s) exported")
+        with METRICS.timer("export"):
+            files, failed = run_parallel(
+                {db: (lambda db=db: export_db(clients, args.out, db, args.jobs)) for db in dbs},
+                args.parallel_dbs, "export")
+
+        manifest = {
+            "dataset": args.dataset, "layout": PG_LAYOUT, "pg_dump": clients.version(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "roles": {"files": checksums(args.out, ROLES_SQL)},
+            "databases": {db: {"owner": dbs[db], "files": files[db],
+                               "bytes": sum(m["bytes"] for m in files[db].values())}
+                          for db in sorted(files)},
+            "failed": sorted(failed),
+        }
+        with open(os.path.join(args.out, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        total = sum(d["bytes"] for d in manifest["databases"].values())
+        print(f"📦 {len(files)} database(s), {total / 2**20:,.1f} MiB → {args.out} ({len(failed)} failed)")
+        if failed:
+            print(f"❌ incomplete bundle, not dumped: {', '.join(sorted(failed))}")
+
+    else:
+        with open(os.path.join(args.bundle, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("layout") != PG_LAYOUT:
+            print(f"⚠️  bundle was exported with PG_LAYOUT={manifest.get('layout')}, running with {PG_LAYOUT}")
+        if not args.no_verify:
+            with METRICS.timer("verify"):
+                bad = verify(args.bundle, manifest)
+            if bad:
+                raise SystemExit(f"❌ {len(bad)} file(s) missing or corrupt, e.g. {bad[:3]}")
+        with METRICS.timer("roles"):
+            # existing roles only raise "already exists"; everything else still applies
+            proc = clients.run("psql", "-d", "postgres", "-q", "-f", os.path.join(args.bundle, ROLES_SQL), check=False)
+            METRICS.inc("role_statement_errors", proc.stderr.count("ERROR:"))
+        entries = {db: e for db, e in manifest["databases"].items() if not wanted or db in wanted}
+        absent = sorted((set(manifest.get("failed", [])) | wanted) - set(manifest["databases"]))
+        if wanted:
+            absent = [db for db in absent if db in wanted]
+        if absent:
+            print(f"❌ not in the bundle: {', '.join(absent)}")
+        with METRICS.timer("import"):
+            _, failed = run_parallel(
+                {db: (lambda db=db: import_db(clients, args.bundle, db, entries[db]["owner"], args.jobs, args.clean))
+                 for db in entries},
+                args.parallel_dbs, "import")
+        print(f"📥 {len(entries) - len(failed)} database(s) restored from {args.bundle} ({len(failed)} failed)")
+        failed += absent
+
+    METRICS.report()
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Template-database snapshots of a loaded and provisioned corpus.
+
+    python pg_snapshots.py --dataset bird create --label "after permissions"
+    python pg_snapshots.py --dataset bird list
+    python pg_snapshots.py --dataset bird restore            # latest version
+    python pg_snapshots.py --dataset bird restore --version 2 --dbs financial,debit_card_specializing
+    python pg_snapshots.py --dataset bird drop --version 1
+
+create   clones every corpus database <db> into <db>__v<N> (CREATE DATABASE
+         ... TEMPLATE), marks the clone IS_TEMPLATE and closes it to
+         connections. The live databases are left as they are.
+restore  drops <db> (WITH (FORCE)) and recreates it from <db>__v<N>: a file
+         copy on the server instead of a re-migration from SQLite.
+drop     removes the template databases of a version.
+
+Clones and restores run in parallel (--workers) on one autocommit admin
+session per worker. Versions are recorded in a JSON manifest (--manifest,
+default pg_snapshots.json) with label, time, layout and per-database
+snapshot name and owner.
+
+Corpus databases are the non-template databases of the server, except the
+admin database, 'postgres' and existing snapshots. With PG_LAYOUT=schema that
+is $PG_CORPUS_DB alone.
+
+Snapshots hold the table data and in-database grants. Roles are cluster-wide
+and are not part of a snapshot. Also, Postgres will not drop a role that
+still holds privileges in a snapshot. Drop old versions before re-running
+the permission scripts.
+"""
+
+import os, re, sys, json, time, hashlib, argparse, datetime, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import psycopg2
+from psycopg2 import sql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.layout import PG_CORPUS_DB, PG_LAYOUT, consolidated
+from common.metrics import Metrics
+
+METRICS = Metrics("pg_snapshots")
+
+PG_USER = os.getenv("PG_USER", "username")
+PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
+PG_HOST = os.getenv("PG_HOST", "localhost")
+DEFAULT_PORTS = {"bird": 5433, "spider": 5432}
+DEFAULT_ADMIN = {"bird": os.getenv("PG_ADMIN_DB", "birddb"), "spider": os.getenv("PG_ADMIN_DB", "postgres")}
+
+SNAPSHOT_RE = re.compile(r"__v\d+$")
+
+
+def snapshot_name(db, version):
+    """<db>__v<N>, with long names shortened (+ hash) to fit Postgres' 63 bytes."""
+    suffix = f"__v{version}"
+    if len((db + suffix).encode("utf-8")) <= 63:
+        return db + suffix
+    digest = hashlib.blake2b(db.encode("utf-8"), digest_size=4).hexdigest()
+    head = db.encode("utf-8")[:63 - len(suffix) - 9].decode("utf-8", "ignore")
+    return f"{head}_{digest}{suffix}"
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self.data = {"snapshots": []}
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    @property
+    def snapshots(self):
+        return self.data["snapshots"]
+
+    def next_version(self):
+        return max((s["version"] for s in self.snapshots), default=0) + 1
+
+    def get(self, version=None):
+        if not self.snapshots:
+            raise SystemExit(f"❌ No snapshots in {self.path}")
+        if version is None:
+            return max(self.snapshots, key=lambda s: s["version"])
+        for s in self.snapshots:
+            if s["version"] == version:
+                return s
+        raise SystemExit(f"❌ No snapshot version {version} in {self.path}")
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class Admin:
+    """One autocommit admin session per worker thread."""
+
+    def __init__(self, port, admin_db):
+        self.port, self.admin_db = port, admin_db
+        self.local = threading.local()
+        self.conns, self.lock = [], threading.Lock()
+
+    def cursor(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or conn.closed:
+            METRICS.inc("connection_opens", db=self.admin_db)
+            conn = psycopg2.connect(dbname=self.admin_db, user=PG_USER, password=PG_PASSWORD,
+                                    host=PG_HOST, port=self.port)
+            conn.autocommit = True
+            self.local.conn = conn
+            with self.lock:
+                self.conns.append(conn)
+        return conn.cursor()
+
+    def close(self):
+        for conn in self.conns:
+            conn.close()
+
+
+def corpus_databases(admin, wanted=None):
+    """[(database, owner)] to snapshot."""
+    with admin.cursor() as cur:
+        cur.execute("""
+            SELECT datname, pg_get_userbyid(datdba)
+              FROM pg_database
+             WHERE NOT datistemplate AND datname NOT IN ('postgres', %s)
+             ORDER BY datname;
+        """, (admin.admin_db,))
+        rows = [(d, o) for d, o in cur.fetchall() if not SNAPSHOT_RE.search(d)]
+    if consolidated():
+        rows = [(d, o) for d, o in rows if d == PG_CORPUS_DB]
+    if wanted:
+        rows = [(d, o) for d, o in rows if d in wanted]
+    return rows
+
+
+def _kick(cur, db):
+    # CREATE DATABASE ... TEMPLATE needs the source to have no other sessions
+    cur.execute("SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE datname = %s AND pid <> pg_backend_pid();", (db,))
+
+
+def clone(admin, db, snap, version, label, terminate):
+    t0 = time.perf_counter()
+    with admin.cursor() as cur:
+        if terminate:
+            _kick(cur, db)
+        cur.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {}").format(sql.Identifier(snap), sql.Identifier(db)))
+        cur.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE true ALLOW_CONNECTIONS false")
+                    .format(sql.Identifier(snap)))
+        cur.execute(sql.SQL("COMMENT ON DATABASE {} IS {}").format(
+            sql.Identifier(snap), sql.Literal(f"snapshot v{version} of {db}" + (f": {label}" if label else ""))))
+    METRICS.observe("snapshot", time.perf_counter() - t0, db=db)
+
+
+def restore(admin, db, snap, owner):
+    t0 = time.perf_counter()
+    with admin.cursor() as cur:
+        cur.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(db)))
+        cur.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {} OWNER {}").format(
+            sql.Identifier(db), sql.Identifier(snap), sql.Identifier(owner)))
+    METRICS.observe("restore", time.perf_counter() - t0, db=db)
+
+
+def drop(admin, snap):
+    with admin.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (snap,))
+        if cur.fetchone() is None:
+            return   # already gone
+        cur.execute(sql.SQL("ALTER DATABASE {} WITH IS_TEMPLATE false").format(sql.Identifier(snap)))
+        cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(snap)))
+
+
+def run_parallel(jobs, workers, what):
+    """jobs: {db: callable}. Returns the databases that failed."""
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futs = {ex.submit(fn): db for db, fn in jobs.items()}
+        for f in as_completed(futs):
+            try:
+                f.result()
+                METRICS.inc(f"{what}_ok")
+            except Exception as e:
+                failed.append(futs[f])
+                METRICS.inc(f"{what}_failures", db=futs[f])
+                print(f"❌ {what} {futs[f]}: {e}")
+    return failed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Snapshot / reset corpus databases via template databases.")
+    ap.add_argument("--dataset", choices=["bird", "spider"], default="bird")
+    ap.add_argument("--manifest", default="pg_snapshots.json")
+    ap.add_argument("--workers", type=int, default=8)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("create", help="Clone every corpus database into a new snapshot version")
+    c.add_argument("--label", default="")
+    c.add_argument("--dbs", default="", help="Comma-separated Postgres databases (default: all)")
+    c.add_argument("--terminate", action="store_true", help="Terminate other sessions on the sources first")
+    r = sub.add_parser("restore", help="Recreate databases from a snapshot version")
+    r.add_argument("--version", type=int, default=None, help="Default: latest")
+    r.add_argument("--dbs", default="")
+    sub.add_parser("list", help="Show the manifest")
+    d = sub.add_parser("drop", help="Drop the template databases of a version")
+    d.add_argument("--version", type=int, required=True)
+    args = ap.parse_args()
+
+    manifest = Manifest(args.manifest)
+    wanted = {x.strip() for x in getattr(args, "dbs", "").split(",") if x.strip()}
+
+    if args.cmd == "list":
+        for s in sorted(manifest.snapshots, key=lambda s: s["version"]):
+            print(f"v{s['version']:<4} {s['created']}  {len(s['databases']):>4} db(s)  "
+                  f"{s['layout']:<8} {s.get('label', '')}")
+        return
+
+    port = int(os.getenv("PG_PORT", DEFAULT_PORTS[args.dataset]))
+    admin = Admin(port, DEFAULT_ADMIN[args.dataset])
+    try:
+        if args.cmd == "create":
+            version = manifest.next_version()
+            dbs = corpus_databases(admin, wanted)
+            if not dbs:
+                raise SystemExit("❌ No corpus databases found.")
+            entries = {db: {"snapshot": snapshot_name(db, version), "owner": owner} for db, owner in dbs}
+            with METRICS.timer("create"):
+                failed = run_parallel(
+                    {db: (lambda db=db: clone(admin, db, entries[db]["snapshot"], version, args.label, args.terminate))
+                     for db in entries}, args.workers, "snapshot")
+            for db in failed:
+                entries.pop(db)
+            if entries:
+                manifest.snapshots.append({
+                    "version": version, "label": args.label, "layout": PG_LAYOUT,
+                    "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "host": PG_HOST, "port": port, "databases": entries,
+                })
+                manifest.save()
+            print(f"📸 v{version}: {len(entries)} database(s) snapshotted, {len(failed)} failed → {args.manifest}")
+
+        elif args.cmd == "restore":
+            snap = manifest.get(args.version)
+            entries = {db: e for db, e in snap["databases"].items() if not wanted or db in wanted}
+            with METRICS.timer("restore"):
+                failed = run_parallel(
+                    {db: (lambda db=db: restore(admin, db, entries[db]["snapshot"], entries[db]["owner"]))
+                     for db in entries}, args.workers, "restore")
+            print(f"♻️  v{snap['version']}: {len(entries) - len(failed)} database(s) restored, {len(failed)} failed")
+
+        elif args.cmd == "drop":
+            snap = manifest.get(args.version)
+            with METRICS.timer("drop"):
+                failed = run_parallel(
+                    {db: (lambda e=e: drop(admin, e["snapshot"])) for db, e in snap["databases"].items()},
+                    args.workers, "drop")
+            dropped = len(snap["databases"]) - len(failed)
+            if failed:   # keep what is still on the server
+                snap["databases"] = {db: e for db, e in snap["databases"].items() if db in failed}
+            else:
+                manifest.snapshots.remove(snap)
+            manifest.save()
+            print(f"🗑️  v{args.version}: {dropped} template(s) dropped, {len(failed)} failed")
+    finally:
+        admin.close()
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
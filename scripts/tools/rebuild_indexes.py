@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recreate the SQLite primary keys, unique/plain indexes and foreign-key join
+indexes of a loaded corpus in Postgres, then ANALYZE (common/sqlite_indexes.py).
+
+    python rebuild_indexes.py --dataset bird --db_root ~/data/bird/train_databases
+    python rebuild_indexes.py --dataset spider --db_root ~/data/spider/database \\
+        --workers 8 --foreign_keys
+
+Runs after the loaders (or from them with LOAD_INDEXES=1). Connects with the
+PG_* env vars and PG_LAYOUT like the other scripts; indexes that already
+exist are left alone, so re-running is cheap.
+"""
+
+import os, sys, argparse
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.metrics import Metrics
+from common.sqlite_acl import find_sqlite_files
+from common.sqlite_indexes import IndexRebuild
+
+METRICS = Metrics("index_rebuild")
+
+PG_USER = os.getenv("PG_USER", "username")
+PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
+PG_HOST = os.getenv("PG_HOST", "localhost")
+DEFAULT_PORTS = {"bird": 5433, "spider": 5432}
+DEFAULT_ROOT = {"bird": os.getenv("BIRD_DB_ROOT", ""), "spider": os.getenv("SPIDER_DB_PATH", "")}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rebuild SQLite keys and indexes on the loaded Postgres tables.")
+    ap.add_argument("--dataset", choices=["bird", "spider"], default="bird")
+    ap.add_argument("--db_root", default=None, help="Folder holding the SQLite files (searched recursively)")
+    ap.add_argument("--dbs", default="", help="Comma-separated db_ids (default: every SQLite file)")
+    ap.add_argument("--workers", type=int, default=4, help="Tables indexed in parallel")
+    ap.add_argument("--foreign_keys", action="store_true", help="Also add FOREIGN KEY ... NOT VALID constraints")
+    ap.add_argument("--no_analyze", action="store_true")
+    args = ap.parse_args()
+
+    db_root = os.path.expanduser(args.db_root or DEFAULT_ROOT[args.dataset])
+    if not db_root or not os.path.isdir(db_root):
+        raise SystemExit("❌ --db_root must point at the SQLite databases folder")
+    files = find_sqlite_files(db_root)
+    if args.dbs:
+        wanted = {d.strip().lower() for d in args.dbs.split(",") if d.strip()}
+        files = {db: p for db, p in files.items() if db in wanted}
+    if not files:
+        raise SystemExit("❌ No SQLite files found.")
+
+    port = int(os.getenv("PG_PORT", DEFAULT_PORTS[args.dataset]))
+
+    def connect(pg_db):
+        METRICS.inc("connection_opens", db=pg_db)
+        return psycopg2.connect(dbname=pg_db, user=PG_USER, password=PG_PASSWORD, host=PG_HOST, port=port)
+
+    rebuild = IndexRebuild(connect, workers=args.workers, foreign_keys=args.foreign_keys,
+                           analyze=not args.no_analyze, metrics=METRICS)
+    with METRICS.timer("rebuild"):
+        counts = rebuild.run(files)
+
+    print(f"✅ {len(files)} database(s), {counts.get('tables', 0)} table(s): "
+          f"{counts.get('indexes_built', 0)} index(es) built, "
+          f"{counts.get('unique_fallbacks', 0)} unique → plain (duplicates), "
+          f"{counts.get('index_failures', 0)} failed")
+    if args.foreign_keys:
+        print(f"   foreign keys: {counts.get('foreign_keys_added', 0)} added, "
+              f"{counts.get('foreign_key_failures', 0)} failed")
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
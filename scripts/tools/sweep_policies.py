@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Policy sweep: generate K random policies per database and label every
+(query, role, policy) triple statically (see common/policy_sweep.py).
+
+    python sweep_policies.py --deps query_deps.sqlite --db_root ~/data/bird \\
+        --policies 200 --roles 3-8 --table_frac 0.2-0.8 --col_frac 0.3-0.7 --out_dir sweep/
+
+Output (policy-indexed):
+  <out_dir>/policies.jsonl   one line per policy: id, db_id, seed, drawn params,
+                             grants per role (User_1 … User_N) as packed column bitmaps
+  <out_dir>/schemas.json     {db_id: [[table, column], ...]}, the bitmap column order
+                             (common.policy_sweep.decode_grants turns a bitmap back into grants)
+  <out_dir>/labels.parquet   policy_id, db_id, qid, role (1-based), permit
+  <out_dir>/summary.json     counts, unresolved queries, privilege-set dedup ratio
+
+Queries that did not compile in SQLite when the index was built are left out
+(listed per database in summary.json); they need the Postgres labeller.
+"""
+
+import os, sys, json, time, sqlite3, argparse
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.deps_index import DependencyIndex, table_columns
+from common.metrics import Metrics
+from common.policy_sweep import QueryMatrix, SweepSpec, encode_grants, random_policy
+from common.sqlite_acl import find_sqlite_files
+from common.sqlite_reader import read_only_uri
+
+METRICS = Metrics("policy_sweep")
+
+LABEL_SCHEMA = pa.schema([
+    ("policy_id", pa.int32()),
+    ("db_id", pa.dictionary(pa.int32(), pa.string())),
+    ("qid", pa.dictionary(pa.int32(), pa.string())),
+    ("role", pa.int16()),
+    ("permit", pa.bool_()),
+])
+
+
+def int_range(text):
+    """'3-8' → (3, 8); '4' → (4, 4)."""
+    lo, _, hi = text.partition("-")
+    return int(lo), int(hi or lo)
+
+
+def frac_range(text):
+    """'0.3-0.7' → (0.3, 0.7); '0.5' → (0.5, 0.5)."""
+    lo, _, hi = text.partition("-")
+    return float(lo), float(hi or lo)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate and statically label K policies per database.")
+    ap.add_argument("--deps", default="query_deps.sqlite")
+    ap.add_argument("--db_root", required=True, help="Folder holding the SQLite files (searched recursively)")
+    ap.add_argument("--out_dir", default="policy_sweep")
+    ap.add_argument("--policies", type=int, default=100, help="Policies per database (K)")
+    ap.add_argument("--roles", type=int_range, default=(4, 4), help="Roles per policy, e.g. 4 or 3-8")
+    ap.add_argument("--table_frac", type=frac_range, default=(0.3, 0.7))
+    ap.add_argument("--col_frac", type=frac_range, default=(0.3, 0.7))
+    ap.add_argument("--seeds", default=None, help="Comma-separated policy seeds (overrides --policies/--seed)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--dbs", default=None, help="Comma-separated db_ids (default: every indexed database)")
+    args = ap.parse_args()
+
+    if not os.path.isfile(args.deps):
+        raise SystemExit(f"❌ Missing {args.deps} (build it with build_dependency_index.py)")
+    spec = SweepSpec(policies=args.policies, roles=args.roles, table_frac=args.table_frac,
+                     col_frac=args.col_frac, seed=args.seed,
+                     seeds=[int(s) for s in args.seeds.split(",")] if args.seeds else None)
+
+    with METRICS.timer("load_inputs"):
+        idx = DependencyIndex.load(args.deps)
+        files = find_sqlite_files(os.path.expanduser(args.db_root))
+    dbs = sorted({q[0] for q in idx.query_objs})
+    if args.dbs:
+        wanted = {d.strip().lower() for d in args.dbs.split(",")}
+        dbs = [d for d in dbs if d in wanted]
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    t0 = time.time()
+    policy_id = n_labels = n_permits = n_sets = n_role_rows = 0
+    unresolved, schemas = {}, {}
+    writer = pq.ParquetWriter(os.path.join(args.out_dir, "labels.parquet"), LABEL_SCHEMA, compression="zstd")
+    try:
+        with open(os.path.join(args.out_dir, "policies.jsonl"), "w", encoding="utf-8") as fpol:
+            for db in dbs:
+                if db not in files:
+                    print(f"⚠️  {db}: no SQLite file, skipped")
+                    METRICS.inc("missing_databases", db=db)
+                    continue
+                conn = sqlite3.connect(read_only_uri(files[db]), uri=True)
+                try:
+                    schema = table_columns(conn)
+                finally:
+                    conn.close()
+
+                with METRICS.timer("db_sweep", db=db):
+                    qm = QueryMatrix(db, schema, idx)
+                    if qm.unresolved:
+                        unresolved[db] = qm.unresolved
+                    schemas[db] = qm.privs.columns
+                    bits, pol_ids, role_nums = [], [], []
+                    for pseed in spec.policy_seeds():
+                        params, roles = random_policy(spec.rng(db, pseed), schema, spec)
+                        role_bits = [qm.role_bits(g) for g in roles]
+                        fpol.write(json.dumps({
+                            "policy_id": policy_id, "db_id": db, "seed": pseed, **params,
+                            "grants": {f"User_{i + 1}": encode_grants(b) for i, b in enumerate(role_bits)},
+                        }) + "\n")
+                        bits += role_bits
+                        pol_ids += [policy_id] * len(role_bits)
+                        role_nums += range(1, len(role_bits) + 1)
+                        policy_id += 1
+
+                    G = np.array(bits, dtype=bool).reshape(len(bits), len(qm.privs.columns))
+                    permit, uniq = qm.label(G)
+                    n_sets += uniq
+                    n_role_rows += len(bits)
+
+                n_q = len(qm.qids)
+                if n_q and len(bits):
+                    # row order: for each (policy, role) column, all queries
+                    writer.write_table(pa.table({
+                        "policy_id": np.repeat(np.array(pol_ids, dtype=np.int32), n_q),
+                        "db_id": pa.DictionaryArray.from_arrays(
+                            np.zeros(n_q * len(bits), dtype=np.int32), pa.array([db])),
+                        "qid": pa.DictionaryArray.from_arrays(
+                            np.tile(np.arange(n_q, dtype=np.int32), len(bits)), pa.array(qm.qids)),
+                        "role": np.repeat(np.array(role_nums, dtype=np.int16), n_q),
+                        "permit": permit.T.reshape(-1),
+                    }, schema=LABEL_SCHEMA))
+                n_labels += permit.size
+                n_permits += int(permit.sum())
+                METRICS.inc("labels", permit.size, db=db)
+    finally:
+        writer.close()
+
+    wall = time.time() - t0
+    summary = {
+        "databases": len(dbs),
+        "policies": policy_id,
+        "labels": n_labels,
+        "permit_rate": round(n_permits / n_labels, 6) if n_labels else None,
+        "role_privilege_sets": n_role_rows,
+        "distinct_privilege_sets": n_sets,
+        "labels_per_second": round(n_labels / wall, 1) if wall else None,
+        "spec": vars(spec),
+        "unresolved_queries": unresolved,
+    }
+    with open(os.path.join(args.out_dir, "schemas.json"), "w", encoding="utf-8") as f:
+        json.dump(schemas, f, ensure_ascii=False)
+    with open(os.path.join(args.out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"✅ {policy_id:,} policies, {n_labels:,} labels ({n_labels / max(wall, 1e-9):,.0f}/s) → {args.out_dir}")
+    print(f"ℹ️ {n_sets:,} distinct privilege sets for {n_role_rows:,} roles; "
+          f"{sum(len(v) for v in unresolved.values()):,} unresolved queries left out")
+    METRICS.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check a loaded corpus against its SQLite sources, table by table.
+
+    python verify_load.py --dataset bird --db_root ~/data/bird/train_databases --workers 8
+    python verify_load.py --dataset spider --db_root ~/data/spider/database --dbs concert_singer
+
+For every source table both sides compute the same aggregates:
+
+    rows          row count (SQLite side: after the loader's own row skips)
+    non-null      per column
+    text hash     per text column: sum of the first 32 bits of md5(value),
+                  order-independent
+    sum           per integer column (exact) and real/numeric column
+                  (relative tolerance 1e-9)
+
+Date, timestamp, boolean and bytea columns are compared on non-null counts only.
+
+The SQLite side reads each table once through the loader's clean_value()
+(same decoding, null markers and skips), so differences the loader makes on
+purpose are expected and explained rather than reported:
+
+    header     BIRD drops a first row that repeats the column names
+    all_null   BIRD drops rows that are entirely NULL after cleaning
+    date       values the loader could not parse as a date are stored as NULL
+    utf8       invalid UTF-8 is stored with U+FFFD (noted, hashes still match)
+
+Tables are checked in parallel (--workers processes). The report
+(--out, default verify_report.csv) has one row per table:
+db, table, status (ok | explained | mismatch | missing | error), the row
+counts and a detail column. Exits 1 when any table is mismatch, missing or error.
+"""
+
+import os, re, csv, sys, math, sqlite3, hashlib, argparse, datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.layout import SessionCache, qualify, target
+from common.metrics import Metrics
+from common.sqlite_acl import find_sqlite_files
+from common.sqlite_reader import read_only_uri
+from common.script_loader import load_script
+from common.type_profile import fit
+
+METRICS = Metrics("verify_load")
+
+PG_USER = os.getenv("PG_USER", "username")
+PG_PASSWORD = os.getenv("PG_PASSWORD", "password")
+PG_HOST = os.getenv("PG_HOST", "localhost")
+DEFAULT_PORTS = {"bird": 5433, "spider": 5432}
+DEFAULT_ROOT = {"bird": os.getenv("BIRD_DB_ROOT", ""), "spider": os.getenv("SPIDER_DB_PATH", "")}
+LOADERS = {"bird": "bird/load_bird_to_postgres.py", "spider": "spider/load_spider_to_postgres.py"}
+
+INT_TYPES = {"smallint", "integer", "bigint"}
+NUM_TYPES = {"double precision", "real", "numeric"}
+TEXT_TYPES = {"text", "character varying", "character"}
+DATE_TYPES = {"date", "timestamp without time zone", "timestamp with time zone"}
+INT_RE = re.compile(r"\s*[+-]?\d+\s*")
+REPORT_COLUMNS = ["db", "table", "status", "sqlite_rows", "expected_rows", "pg_rows", "detail"]
+
+
+def kind_of(pg_type):
+    if pg_type in TEXT_TYPES:
+        return "text"
+    if pg_type in INT_TYPES:
+        return "int"
+    if pg_type in NUM_TYPES:
+        return "num"
+    if pg_type in DATE_TYPES:
+        return "date"
+    return "count"
+
+
+def text_hash(s):
+    return int(hashlib.md5(s.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def pg_aggregates_sql(ref, columns):
+    """One scan: count(*) then, per column, count and the kind's aggregate."""
+    parts = ["count(*)"]
+    for name, kind in columns:
+        col = '"' + name.replace('"', '""') + '"'
+        parts.append(f"count({col})")
+        if kind == "text":
+            parts.append(f"coalesce(sum(('x' || substr(md5({col}), 1, 8))::bit(32)::bigint), 0)::text")
+        elif kind == "int":
+            parts.append(f"coalesce(sum({col}::numeric), 0)::text")
+        elif kind == "num":
+            parts.append(f"coalesce(sum({col}::float8), 0)")
+    return f"SELECT {', '.join(parts)} FROM {ref}"
+
+
+# ── worker (one process per --workers) ───────────────────────────────────────
+_state = {}
+
+
+def _init(dataset, port):
+    def connect(pg_db):
+        return psycopg2.connect(dbname=pg_db, user=PG_USER, password=PG_PASSWORD, host=PG_HOST, port=port)
+    _state["dataset"] = dataset
+    _state["loader"] = load_script(LOADERS[dataset])
+    _state["sessions"] = SessionCache(connect)
+
+
+def _date_ok(loader, val):
+    """Would the loader store a non-NULL date for this cleaned value?"""
+    if _state["dataset"] == "spider" and not isinstance(val, int):
+        return True   # Spider hands strings to Postgres as they are
+    for t in ("DATE", "TIMESTAMP"):
+        try:
+            if fit(t, val) is not None:
+                return True
+        except ValueError:
+            pass
+    if isinstance(val, int) and 10101 <= val <= 99991231:
+        try:
+            datetime.date(val // 10000, (val % 10000) // 100, val % 100)
+            return True
+        except ValueError:
+            pass
+    parse = getattr(loader, "parse_dateish", None)
+    return parse is not None and isinstance(val, (int, str)) and parse(val) is not None
+
+
+def _sqlite_side(path, table, columns, pg_kinds):
+    """Aggregates of what the loader would have inserted, plus the explained differences."""
+    loader, bird = _state["loader"], _state["dataset"] == "bird"
+    n = len(columns)
+    out = {"raw": 0, "rows": 0, "header": 0, "all_null": 0, "utf8": 0,
+           "nn": [0] * n, "agg": [0] * n, "date_nulled": [0] * n}
+    conn = sqlite3.connect(read_only_uri(path), uri=True)
+    conn.text_factory = bytes
+    try:
+        first = True
+        for row in conn.execute(f'SELECT * FROM "{table}"'):
+            out["raw"] += 1
+            if bird and first:
+                first = False
+                vals = [v.decode("utf-8", "replace") if isinstance(v, bytes) else v for v in row]
+                if loader.is_header_like(vals, columns):
+                    out["header"] += 1
+                    continue
+            clean = []
+            for i, v in enumerate(row):
+                if isinstance(v, bytes):
+                    try:
+                        v.decode("utf-8")
+                    except UnicodeDecodeError:
+                        out["utf8"] += 1
+                v = loader.clean_value(columns[i], v)
+                kind = pg_kinds[i]
+                if v == "" and kind != "text":
+                    v = None
+                if v is not None and kind == "date" and not _date_ok(loader, v):
+                    out["date_nulled"][i] += 1
+                    v = None
+                clean.append(v)
+            if bird and all(c is None for c in clean):
+                out["all_null"] += 1
+                continue
+            out["rows"] += 1
+            for i, v in enumerate(clean):
+                if v is None:
+                    continue
+                out["nn"][i] += 1
+                kind = pg_kinds[i]
+                if kind == "text":
+                    out["agg"][i] += text_hash(v if isinstance(v, str) else str(v))
+                elif kind == "int":
+                    if isinstance(v, float) and v.is_integer():
+                        v = int(v)
+                    out["agg"][i] += v if isinstance(v, int) else int(v) if INT_RE.fullmatch(str(v)) else 0
+                elif kind == "num":
+                    try:
+                        out["agg"][i] += float(v)
+                    except (TypeError, ValueError):
+                        pass
+    finally:
+        conn.close()
+    return out
+
+
+def verify_table(db, path, table):
+    """Returns one report row (dict)."""
+    pg_db, schema = target(db)
+    t = table.lower()
+    report = {"db": db, "table": t, "status": "ok", "sqlite_rows": "", "expected_rows": "", "pg_rows": "", "detail": ""}
+    try:
+        conn = _state["sessions"].get(pg_db)
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT column_name, data_type FROM information_schema.columns
+                 WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position;
+            """, (schema, t))
+            pg_cols = cur.fetchall()
+            if not pg_cols:
+                report.update(status="missing", detail="table not in Postgres")
+                return report
+            columns = [c for c, _ in pg_cols]
+            kinds = [kind_of(dt) for _, dt in pg_cols]
+            cur.execute(pg_aggregates_sql(qualify(schema, t), list(zip(columns, kinds))))
+            pg = cur.fetchone()
+    except Exception as e:
+        _state["sessions"].discard(pg_db)
+        report.update(status="error", detail=f"postgres: {e}".strip())
+        return report
+
+    try:
+        conn = sqlite3.connect(read_only_uri(path), uri=True)
+        try:
+            src_cols = [c[1].lower() for c in conn.execute(f'PRAGMA table_info("{table}")')]
+        finally:
+            conn.close()
+        if src_cols != columns:
+            report.update(status="mismatch", detail=f"columns differ: sqlite {src_cols}, postgres {columns}")
+            return report
+        src = _sqlite_side(path, table, columns, kinds)
+    except Exception as e:
+        report.update(status="error", detail=f"sqlite: {e}")
+        return report
+
+    pg_rows, pos = pg[0], 1
+    problems, notes = [], []
+    report.update(sqlite_rows=src["raw"], expected_rows=src["rows"], pg_rows=pg_rows)
+    if src["rows"] != pg_rows:
+        problems.append(f"rows: expected {src['rows']}, postgres {pg_rows}")
+    for reason in ("header", "all_null"):
+        if src[reason]:
+            notes.append(f"{src[reason]} {reason} row(s) skipped by the loader")
+    if src["utf8"]:
+        notes.append(f"{src['utf8']} value(s) with invalid UTF-8 stored with U+FFFD")
+    for i, (col, kind) in enumerate(zip(columns, kinds)):
+        nn = pg[pos]
+        pos += 1
+        if src["date_nulled"][i]:
+            notes.append(f"{col}: {src['date_nulled'][i]} unparseable date(s) stored as NULL")
+        if nn != src["nn"][i]:
+            problems.append(f"{col}: non-null expected {src['nn'][i]}, postgres {nn}")
+        if kind in ("text", "int", "num"):
+            got = pg[pos]
+            pos += 1
+            if kind == "num":
+                same = math.isclose(float(got or 0), src["agg"][i], rel_tol=1e-9, abs_tol=1e-6)
+            else:
+                same = int(got) == src["agg"][i]
+            if not same:
+                problems.append(f"{col}: {'hash' if kind == 'text' else 'sum'} differs")
+    if problems:
+        report.update(status="mismatch", detail="; ".join(problems + notes))
+    elif notes:
+        report.update(status="explained", detail="; ".join(notes))
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare SQLite source tables with their Postgres copies.")
+    ap.add_argument("--dataset", choices=["bird", "spider"], default="bird")
+    ap.add_argument("--db_root", default=None, help="Folder holding the SQLite files (searched recursively)")
+    ap.add_argument("--dbs", default="", help="Comma-separated db_ids (default: every SQLite file)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--out", default="verify_report.csv")
+    args = ap.parse_args()
+
+    db_root = os.path.expanduser(args.db_root or DEFAULT_ROOT[args.dataset])
+    if not db_root or not os.path.isdir(db_root):
+        raise SystemExit("❌ --db_root must point at the SQLite databases folder")
+    files = find_sqlite_files(db_root)
+    if args.dbs:
+        wanted = {d.strip().lower() for d in args.dbs.split(",") if d.strip()}
+        files = {db: p for db, p in files.items() if db in wanted}
+    if not files:
+        raise SystemExit("❌ No SQLite files found.")
+
+    tasks = []
+    for db, path in sorted(files.items()):
+        conn = sqlite3.connect(read_only_uri(path), uri=True)
+        try:
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                                        "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'"):
+                tasks.append((db, path, name))
+        finally:
+            conn.close()
+
+    port = int(os.getenv("PG_PORT", DEFAULT_PORTS[args.dataset]))
+    rows = []
+    with METRICS.timer("verify"):
+        with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init,
+                                 initargs=(args.dataset, port)) as ex:
+            futs = {ex.submit(verify_table, *t): t for t in tasks}
+            for f in as_completed(futs):
+                try:
+                    r = f.result()
+                except Exception as e:
+                    db, _, table = futs[f]
+                    r = {"db": db, "table": table.lower(), "status": "error", "sqlite_rows": "",
+                         "expected_rows": "", "pg_rows": "", "detail": str(e)}
+                rows.append(r)
+                METRICS.inc("tables_checked", status=r["status"])
+
+    rows.sort(key=lambda r: (r["db"], r["table"]))
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+        w.writeheader()
+        w.writerows(rows)
+
+    by_status = {}
+    for r in rows:
+        by_status[r["status"]] = by_status.get(r["status"], 0) + 1
+    bad = [r for r in rows if r["status"] in ("mismatch", "missing", "error")]
+    print(f"🔍 {len(rows)} table(s) in {len(files)} database(s): "
+          + ", ".join(f"{n} {s}" for s, n in sorted(by_status.items())) + f" → {args.out}")
+    for r in bad[:20]:
+        print(f"   ❌ {r['db']}.{r['table']} [{r['status']}] {r['detail'][:200]}")
+    METRICS.report()
+    if bad:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()